@@ -17,3 +17,7 @@ class ParserError(CodetoolError):
 
 class EvaluatorError(CodetoolError):
     """An error that occurs during expression evaluation"""
+
+
+class LinkerError(CodetoolError):
+    """An error that occurs while resolving include files"""
@@ -0,0 +1,195 @@
+"""ast_diff module"""
+
+from difflib import SequenceMatcher
+import enum
+import hashlib
+from typing import Any, Optional
+import attrs
+from .base import GlobalStmt
+from .declarations import SubDecl, FunctionDecl, ClassDecl
+from .optimize import FoldableExpr
+from .program import Program
+
+# top-level declarations that are matched by name instead of by position
+type NamedDecl = SubDecl | FunctionDecl | ClassDecl
+
+
+def structural_hash(node: Any, memo: Optional[dict[int, bytes]] = None) -> bytes:
+    """Compute a digest that describes the structure of an AST node
+
+    Two nodes produce the same digest if they are composed of the same node types
+    and compare equal field-by-field (fields declared with `eq=False` are ignored).
+    Source positions (token and output extents) only contribute their length,
+    so moving an unchanged statement within a file does not change its digest
+
+    Parameters
+    ----------
+    node : Any
+    memo : Dict[int, bytes] | None, default=None
+        Digests of AST nodes by node ID, filled in while hashing.
+        Nodes that are already in `memo` are not visited again;
+        the nodes must not be modified or freed while the memo is in use
+
+    Returns
+    -------
+    bytes
+        16-byte digest, stable across interpreter sessions
+    """
+    if isinstance(node, FoldableExpr):
+        # annotation does not change the structure of the wrapped expression
+        return structural_hash(node.wrapped_expr, memo)
+    if memo is not None and (cached := memo.get(id(node), None)) is not None:
+        return cached
+    hasher = hashlib.blake2b(digest_size=16)
+    if attrs.has(type(node)):
+        hasher.update(f"<{type(node).__qualname__}>".encode())
+        for fld in attrs.fields(type(node)):
+            if not fld.eq:
+                continue
+            hasher.update(f"{fld.name}=".encode())
+            hasher.update(structural_hash(getattr(node, fld.name), memo))
+    elif isinstance(node, (list, tuple)):
+        hasher.update(b"[")
+        for item in node:
+            hasher.update(structural_hash(item, memo))
+        hasher.update(b"]")
+    elif isinstance(node, dict):
+        hasher.update(b"{")
+        for key, val in node.items():
+            hasher.update(structural_hash(key, memo))
+            hasher.update(structural_hash(val, memo))
+        hasher.update(b"}")
+    elif isinstance(node, slice):
+        # position in source code is not part of the structure
+        extent = (
+            node.stop - node.start
+            if isinstance(node.start, int) and isinstance(node.stop, int)
+            else None
+        )
+        hasher.update(f"slice:{extent}".encode())
+    elif isinstance(node, enum.Enum):
+        hasher.update(f"{type(node).__qualname__}.{node.name}".encode())
+    else:
+        # include value type so that 1, 1.0, and True are kept apart
+        hasher.update(f"{type(node).__qualname__}:{node!r}".encode())
+    digest = hasher.digest()
+    if memo is not None and attrs.has(type(node)):
+        memo[id(node)] = digest
+    return digest
+
+
+@attrs.define
+class ProgramDiff:
+    """Top-level differences between two versions of a program
+
+    Subs, functions, and classes are matched by name (case-insensitive);
+    all other global statements are matched by position
+
+    Attributes
+    ----------
+    added_decls : list[str]
+        Casefolded names of declarations that only exist in the new program
+    removed_decls : list[str]
+        Casefolded names of declarations that only exist in the old program
+    changed_decls : list[str]
+        Casefolded names of declarations whose structure differs
+    added_stmts : list[int]
+        Indices into the global statement list of the new program
+    removed_stmts : list[int]
+        Indices into the global statement list of the old program
+    changed_stmts : list[tuple[int, int]]
+        Pairs of (old index, new index) of statements that were modified in place
+    """
+
+    added_decls: list[str] = attrs.field(default=attrs.Factory(list))
+    removed_decls: list[str] = attrs.field(default=attrs.Factory(list))
+    changed_decls: list[str] = attrs.field(default=attrs.Factory(list))
+    added_stmts: list[int] = attrs.field(default=attrs.Factory(list))
+    removed_stmts: list[int] = attrs.field(default=attrs.Factory(list))
+    changed_stmts: list[tuple[int, int]] = attrs.field(default=attrs.Factory(list))
+
+    @property
+    def has_changes(self) -> bool:
+        """Whether the two programs differ structurally
+
+        Returns
+        -------
+        bool
+        """
+        return any(len(getattr(self, fld.name)) > 0 for fld in attrs.fields(type(self)))
+
+    @property
+    def dirty_decls(self) -> set[str]:
+        """Casefolded names of declarations that need to be reprocessed
+
+        Returns
+        -------
+        set[str]
+            Added and changed declarations
+        """
+        return set(self.added_decls) | set(self.changed_decls)
+
+
+def _split_global_stmts(
+    prog: Program,
+) -> tuple[dict[str, NamedDecl], list[tuple[int, GlobalStmt]]]:
+    """Separate named declarations from the other global statements"""
+    decls: dict[str, NamedDecl] = {}
+    stmts: list[tuple[int, GlobalStmt]] = []
+    for idx, stmt in enumerate(prog.global_stmt_list):
+        if isinstance(stmt, (SubDecl, FunctionDecl, ClassDecl)):
+            # a later declaration with the same name replaces the earlier one
+            decls[stmt.extended_id.id_code.casefold()] = stmt
+        else:
+            stmts.append((idx, stmt))
+    return decls, stmts
+
+
+def diff_programs(old_prog: Program, new_prog: Program) -> ProgramDiff:
+    """Compare the top-level declarations and statements of two programs
+
+    Parameters
+    ----------
+    old_prog : Program
+    new_prog : Program
+
+    Returns
+    -------
+    ProgramDiff
+    """
+    result = ProgramDiff()
+    # nodes of both programs stay alive while they are compared
+    memo: dict[int, bytes] = {}
+    old_decls, old_stmts = _split_global_stmts(old_prog)
+    new_decls, new_stmts = _split_global_stmts(new_prog)
+
+    for name, decl in new_decls.items():
+        if (old_decl := old_decls.get(name, None)) is None:
+            result.added_decls.append(name)
+        elif structural_hash(old_decl, memo) != structural_hash(decl, memo):
+            result.changed_decls.append(name)
+    result.removed_decls.extend(name for name in old_decls if name not in new_decls)
+
+    matcher = SequenceMatcher(
+        None,
+        [structural_hash(stmt, memo) for _, stmt in old_stmts],
+        [structural_hash(stmt, memo) for _, stmt in new_stmts],
+        autojunk=False,
+    )
+    for tag, old_lo, old_hi, new_lo, new_hi in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        # statements replaced one-for-one are reported as changed,
+        # the remainder of an uneven replacement is added or removed
+        num_paired = min(old_hi - old_lo, new_hi - new_lo) if tag == "replace" else 0
+        result.changed_stmts.extend(
+            (old_stmts[old_lo + i][0], new_stmts[new_lo + i][0])
+            for i in range(num_paired)
+        )
+        result.removed_stmts.extend(
+            idx for idx, _ in old_stmts[old_lo + num_paired : old_hi]
+        )
+        result.added_stmts.extend(
+            idx for idx, _ in new_stmts[new_lo + num_paired : new_hi]
+        )
+    return result
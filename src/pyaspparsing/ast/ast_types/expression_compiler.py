@@ -0,0 +1,388 @@
+"""expression_compiler module"""
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Sequence
+from functools import wraps
+import operator
+from typing import Any
+import attrs
+from ... import EvaluatorError
+from .base import Expr, CompareExprType
+from .expressions import (
+    ImpExpr,
+    EqvExpr,
+    XorExpr,
+    OrExpr,
+    AndExpr,
+    NotExpr,
+    CompareExpr,
+    ConcatExpr,
+    AddExpr,
+    ModExpr,
+    IntDivExpr,
+    MultExpr,
+    UnarySign,
+    UnaryExpr,
+    ExpExpr,
+    LeftExpr,
+)
+from .optimize import EvalExpr, FoldableExpr, AddNegated, MultReciprocal
+from .expression_evaluator import structural_key
+
+# a compiled node receives the tuple of bound values for the free names
+type CompiledNode = Callable[[tuple[EvalExpr, ...]], EvalExpr]
+
+reg_expr_comp: dict[type[Expr], Callable[[Expr, dict[str, int]], CompiledNode]] = {}
+
+
+def compile_node(exp: Expr, slots: dict[str, int]) -> CompiledNode:
+    """Compile a single expression node (and its subtrees) into a closure
+
+    Parameters
+    ----------
+    exp : Expr
+    slots : dict[str, int]
+        Map of casefolded free names to their position in the bound values
+
+    Returns
+    -------
+    CompiledNode
+
+    Raises
+    ------
+    EvaluatorError
+        If the expression contains a term that cannot be compiled
+    """
+    if isinstance(exp, EvalExpr):
+        return lambda _: exp
+    if isinstance(exp, FoldableExpr):
+        exp = exp.wrapped_expr
+    if isinstance(exp, LeftExpr):
+        if exp.end_idx != 0 or (slot := slots.get(exp.sym_name.casefold())) is None:
+            raise EvaluatorError(
+                f"Left expression {repr(exp.sym_name)} is not a free name "
+                "of the compiled expression"
+            )
+        return operator.itemgetter(slot)
+    if (comp_func := reg_expr_comp.get(type(exp), None)) is None:
+        raise EvaluatorError(
+            f"Expression of type {type(exp).__name__} cannot be compiled"
+        )
+    return comp_func(exp, slots)
+
+
+def create_expr_comp_func(expr_type: type[Expr]):
+    """
+    Parameters
+    ----------
+    expr_type : type[Expr]
+    """
+    assert issubclass(expr_type, Expr), "expr_type must be a subclass of Expr"
+
+    def wrap_func(func: Callable[[Expr, dict[str, int]], CompiledNode]):
+        @wraps(func)
+        def check_expr_type(exp: Expr, slots: dict[str, int]) -> CompiledNode:
+            assert isinstance(
+                exp, expr_type
+            ), f"Expected {expr_type.__name__}, got {type(exp).__name__} instead"
+            return func(exp, slots)
+
+        reg_expr_comp[expr_type] = check_expr_type
+        return check_expr_type
+
+    return wrap_func
+
+
+def _binary(
+    op: Callable[[EvalExpr, EvalExpr], EvalExpr], exp: Expr, slots: dict[str, int]
+) -> CompiledNode:
+    """Compile both subtrees of a binary expression and combine them with `op`"""
+    left = compile_node(exp.left, slots)
+    right = compile_node(exp.right, slots)
+    return lambda env: op(left(env), right(env))
+
+
+@create_expr_comp_func(ImpExpr)
+def comp_imp_expr(exp: ImpExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile an implication (Imp) expression
+    """
+    # Imp = (Not left) Or right
+    return _binary(lambda l, r: operator.or_(operator.invert(l), r), exp, slots)
+
+
+@create_expr_comp_func(EqvExpr)
+def comp_eqv_expr(exp: EqvExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile an equivalence (Eqv) expression
+    """
+    # Eqv = Not (left Xor right)
+    return _binary(lambda l, r: operator.invert(operator.xor(l, r)), exp, slots)
+
+
+@create_expr_comp_func(XorExpr)
+def comp_xor_expr(exp: XorExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile an exclusive disjunction (Xor) expression
+    """
+    return _binary(operator.xor, exp, slots)
+
+
+@create_expr_comp_func(OrExpr)
+def comp_or_expr(exp: OrExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile an inclusive disjunction (Or) expression
+    """
+    return _binary(operator.or_, exp, slots)
+
+
+@create_expr_comp_func(AndExpr)
+def comp_and_expr(exp: AndExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile a conjunction (And) expression
+    """
+    return _binary(operator.and_, exp, slots)
+
+
+@create_expr_comp_func(NotExpr)
+def comp_not_expr(exp: NotExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile a complement (Not) expression
+    """
+    term = compile_node(exp.term, slots)
+    return lambda env: operator.invert(term(env))
+
+
+@create_expr_comp_func(CompareExpr)
+def comp_compare_expr(exp: CompareExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile a comparison expression
+    """
+    match exp.cmp_type:
+        case CompareExprType.COMPARE_IS | CompareExprType.COMPARE_ISNOT:
+            raise EvaluatorError("Object reference comparisons cannot be compiled")
+        case CompareExprType.COMPARE_EQ:
+            return _binary(operator.eq, exp, slots)
+        case CompareExprType.COMPARE_LTGT:
+            return _binary(operator.ne, exp, slots)
+        case CompareExprType.COMPARE_GT:
+            return _binary(operator.gt, exp, slots)
+        case CompareExprType.COMPARE_GTEQ:
+            return _binary(operator.ge, exp, slots)
+        case CompareExprType.COMPARE_LT:
+            return _binary(operator.lt, exp, slots)
+        case CompareExprType.COMPARE_LTEQ:
+            return _binary(operator.le, exp, slots)
+
+
+@create_expr_comp_func(ConcatExpr)
+def comp_concat_expr(exp: ConcatExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile a string concatenation expression
+    """
+    # both operands are cast to string before concatenation
+    return _binary(lambda l, r: operator.add(l.str_cast(), r.str_cast()), exp, slots)
+
+
+@create_expr_comp_func(AddNegated)
+def comp_add_negated(exp: AddNegated, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile a negation annotation
+    """
+    term = compile_node(exp.wrapped_expr, slots)
+    return lambda env: operator.neg(term(env))
+
+
+@create_expr_comp_func(AddExpr)
+def comp_add_expr(exp: AddExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile an addition/subtraction expression
+    """
+    return _binary(operator.add, exp, slots)
+
+
+@create_expr_comp_func(ModExpr)
+def comp_mod_expr(exp: ModExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile a modulo expression
+    """
+    return _binary(operator.mod, exp, slots)
+
+
+@create_expr_comp_func(IntDivExpr)
+def comp_int_div_expr(exp: IntDivExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile an integer division expression
+    """
+    return _binary(operator.floordiv, exp, slots)
+
+
+@create_expr_comp_func(MultReciprocal)
+def comp_mult_reciprocal(exp: MultReciprocal, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile a reciprocal annotation
+    """
+    term = compile_node(exp.wrapped_expr, slots)
+    return lambda env: term(env).reciprocal()
+
+
+@create_expr_comp_func(MultExpr)
+def comp_mult_expr(exp: MultExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile a multiplication/division expression
+    """
+    return _binary(operator.mul, exp, slots)
+
+
+@create_expr_comp_func(UnaryExpr)
+def comp_unary_expr(exp: UnaryExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile a signed unary expression
+    """
+    term = compile_node(exp.term, slots)
+    if exp.sign == UnarySign.SIGN_POS:
+        return lambda env: operator.pos(term(env))
+    return lambda env: operator.neg(term(env))
+
+
+@create_expr_comp_func(ExpExpr)
+def comp_exp_expr(exp: ExpExpr, slots: dict[str, int]) -> CompiledNode:
+    """NOT CALLED DIRECTLY
+
+    Compile an exponentiation expression
+    """
+    return _binary(operator.pow, exp, slots)
+
+
+@attrs.define(repr=False)
+class CompiledExpr:
+    """Expression compiled into a closure over its free names
+
+    Attributes
+    ----------
+    free_names : tuple[str, ...]
+        Casefolded names of the left expressions that are bound on each call
+
+    Methods
+    -------
+    bind(bindings)
+        Evaluate the expression using a mapping of names to values
+    """
+
+    free_names: tuple[str, ...]
+    _func: CompiledNode
+
+    def __repr__(self):
+        return f"<CompiledExpr ({', '.join(self.free_names)})>"
+
+    def __call__(self, *args: Any) -> EvalExpr:
+        """Evaluate the expression using positional values for the free names
+
+        Parameters
+        ----------
+        *args : Any
+            One value per free name; non-EvalExpr values are wrapped in an EvalExpr
+
+        Returns
+        -------
+        EvalExpr
+
+        Raises
+        ------
+        ValueError
+            If the number of arguments does not match the number of free names
+        """
+        if len(args) != len(self.free_names):
+            raise ValueError(
+                f"Expected {len(self.free_names)} bound values, got {len(args)}"
+            )
+        return self._func(
+            tuple(arg if isinstance(arg, EvalExpr) else EvalExpr(arg) for arg in args)
+        )
+
+    def bind(self, bindings: dict[str, Any]) -> EvalExpr:
+        """
+        Parameters
+        ----------
+        bindings : dict[str, Any]
+            Map of free names to values; keys are compared casefolded
+
+        Returns
+        -------
+        EvalExpr
+
+        Raises
+        ------
+        KeyError
+            If a free name is missing from `bindings`
+        """
+        folded = {name.casefold(): val for name, val in bindings.items()}
+        return self(*(folded[name] for name in self.free_names))
+
+
+# compiled expressions, most recently used at the end
+compiled_expr_cache: OrderedDict[Hashable, CompiledExpr] = OrderedDict()
+COMPILED_EXPR_CACHE_SIZE: int = 256
+
+
+def compile_expr(
+    exp: Expr, free_names: Sequence[str], *, use_cache: bool = True
+) -> CompiledExpr:
+    """Compile an expression so it can be evaluated repeatedly
+    with different values bound to its free left expressions
+
+    Operators follow the same semantics as `evaluate_expr()`
+
+    Parameters
+    ----------
+    exp : Expr
+    free_names : Sequence[str]
+        Names of the left expressions in `exp` that are bound on each call
+    use_cache : bool, default=True
+        Reuse a previous compilation of a structurally identical expression
+
+    Returns
+    -------
+    CompiledExpr
+
+    Raises
+    ------
+    EvaluatorError
+        If the expression contains a term that cannot be compiled
+    """
+    names = tuple(name.casefold() for name in free_names)
+    if len(set(names)) != len(names):
+        raise ValueError("free_names must not contain duplicate names")
+    slots = {name: idx for idx, name in enumerate(names)}
+    if not use_cache:
+        return CompiledExpr(names, compile_node(exp, slots))
+    try:
+        key = (structural_key(exp), names)
+        hash(key)
+    except TypeError:
+        # expression contains an unhashable value, don't cache
+        return CompiledExpr(names, compile_node(exp, slots))
+    if (comp := compiled_expr_cache.get(key, None)) is not None:
+        compiled_expr_cache.move_to_end(key)
+        return comp
+    comp = CompiledExpr(names, compile_node(exp, slots))
+    compiled_expr_cache[key] = comp
+    while len(compiled_expr_cache) > COMPILED_EXPR_CACHE_SIZE:
+        # evict least recently used
+        compiled_expr_cache.popitem(last=False)
+    return comp
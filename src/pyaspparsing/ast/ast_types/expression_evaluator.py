@@ -1,8 +1,12 @@
 """expression_evaluator module"""
 
-from collections.abc import Callable
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
 from functools import wraps
 import operator
+import threading
+from typing import Any, Optional
+import attrs
 from ... import EvaluatorError
 from .base import Expr, CompareExprType
 from .expressions import (
@@ -24,10 +28,182 @@ from .expressions import (
 )
 from .optimize import EvalExpr, FoldableExpr, AddNegated, MultReciprocal
 
-
 reg_expr_eval: dict[type[Expr], Callable[[Expr], EvalExpr]] = {}
 
 
+class StructuralKey(tuple):
+    """Tuple returned by `structural_key()` that computes its hash once
+
+    The key of a node contains the keys of its children,
+    so hashing it again on every lookup would take time proportional to the subtree
+    """
+
+    _hash: Optional[int] = None
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = super().__hash__()
+        return self._hash
+
+
+def structural_key(
+    node: Any, node_keys: Optional[dict[int, Hashable]] = None
+) -> Hashable:
+    """Compute a hashable key that describes the structure of an expression tree
+
+    Two trees produce the same key if they are composed of the same node types
+    and compare equal field-by-field (fields declared with `eq=False` are ignored)
+
+    Parameters
+    ----------
+    node : Any
+    node_keys : Dict[int, Hashable] | None, default=None
+        If given, the key of every node in the tree is stored by node ID,
+        so that the keys of subtrees don't have to be computed again
+
+    Returns
+    -------
+    Hashable
+    """
+    if isinstance(node, FoldableExpr):
+        # annotation does not change the value of the wrapped expression
+        key = structural_key(node.wrapped_expr, node_keys)
+    elif isinstance(node, EvalExpr):
+        # include value type so that 1, 1.0, and True are kept apart
+        key = StructuralKey((EvalExpr, type(node.expr_value), node.expr_value))
+    elif attrs.has(type(node)):
+        # list comprehension instead of a generator, saves a stack frame per level
+        key = StructuralKey(
+            (
+                type(node),
+                *[
+                    structural_key(getattr(node, fld.name), node_keys)
+                    for fld in attrs.fields(type(node))
+                    if fld.eq
+                ],
+            )
+        )
+    elif isinstance(node, (list, tuple)):
+        return StructuralKey(
+            (type(node), *[structural_key(item, node_keys) for item in node])
+        )
+    elif isinstance(node, dict):
+        return StructuralKey(
+            (
+                dict,
+                *[(key, structural_key(val, node_keys)) for key, val in node.items()],
+            )
+        )
+    elif isinstance(node, slice):
+        return (slice, node.start, node.stop, node.step)
+    else:
+        return (type(node), node)
+    if node_keys is not None:
+        node_keys[id(node)] = key
+    return key
+
+
+@attrs.define
+class ExprEvalCache:
+    """Bounded LRU memo for `evaluate_expr()`
+
+    Attributes
+    ----------
+    maxsize : int, default=1024
+        Maximum number of evaluated expressions to keep
+    enabled : bool, default=False
+        If False, `evaluate_expr()` will bypass the memo
+        (off by default, computing keys costs about as much as
+        evaluating the constant expressions found in typical scripts)
+    hits : int
+    misses : int
+
+    Methods
+    -------
+    lookup(key)
+    store(key, value)
+    clear()
+    """
+
+    maxsize: int = attrs.field(default=1024, validator=attrs.validators.ge(0))
+    enabled: bool = attrs.field(default=False)
+    hits: int = attrs.field(default=0, init=False)
+    misses: int = attrs.field(default=0, init=False)
+    _memo: OrderedDict[Hashable, EvalExpr] = attrs.field(
+        default=attrs.Factory(OrderedDict), repr=False, init=False
+    )
+    # expressions are also parsed in worker threads
+    _lock: threading.Lock = attrs.field(
+        default=attrs.Factory(threading.Lock), repr=False, init=False
+    )
+
+    def __len__(self) -> int:
+        return len(self._memo)
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that were served from the memo
+
+        Returns
+        -------
+        float
+            0.0 if no lookups have been made yet
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def lookup(self, key: Hashable) -> Optional[EvalExpr]:
+        """
+        Parameters
+        ----------
+        key : Hashable
+            Structural key of an expression
+
+        Returns
+        -------
+        EvalExpr | None
+            None if the key has not been evaluated before
+        """
+        with self._lock:
+            if (value := self._memo.get(key, None)) is None:
+                self.misses += 1
+                return None
+            self._memo.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def store(self, key: Hashable, value: EvalExpr):
+        """
+        Parameters
+        ----------
+        key : Hashable
+            Structural key of an expression
+        value : EvalExpr
+            Evaluated result of the expression
+        """
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._memo[key] = value
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.maxsize:
+                # evict least recently used
+                self._memo.popitem(last=False)
+
+    def clear(self):
+        """Remove all memoized values and reset the hit/miss counters"""
+        with self._lock:
+            self._memo.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+expr_eval_cache = ExprEvalCache()
+
+# keys of the nodes of the expression that is being evaluated in the current thread
+_eval_state = threading.local()
+
+
 def evaluate_expr(fld: Expr) -> EvalExpr:
     """
     Parameters
@@ -37,12 +213,51 @@ def evaluate_expr(fld: Expr) -> EvalExpr:
     Returns
     -------
     EvalExpr
+
+    Notes
+    -----
+    If `expr_eval_cache.enabled` is True, results are memoized in `expr_eval_cache`.
+    The outermost call computes the key of every node in the tree once,
+    nested calls look up the key of their subtree, so that structurally identical
+    subtrees are only evaluated once
     """
     if isinstance(fld, EvalExpr):
         return fld
-    return reg_expr_eval[
+    eval_func = reg_expr_eval[
         type(fld.wrapped_expr) if isinstance(fld, FoldableExpr) else type(fld)
-    ](fld)
+    ]
+    if not expr_eval_cache.enabled:
+        return eval_func(fld)
+    if (node_keys := getattr(_eval_state, "node_keys", None)) is not None:
+        # subtree of an expression that is being evaluated
+        if (key := node_keys.get(id(fld), None)) is None:
+            # node was created during evaluation
+            return eval_func(fld)
+        return _memo_eval(fld, key, eval_func)
+    node_keys = {}
+    key = structural_key(fld, node_keys)
+    _eval_state.node_keys = node_keys
+    try:
+        return _memo_eval(fld, key, eval_func)
+    finally:
+        _eval_state.node_keys = None
+
+
+def _memo_eval(
+    fld: Expr, key: Hashable, eval_func: Callable[[Expr], EvalExpr]
+) -> EvalExpr:
+    """Evaluate an expression through the memo"""
+    try:
+        memo_value = expr_eval_cache.lookup(key)
+    except TypeError:
+        # expression contains an unhashable value, don't memoize
+        return eval_func(fld)
+    if memo_value is not None:
+        return memo_value
+    # don't catch evaluation errors, failures are never memoized
+    ret = eval_func(fld)
+    expr_eval_cache.store(key, ret)
+    return ret
 
 
 def create_expr_eval_func(expr_type: type[Expr]):
@@ -0,0 +1,216 @@
+"""serializer module
+
+Single-pass serializers for AST trees
+
+Both serializers walk the tree with an explicit stack instead of recursion,
+so the amount of work is linear in the size of the tree
+and output is written to the file object as soon as it is produced
+"""
+
+import enum
+import json
+from typing import Any, Optional, TextIO, Union
+import attrs
+from .base import FormatterMixin
+
+# an entry on the work stack is either text to write as-is,
+# or a value to serialize (with the indentation of its continuation lines
+# and whether it is embedded in a Python container repr)
+type _TextWork = Union[str, tuple[str, Any, bool]]
+type _JsonWork = Union[str, tuple[Any]]
+
+
+# brackets of the Python repr of a container
+_CONTAINER_BRACKETS: dict[type, tuple[str, str]] = {
+    list: ("[", "]"),
+    tuple: ("(", ")"),
+    dict: ("{", "}"),
+}
+
+
+def _node_items(node: Any) -> list[tuple[str, Any]]:
+    """Attributes of an AST node in declaration order"""
+    if hasattr(node, "__dict__"):
+        return list(node.__dict__.items())
+    # slotted attrs class
+    return [(fld.name, getattr(node, fld.name)) for fld in attrs.fields(type(node))]
+
+
+def _expanded_items(attr_val: Any) -> Optional[list[tuple[str, Any]]]:
+    """Elements of an attribute value that `FormatterMixin.__repr__`
+    writes on separate lines, as pairs of (line prefix, element)
+
+    Returns None if the value is written with its own repr
+    """
+    if isinstance(attr_val, str):
+        return None
+    try:
+        iter(attr_val)
+        len(attr_val)
+    except TypeError:
+        return None
+    elem_items: list[tuple[str, Any]] = []
+    # iteration stops at the first None, same as FormatterMixin.__repr__
+    for elem in attr_val:
+        if elem is None:
+            break
+        elem_items.append(
+            (f"{elem!r}: ", attr_val.get(elem))
+            if isinstance(attr_val, dict)
+            else ("", elem)
+        )
+    return elem_items
+
+
+def _push_node(stack: list[_TextWork], node: Any, lead: str, pad: str):
+    """Push the attributes of a node with at least one attribute"""
+    items = _node_items(node)
+    stack.append(f"\n{lead})")
+    for i, (attr_name, attr_val) in reversed(list(enumerate(items))):
+        comma = "," if i < len(items) - 1 else ""
+        if (elem_items := _expanded_items(attr_val)) is None:
+            stack.append(comma)
+            stack.append((lead + pad, attr_val, False))
+            stack.append(f"\n{lead}{pad}{attr_name}=")
+            continue
+        start_char, end_char = ("{", "}") if isinstance(attr_val, dict) else ("[", "]")
+        if len(attr_val) == 0:
+            stack.append(f"\n{lead}{pad}{attr_name}={start_char}{end_char}{comma}")
+            continue
+        stack.append(f"\n{lead}{pad}{end_char}{comma}")
+        for j, (elem_prefix, elem) in reversed(list(enumerate(elem_items))):
+            stack.append("," if j < len(attr_val) - 1 else "")
+            stack.append((lead + pad * 2, elem, False))
+            stack.append(f"\n{lead}{pad * 2}{elem_prefix}")
+        stack.append(f"\n{lead}{pad}{attr_name}={start_char}")
+
+
+def _push_container(stack: list[_TextWork], value: Any, lead: str):
+    """Push the elements of a list, tuple, or dict in the format of its Python repr"""
+    start_char, end_char = _CONTAINER_BRACKETS[type(value)]
+    elems = (
+        [(f"{key!r}: ", val) for key, val in value.items()]
+        if isinstance(value, dict)
+        else [("", elem) for elem in value]
+    )
+    # one-element tuple keeps its trailing comma
+    stack.append(
+        ("," if isinstance(value, tuple) and len(elems) == 1 else "") + end_char
+    )
+    for i, (elem_prefix, elem) in reversed(list(enumerate(elems))):
+        stack.append((lead, elem, True))
+        stack.append(f"{', ' if i > 0 else ''}{elem_prefix}")
+    stack.append(start_char)
+
+
+def dump_text(node: Any, fp: TextIO, *, indent: int = 2):
+    """Write the indented text representation of an AST tree to a file object
+
+    This is the representation returned by `repr()` on a node that uses
+    FormatterMixin, followed by a newline
+
+    Parameters
+    ----------
+    node : Any
+    fp : TextIO
+    indent : int, default=2
+        Number of spaces per nesting level
+    """
+    pad = " " * indent
+    stack: list[_TextWork] = [("", node, True)]
+    last_char = ""
+    while len(stack) > 0:
+        work = stack.pop()
+        if isinstance(work, str):
+            if len(work) > 0:
+                fp.write(work)
+                last_char = work[-1]
+            continue
+        lead, value, in_repr = work
+        if isinstance(value, FormatterMixin):
+            if len(_node_items(value)) == 0:
+                # class has no attributes, the newline is only kept
+                # inside of the repr of a container
+                stack.append(
+                    f"{value.__class__.__name__}()" + (f"\n{lead}" if in_repr else "")
+                )
+                continue
+            _push_node(stack, value, lead, pad)
+            stack.append(f"{value.__class__.__name__}(")
+        elif type(value) in _CONTAINER_BRACKETS:
+            _push_container(stack, value, lead)
+        else:
+            # leaf value, may still have a multi-line repr (e.g., Token)
+            val_lines = repr(value).split("\n") if in_repr else repr(value).splitlines()
+            stack.append(f"\n{lead}".join(val_lines))
+    if last_char != "\n":
+        fp.write("\n")
+
+
+def _json_scalar(value: Any) -> Optional[str]:
+    """Encode a value that does not have any children,
+    returns None if the value is a container"""
+    # check enum first, IntEnum members are also instances of int
+    if isinstance(value, enum.Enum):
+        return json.dumps(f"{type(value).__name__}.{value.name}")
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return json.dumps(value)
+    if isinstance(value, slice):
+        return json.dumps(
+            {
+                "_type": "slice",
+                "start": value.start,
+                "stop": value.stop,
+                "step": value.step,
+            }
+        )
+    return None
+
+
+def dump_json(node: Any, fp: TextIO):
+    """Write a JSON representation of an AST tree to a file object
+
+    AST nodes are written as objects with a `_type` key holding the class name,
+    lists and tuples are written as arrays, and enum members are written as
+    strings of the form `EnumType.MEMBER`
+
+    Parameters
+    ----------
+    node : Any
+    fp : TextIO
+    """
+    stack: list[_JsonWork] = [(node,)]
+    while len(stack) > 0:
+        work = stack.pop()
+        if isinstance(work, str):
+            fp.write(work)
+            continue
+        (value,) = work
+        if (scalar := _json_scalar(value)) is not None:
+            fp.write(scalar)
+            continue
+        if isinstance(value, FormatterMixin) or attrs.has(type(value)):
+            fp.write(f'{{"_type": {json.dumps(value.__class__.__name__)}')
+            stack.append("}")
+            for attr_name, attr_val in reversed(_node_items(value)):
+                stack.append((attr_val,))
+                stack.append(f", {json.dumps(attr_name)}: ")
+        elif isinstance(value, dict):
+            fp.write("{")
+            stack.append("}")
+            dict_items = list(value.items())
+            for i, (key, val) in reversed(list(enumerate(dict_items))):
+                stack.append((val,))
+                key_str = key if isinstance(key, str) else repr(key)
+                stack.append(f"{', ' if i > 0 else ''}{json.dumps(key_str)}: ")
+        elif isinstance(value, (list, tuple)):
+            fp.write("[")
+            stack.append("]")
+            for i, elem in reversed(list(enumerate(value))):
+                stack.append((elem,))
+                if i > 0:
+                    stack.append(", ")
+        else:
+            raise TypeError(
+                f"Object of type {type(value).__name__} cannot be serialized to JSON"
+            )
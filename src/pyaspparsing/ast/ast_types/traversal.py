@@ -0,0 +1,46 @@
+"""traversal module"""
+
+from typing import Any, Generator
+import attrs
+from .expressions import LeftExpr
+
+
+def iter_nodes(node: Any) -> Generator[Any, None, None]:
+    """
+    Parameters
+    ----------
+    node : Any
+        AST node, or a list of nodes
+
+    Yields
+    ------
+    Any
+        `node` and every object below it, depth-first
+    """
+    stack: list[Any] = [node]
+    while len(stack) > 0:
+        obj = stack.pop()
+        yield obj
+        if isinstance(obj, (list, tuple)):
+            stack.extend(reversed(obj))
+        elif isinstance(obj, dict):
+            stack.extend(reversed(obj.values()))
+        elif attrs.has(type(obj)):
+            stack.extend(
+                getattr(obj, fld.name) for fld in reversed(attrs.fields(type(obj)))
+            )
+
+
+def left_expr_names(node: Any) -> set[str]:
+    """
+    Parameters
+    ----------
+    node : Any
+        AST node, or a list of nodes
+
+    Returns
+    -------
+    set[str]
+        Symbol name of every left expression inside of `node`
+    """
+    return {obj.sym_name for obj in iter_nodes(node) if isinstance(obj, LeftExpr)}
@@ -0,0 +1,113 @@
+"""ast_store module"""
+
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import tempfile
+from typing import Optional
+import attrs
+from .. import __version__
+from ..ast.ast_types import Program
+
+
+@attrs.define
+class AstStore:
+    """On-disk cache of parsed programs, shared by every process on a machine
+
+    Each program is pickled to its own file, named after the physical path
+    and the content of the source file. Files are written to a temporary name
+    and atomically renamed, so concurrent readers never see a partial entry
+    and concurrent writers of the same entry are harmless
+
+    The store only contains pickles written by this package;
+    do not point it at a directory that untrusted users can write to
+
+    Attributes
+    ----------
+    root : Path
+        Directory of the store, created if it does not exist
+
+    Methods
+    -------
+    entry_path(phys_path, codeblock)
+        Location of the entry for a version of a file
+    get(phys_path, codeblock)
+        Load a program from the store
+    put(phys_path, codeblock, prog)
+        Save a program to the store
+    clear()
+        Remove every entry
+    """
+
+    root: Path = attrs.field(converter=Path)
+
+    def __attrs_post_init__(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def entry_path(self, phys_path: Path, codeblock: str) -> Path:
+        """
+        Parameters
+        ----------
+        phys_path : Path
+            Physical path of the source file
+        codeblock : str
+            Content of the source file
+
+        Returns
+        -------
+        Path
+            Entries are keyed by package version, absolute path, and content hash
+        """
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(f"{__version__}\0{os.path.abspath(phys_path)}\0".encode())
+        hasher.update(codeblock.encode("utf-8", "surrogatepass"))
+        key = hasher.hexdigest()
+        return self.root / key[:2] / f"{key}.pickle"
+
+    def get(self, phys_path: Path, codeblock: str) -> Optional[Program]:
+        """
+        Parameters
+        ----------
+        phys_path : Path
+        codeblock : str
+
+        Returns
+        -------
+        Program | None
+            None if the store does not contain this version of the file
+        """
+        try:
+            with open(self.entry_path(phys_path, codeblock), "rb") as entry_file:
+                prog = pickle.load(entry_file)
+        except Exception:  # pylint: disable=W0718
+            # missing or unreadable entry, parse the file again
+            return None
+        return prog if isinstance(prog, Program) else None
+
+    def put(self, phys_path: Path, codeblock: str, prog: Program):
+        """
+        Parameters
+        ----------
+        phys_path : Path
+        codeblock : str
+        prog : Program
+            Parsed content of the file
+        """
+        entry_path = self.entry_path(phys_path, codeblock)
+        entry_path.parent.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=entry_path.parent, suffix=".tmp", delete=False
+        ) as tmp_file:
+            try:
+                pickle.dump(prog, tmp_file, pickle.HIGHEST_PROTOCOL)
+            except BaseException:
+                tmp_file.close()
+                os.unlink(tmp_file.name)
+                raise
+        os.replace(tmp_file.name, entry_path)
+
+    def clear(self):
+        """Remove every entry from the store"""
+        for entry_path in self.root.glob("*/*.pickle"):
+            entry_path.unlink(missing_ok=True)
@@ -0,0 +1,407 @@
+"""batch module"""
+
+from collections.abc import Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+import enum
+from io import StringIO
+from itertools import islice
+import os
+from pathlib import Path
+import signal
+import threading
+import time
+from typing import Any, Generator, Optional
+import attrs
+from .. import LinkerError
+from .codegen import generate_code
+from .include_graph import IncludeGraph
+from .linker import Linker
+from .virtual_dir import read_source
+
+
+@enum.verify(enum.CONTINUOUS, enum.UNIQUE)
+class PageStatus(enum.Enum):
+    """Outcome of generating code for one page"""
+
+    OK = enum.auto()
+    FAILED = enum.auto()
+    TIMEOUT = enum.auto()
+
+
+@attrs.define
+class PageResult:
+    """
+    Attributes
+    ----------
+    file_path : Path
+        Virtual path of the page
+    status : PageStatus
+    script : str
+        Generated script, empty unless status is OK
+    template : str
+        Generated template, empty unless status is OK
+    messages : str
+        Diagnostics written by the tokenizer and code generator
+    error : str | None
+        Type and message of the exception that stopped code generation
+    elapsed : float
+        Seconds spent on the page in the worker
+    """
+
+    file_path: Path
+    status: PageStatus
+    script: str = attrs.field(default="", repr=False)
+    template: str = attrs.field(default="", repr=False)
+    messages: str = attrs.field(default="", repr=False)
+    error: Optional[str] = attrs.field(default=None)
+    elapsed: float = attrs.field(default=0.0)
+
+
+@attrs.define
+class BatchSummary:
+    """
+    Attributes
+    ----------
+    total : int
+        Number of pages that finished
+    succeeded : int
+    failed : int
+    timed_out : int
+    elapsed : float
+        Wall-clock seconds of the whole batch
+    page_seconds : float
+        Sum of the time spent on each page in the workers
+    failed_pages : list[Path]
+        Pages that failed or timed out, in order of completion
+    """
+
+    total: int = attrs.field(default=0)
+    succeeded: int = attrs.field(default=0)
+    failed: int = attrs.field(default=0)
+    timed_out: int = attrs.field(default=0)
+    elapsed: float = attrs.field(default=0.0)
+    page_seconds: float = attrs.field(default=0.0)
+    failed_pages: list[Path] = attrs.field(default=attrs.Factory(list), repr=False)
+
+    def add(self, result: PageResult):
+        """
+        Parameters
+        ----------
+        result : PageResult
+        """
+        self.total += 1
+        self.page_seconds += result.elapsed
+        match result.status:
+            case PageStatus.OK:
+                self.succeeded += 1
+            case PageStatus.FAILED:
+                self.failed += 1
+                self.failed_pages.append(result.file_path)
+            case PageStatus.TIMEOUT:
+                self.timed_out += 1
+                self.failed_pages.append(result.file_path)
+
+
+def discover_pages(lnk: Linker, suffixes: Iterable[str] = (".asp",)) -> list[Path]:
+    """
+    Parameters
+    ----------
+    lnk : Linker
+    suffixes : Iterable[str], default=(".asp",)
+        File extensions of pages
+
+    Returns
+    -------
+    list[Path]
+        Virtual path of every page in the registered virtual directories
+    """
+    suffixes = {suffix.casefold() for suffix in suffixes}
+    return [
+        vdir.root_name / phys_path.relative_to(vdir.actual_path).as_posix()
+        for vdir in lnk.virtual_dirs.values()
+        for phys_path in sorted(vdir.actual_path.rglob("*"))
+        if phys_path.is_file() and phys_path.suffix.casefold() in suffixes
+    ]
+
+
+# linker of the current worker process, created by _init_worker()
+_worker_linker: Optional[Linker] = None
+
+
+def _init_worker(
+    dirs: dict[str, tuple[Path, dict[str, Any]]],
+    linker_options: dict[str, Any],
+    warm_includes: list[Path],
+):
+    """Create the linker of a worker process and parse the shared includes once"""
+    global _worker_linker  # pylint: disable=W0603
+    _worker_linker = Linker(**linker_options)
+    for root_name, (act_path, cache_options) in dirs.items():
+        _worker_linker.register_dir(root_name, act_path, **cache_options)
+    for inc_path in warm_includes:
+        try:
+            _worker_linker.expand_include(inc_path)
+        except LinkerError:
+            # include cycle, reported by the pages that use it
+            continue
+
+
+@contextmanager
+def _page_timeout(seconds: Optional[float]):
+    """Raise TimeoutError in the main thread once the time limit is exceeded"""
+    if (
+        seconds is None
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        # timer signals are only available in the main thread on POSIX
+        yield
+        return
+
+    def on_timeout(signum, frame):  # pylint: disable=W0613
+        raise TimeoutError(f"Time limit of {seconds}s exceeded")
+
+    prev_handler = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, prev_handler)
+
+
+def generate_page(
+    lnk: Linker, file_path: Path, timeout: Optional[float] = None
+) -> PageResult:
+    """Tokenize, link, and generate code for one page
+
+    Parameters
+    ----------
+    lnk : Linker
+    file_path : Path
+        Virtual path of the page
+    timeout : float | None, default=None
+        Seconds before code generation is stopped.
+        Only enforced in the main thread on platforms with `signal.setitimer()`
+
+    Returns
+    -------
+    PageResult
+        Exceptions are reported in the result instead of being raised
+    """
+    start = time.perf_counter()
+    messages = StringIO()
+    status, error = PageStatus.OK, None
+    try:
+        with _page_timeout(timeout):
+            if (phys_path := lnk.physical_path(file_path)) is None:
+                raise FileNotFoundError(
+                    f"No virtual directory has been registered for {file_path}"
+                )
+            codeblock, _ = read_source(phys_path)
+            cg_state = generate_code(
+                codeblock, lnk, False, messages, file_path=file_path
+            )
+            # generate_code() writes to in-memory files
+            assert isinstance(cg_state.script_file, StringIO)
+            assert isinstance(cg_state.template_file, StringIO)
+            assert isinstance(cg_state.error_file, StringIO)
+            return PageResult(
+                file_path,
+                status,
+                cg_state.script_file.getvalue(),
+                cg_state.template_file.getvalue(),
+                messages.getvalue() + cg_state.error_file.getvalue(),
+                elapsed=time.perf_counter() - start,
+            )
+    except TimeoutError as exc:
+        status, error = PageStatus.TIMEOUT, f"{type(exc).__name__}: {exc}"
+    except Exception as exc:  # pylint: disable=W0718
+        status, error = PageStatus.FAILED, f"{type(exc).__name__}: {exc}"
+    return PageResult(
+        file_path,
+        status,
+        messages=messages.getvalue(),
+        error=error,
+        elapsed=time.perf_counter() - start,
+    )
+
+
+def _failed_chunk(chunk: list[Path], exc: BaseException) -> list[PageResult]:
+    """Results of a chunk whose worker process did not return"""
+    return [
+        PageResult(file_path, PageStatus.FAILED, error=f"{type(exc).__name__}: {exc}")
+        for file_path in chunk
+    ]
+
+
+def _run_chunk(chunk: list[Path], timeout: Optional[float]) -> list[PageResult]:
+    """Generate code for a chunk of pages in a worker process"""
+    assert _worker_linker is not None, "Worker process was not initialized"
+    return [generate_page(_worker_linker, file_path, timeout) for file_path in chunk]
+
+
+@attrs.define
+class BatchDriver:
+    """Generate code for every page of a site across a process pool
+
+    Pages are distributed in chunks. Each worker process gets its own linker,
+    registered with the same virtual directories as `lnk`, and parses the
+    shared include files once when it starts. At most `max_pending` chunks
+    are queued at a time, so results must be consumed to make progress
+
+    Attributes
+    ----------
+    lnk : Linker
+        Virtual directories and linker options to replicate in the workers
+    max_workers : int | None, default=None
+        Number of worker processes, see `concurrent.futures.ProcessPoolExecutor`
+    chunk_size : int, default=8
+        Number of pages per task
+    max_pending : int | None, default=None
+        Number of chunks submitted but not yet collected.
+        If None, twice the number of workers
+    timeout : float | None, default=None
+        Time limit per page in seconds
+    warm_up : bool, default=True
+        Whether each worker parses every shared include file before its first chunk.
+        If a virtual directory has an AstStore, the shared includes are parsed
+        in this process first and the workers load them from the store
+    summary : BatchSummary
+        Counters of the last run
+
+    Methods
+    -------
+    run(pages, ordered)
+        Generate results as the pages finish
+    """
+
+    lnk: Linker
+    max_workers: Optional[int] = attrs.field(default=None, kw_only=True)
+    chunk_size: int = attrs.field(
+        default=8, validator=attrs.validators.gt(0), kw_only=True
+    )
+    max_pending: Optional[int] = attrs.field(default=None, kw_only=True)
+    timeout: Optional[float] = attrs.field(default=None, kw_only=True)
+    warm_up: bool = attrs.field(default=True, kw_only=True)
+    summary: BatchSummary = attrs.field(default=attrs.Factory(BatchSummary), init=False)
+
+    def _worker_args(
+        self, pages: list[Path]
+    ) -> tuple[dict[str, tuple[Path, dict[str, Any]]], dict[str, Any], list[Path]]:
+        """Arguments of _init_worker()"""
+        dirs = {
+            vdir.root_name.name: (
+                vdir.actual_path,
+                {
+                    "max_ast_bytes": vdir.max_ast_bytes,
+                    "negative_ttl": vdir.negative_ttl,
+                    "check_stat": vdir.check_stat,
+                    "ast_store": vdir.ast_store,
+                },
+            )
+            for vdir in self.lnk.virtual_dirs.values()
+        }
+        warm_includes: list[Path] = []
+        if self.warm_up:
+            inc_graph = IncludeGraph(self.lnk)
+            for page in pages:
+                inc_graph.add_page(page)
+            warm_includes = sorted(
+                inc_path
+                for inc_path, in_degree in inc_graph.graph.in_degree()
+                if in_degree > 0 and inc_graph.graph.nodes[inc_path]["exists"]
+            )
+            if any(
+                vdir.ast_store is not None for vdir in self.lnk.virtual_dirs.values()
+            ):
+                # parse each shared include once here,
+                # workers load the parsed programs from the store
+                for inc_path in warm_includes:
+                    try:
+                        self.lnk.expand_include(inc_path)
+                    except LinkerError:
+                        continue
+        return (dirs, {"include_once": self.lnk.include_once}, warm_includes)
+
+    def run(
+        self, pages: Optional[Iterable[Path]] = None, ordered: bool = False
+    ) -> Generator[PageResult, None, None]:
+        """
+        Parameters
+        ----------
+        pages : Iterable[Path] | None, default=None
+            Virtual paths of the pages to generate.
+            If None, every page found by `discover_pages()`
+        ordered : bool, default=False
+            Whether results are generated in the order of `pages`
+            instead of as soon as their chunk finishes
+
+        Yields
+        ------
+        PageResult
+        """
+        pages = discover_pages(self.lnk) if pages is None else list(pages)
+        self.summary = BatchSummary()
+        start = time.perf_counter()
+        page_iter = iter(pages)
+        max_pending = (
+            self.max_pending
+            if self.max_pending is not None
+            else 2 * (self.max_workers or os.cpu_count() or 1)
+        )
+        with ProcessPoolExecutor(
+            self.max_workers,
+            initializer=_init_worker,
+            initargs=self._worker_args(pages),
+        ) as pool:
+            # chunk index and pages of every submitted chunk
+            pending: dict[Future, tuple[int, list[Path]]] = {}
+            # chunks that finished before an earlier chunk (ordered only)
+            finished: dict[int, list[PageResult]] = {}
+            num_chunks = 0
+            next_yield = 0
+            try:
+                while True:
+                    # keep the queue filled, finished chunks that are held back
+                    # for ordering count against the limit as well
+                    while len(pending) + len(finished) < max_pending and (
+                        chunk := list(islice(page_iter, self.chunk_size))
+                    ):
+                        try:
+                            fut = pool.submit(_run_chunk, chunk, self.timeout)
+                        except BrokenProcessPool as exc:
+                            # a worker died earlier, the pool accepts no more tasks
+                            fut = Future()
+                            fut.set_exception(exc)
+                        pending[fut] = (num_chunks, chunk)
+                        num_chunks += 1
+                    if len(pending) == 0:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        chunk_idx, chunk = pending.pop(fut)
+                        try:
+                            results = fut.result()
+                        except BrokenProcessPool as exc:
+                            # worker process was killed while running the chunk
+                            results = _failed_chunk(chunk, exc)
+                        if not ordered:
+                            yield from self._collect(results)
+                        else:
+                            finished[chunk_idx] = results
+                    while next_yield in finished:
+                        yield from self._collect(finished.pop(next_yield))
+                        next_yield += 1
+            finally:
+                # iteration stopped early, drop chunks that have not started
+                for fut in pending:
+                    fut.cancel()
+        self.summary.elapsed = time.perf_counter() - start
+
+    def _collect(self, results: list[PageResult]) -> Generator[PageResult, None, None]:
+        for result in results:
+            self.summary.add(result)
+            yield result
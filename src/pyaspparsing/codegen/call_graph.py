@@ -0,0 +1,293 @@
+"""call_graph module"""
+
+from collections.abc import Sequence
+import attrs
+import networkx as nx
+from ..ast.ast_types import EvalExpr, LeftExpr, AssignStmt, BlockStmt, ResponseExpr
+from ..ast.ast_types.builtin_leftexpr.server import ServerCreateObjectExpr
+from ..ast.ast_types.declarations import VarDecl, ConstDecl
+from ..ast.ast_types.traversal import iter_nodes
+from .symbols.symbol_table import SymbolTable
+from .symbols.functions.function import UserFunction, UserSub
+
+
+@attrs.define
+class MethodSummary:
+    """Effects of a user-defined function or sub, computed from its body
+
+    Attributes
+    ----------
+    symbol : UserFunction | UserSub
+    num_stmts : int
+        Number of statements in the body, including nested statements
+    calls : frozenset[str]
+        User-defined functions and subs called by the body
+    globals_read : frozenset[str]
+    globals_written : frozenset[str]
+    writes_response : bool
+        Whether the body uses the Response object
+        (every Response member writes output, headers, or cookies)
+    database_calls : bool
+        Whether the body creates an ADODB object or calls a member
+        of a global variable (which may hold a connection or recordset)
+    recursive : bool
+        Whether the function or sub can call itself, directly or indirectly
+    pure : bool
+        Whether calls have no effect besides their return value,
+        including the effects of every function or sub that they call
+    inline_size : int
+        Number of statements after inlining every function or sub that is called
+    """
+
+    symbol: UserFunction | UserSub
+    num_stmts: int
+    calls: frozenset[str] = attrs.field(repr=False)
+    globals_read: frozenset[str] = attrs.field(repr=False)
+    globals_written: frozenset[str] = attrs.field(repr=False)
+    writes_response: bool
+    database_calls: bool
+    recursive: bool = attrs.field(default=False, init=False)
+    pure: bool = attrs.field(default=False, init=False)
+    inline_size: int = attrs.field(default=0, init=False)
+
+    @property
+    def has_side_effects(self) -> bool:
+        """Effects of the body itself, not counting called functions or subs
+
+        Returns
+        -------
+        bool
+        """
+        return (
+            len(self.globals_written) > 0 or self.writes_response or self.database_calls
+        )
+
+    @staticmethod
+    def from_symbol(
+        call_sym: UserFunction | UserSub,
+        methods: Sequence[str],
+        sym_table: SymbolTable,
+    ) -> "MethodSummary":
+        """
+        Parameters
+        ----------
+        call_sym : UserFunction | UserSub
+        methods : Sequence[str]
+            Names of every user-defined function and sub
+        sym_table : SymbolTable
+            Symbol table after the function and sub declarations
+
+        Returns
+        -------
+        MethodSummary
+        """
+        if isinstance(call_sym, UserFunction):
+            def_scope, body = call_sym.func_scope_id, call_sym.func_body
+        else:
+            def_scope, body = call_sym.sub_scope_id, call_sym.sub_body
+        # arguments, return symbol, and variables declared in the body
+        local_names = set(
+            sym_table.sym_scopes[def_scope].sym_table
+            if def_scope in sym_table.sym_scopes
+            else ()
+        )
+        num_stmts = 0
+        targets: dict[int, LeftExpr] = {}
+        writes_response = False
+        database_calls = False
+        for obj in iter_nodes(body):
+            if isinstance(obj, BlockStmt):
+                num_stmts += 1
+            if isinstance(obj, VarDecl):
+                local_names.update(var.extended_id.id_code for var in obj.var_name)
+            elif isinstance(obj, ConstDecl):
+                local_names.update(item.extended_id.id_code for item in obj.const_list)
+            elif isinstance(obj, AssignStmt):
+                targets[id(obj.target_expr)] = obj.target_expr
+            elif isinstance(obj, ResponseExpr):
+                writes_response = True
+            elif (
+                isinstance(obj, ServerCreateObjectExpr)
+                and isinstance(progid := obj.param_progid, EvalExpr)
+                and isinstance(progid.expr_value, str)
+                and progid.expr_value.casefold().startswith("adodb.")
+            ):
+                database_calls = True
+
+        def _is_global(name: str) -> bool:
+            nonlocal local_names, methods, sym_table
+            return (
+                name not in local_names
+                and name not in methods
+                # builtin objects and functions
+                and sym_table.nearest_symbol(name, (0,), track=False) is None
+            )
+
+        calls: set[str] = set()
+        globals_read: set[str] = set()
+        globals_written: set[str] = set()
+        for obj in iter_nodes(body):
+            if not isinstance(obj, LeftExpr) or isinstance(obj, ResponseExpr):
+                continue
+            is_target = id(obj) in targets
+            if obj.sym_name == call_sym.symbol_name:
+                # the name of a function is its return value when assigned to,
+                # any other use calls the function again
+                if not is_target:
+                    calls.add(obj.sym_name)
+            elif obj.sym_name in methods and obj.sym_name not in local_names:
+                calls.add(obj.sym_name)
+            elif _is_global(obj.sym_name):
+                (globals_written if is_target else globals_read).add(obj.sym_name)
+                if len(obj.subnames) > 0:
+                    # member of an object stored in a global variable
+                    database_calls = True
+        return MethodSummary(
+            call_sym,
+            num_stmts,
+            frozenset(calls),
+            frozenset(globals_read),
+            frozenset(globals_written),
+            writes_response,
+            database_calls,
+        )
+
+
+@attrs.define
+class CallGraph:
+    """Call graph between the user-defined functions and subs of a page
+
+    Each node is the name of a function or sub;
+    an edge (caller, callee) means that the body of `caller` calls `callee`
+
+    Attributes
+    ----------
+    max_inline_size : int, default=40
+        Functions and subs with side effects are only inlined
+        if their inline size is at most this many statements
+    graph : networkx.DiGraph
+    summaries : dict[str, MethodSummary]
+
+    Methods
+    -------
+    build(sym_table, curr_env)
+        Summarize every function and sub visible from a scope
+    components()
+        Strongly connected components, callees before callers
+    should_inline(name)
+    globals_written(name)
+        Globals that a call of a function or sub may assign to
+    """
+
+    max_inline_size: int = attrs.field(default=40, kw_only=True)
+    graph: nx.DiGraph = attrs.field(default=attrs.Factory(nx.DiGraph), init=False)
+    summaries: dict[str, MethodSummary] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+
+    def build(self, sym_table: SymbolTable, curr_env: Sequence[int]):
+        """
+        Parameters
+        ----------
+        sym_table : SymbolTable
+            Symbol table after the function and sub declarations
+        curr_env : Sequence[int]
+            Environment of the script scope that the functions and subs are defined in
+        """
+        methods: dict[str, UserFunction | UserSub] = {}
+        for scope_id in curr_env:
+            if scope_id not in sym_table.sym_scopes:
+                continue
+            for sym_name, symbol in sym_table.sym_scopes[scope_id].sym_table.items():
+                if isinstance(symbol, (UserFunction, UserSub)):
+                    # inner scopes shadow outer scopes
+                    methods[sym_name] = symbol
+        self.graph.clear()
+        self.summaries.clear()
+        for sym_name, symbol in methods.items():
+            self.summaries[sym_name] = MethodSummary.from_symbol(
+                symbol, list(methods), sym_table
+            )
+            self.graph.add_node(sym_name)
+        for sym_name, summary in self.summaries.items():
+            self.graph.add_edges_from((sym_name, callee) for callee in summary.calls)
+
+        for component in self.components():
+            recursive = len(component) > 1 or any(
+                self.graph.has_edge(name, name) for name in component
+            )
+            for name in component:
+                summary = self.summaries[name]
+                summary.recursive = recursive
+                callees = [
+                    self.summaries[callee]
+                    for callee in summary.calls
+                    if callee not in component
+                ]
+                summary.pure = (
+                    not recursive
+                    and not summary.has_side_effects
+                    and all(callee.pure for callee in callees)
+                )
+                summary.inline_size = summary.num_stmts + sum(
+                    callee.inline_size
+                    for callee in callees
+                    if self.should_inline(callee.symbol.symbol_name)
+                )
+
+    def components(self) -> list[set[str]]:
+        """
+        Returns
+        -------
+        list[set[str]]
+            Strongly connected components of the graph,
+            every component comes after the components that it calls
+        """
+        condensed = nx.condensation(self.graph)
+        return [
+            condensed.nodes[comp_id]["members"]
+            for comp_id in reversed(list(nx.topological_sort(condensed)))
+        ]
+
+    def should_inline(self, name: str) -> bool:
+        """
+        Parameters
+        ----------
+        name : str
+            Name of a function or sub
+
+        Returns
+        -------
+        bool
+            False if calls of the function or sub should be emitted as calls
+            instead of being inlined: recursive functions and subs,
+            and large ones with side effects
+        """
+        if (summary := self.summaries.get(name, None)) is None:
+            # not part of the graph (e.g., declared after the graph was built)
+            return True
+        return not summary.recursive and (
+            summary.pure or summary.inline_size <= self.max_inline_size
+        )
+
+    def globals_written(self, name: str) -> frozenset[str]:
+        """
+        Parameters
+        ----------
+        name : str
+            Name of a function or sub
+
+        Returns
+        -------
+        frozenset[str]
+            Globals written by the function or sub,
+            or by any function or sub that it calls
+        """
+        if name not in self.summaries:
+            return frozenset()
+        return frozenset().union(
+            *(
+                self.summaries[method].globals_written
+                for method in nx.descendants(self.graph, name) | {name}
+            )
+        )
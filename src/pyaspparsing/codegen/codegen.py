@@ -1,11 +1,16 @@
 """codegen module"""
 
+from collections.abc import Hashable, Iterable, Iterator
 from io import StringIO
+from itertools import chain
+from pathlib import Path
 import sys
-from typing import IO
+from typing import IO, Optional
+import attrs
 from jinja2 import Environment
 from ..ast.tokenizer.state_machine import Tokenizer
 from ..ast.ast_types import (
+    generate_program,
     GlobalStmt,
     ProcessingDirective,
     OptionExplicit,
@@ -13,16 +18,250 @@ from ..ast.ast_types import (
     FunctionDecl,
     SubDecl,
     OutputText,
+    IncludeFile,
 )
-from .linker import Linker, generate_linked_program
+from ..ast.ast_types.ast_diff import structural_hash
+from .linker import Linker, link_statements
 from .generators import codegen_global_stmt, CodegenState  # pylint: disable=E0401
+from .call_graph import CallGraph
+from .dead_code import DeadCodeTracker
 from .scope import ScopeType
 from .symbols import Response, Request, Server
 from .symbols.functions import vbscript_builtin as vb_blt
 
 
+def _is_whitespace_output(glob_st: GlobalStmt) -> bool:
+    """Output between statements that is exclusively whitespace"""
+    return (
+        isinstance(glob_st, OutputText)
+        and len(glob_st.directives) == 0
+        and len(glob_st.chunks) == 1
+        and glob_st.chunks[0].isspace()
+    )
+
+
+def _new_codegen_state(lnk: Linker, file_path: Optional[Path] = None) -> CodegenState:
+    """Initialize a state object with the built-in symbols"""
+    cg_state = CodegenState(
+        Environment(), lnk, StringIO(), StringIO(), StringIO(), file_path=file_path
+    )
+    cg_state.add_symbol(Response())
+    cg_state.add_symbol(Request())
+    cg_state.add_symbol(Server())
+    for blt in filter(lambda x: x.find("builtin_", 0, 8) == 0, dir(vb_blt)):
+        cg_state.add_symbol(getattr(vb_blt, blt)())
+    # all script data should be handled in a separate "user" scope
+    cg_state.scope_mgr.enter_scope(ScopeType.SCOPE_SCRIPT_USER)
+    return cg_state
+
+
+def _declare_global_stmts(
+    glob_stmts: Iterable[GlobalStmt], cg_state: CodegenState, other_st: list[GlobalStmt]
+) -> bool:
+    """Generate code for setup statements and function/sub declarations,
+    all other statements are deferred to `other_st`
+
+    Returns
+    -------
+    bool
+        True if any function/sub declarations (or setup statements) were handled
+    """
+    user_methods = False
+    for glob_st in glob_stmts:
+        if isinstance(
+            glob_st,
+            (ProcessingDirective, OptionExplicit, ErrorStmt, FunctionDecl, SubDecl),
+        ):
+            # handle setup code and function/sub declarations first
+            # this alleviates a scope resolution issue since
+            # functions can be declared AFTER they're used
+            codegen_global_stmt(glob_st, cg_state, top_level=True)
+            if not user_methods:
+                user_methods = True
+        elif _is_whitespace_output(glob_st):
+            # ignore output between statements if the output is exclusively whitespace
+            continue
+        else:
+            # defer consideration of other code until after all functions/subs declared
+            other_st.append(glob_st)
+    return user_methods
+
+
+@attrs.define
+class CodegenSnapshot:
+    """Code generation state after the declarations of a common prefix
+    (e.g., the same list of includes at the start of many pages)
+
+    Attributes
+    ----------
+    prefix_len : int
+        Number of global statements in the prefix (ignoring whitespace output)
+
+    Methods
+    -------
+    match_prefix(glob_stmts, file_path)
+        Consume the prefix from the start of a page
+    fork()
+        Continue code generation from the snapshot
+    """
+
+    _prefix_keys: list[Hashable] = attrs.field(repr=False)
+    _cg_state: CodegenState = attrs.field(repr=False)
+    # prefix statements that are generated after all declarations
+    _deferred_st: list[GlobalStmt] = attrs.field(repr=False)
+    _user_methods: bool = attrs.field(repr=False)
+    # files included by the prefix, for Linker.include_once
+    _included: set[Path] = attrs.field(default=attrs.Factory(set), repr=False)
+
+    @property
+    def prefix_len(self) -> int:
+        """
+        Returns
+        -------
+        int
+        """
+        return len(self._prefix_keys)
+
+    @staticmethod
+    def prefix_key(
+        glob_st: GlobalStmt, lnk: Linker, file_path: Optional[Path] = None
+    ) -> Hashable:
+        """
+        Parameters
+        ----------
+        glob_st : GlobalStmt
+            Statement before linking
+        lnk : Linker
+        file_path : Path | None, default=None
+            Virtual path of the file that contains the statement
+
+        Returns
+        -------
+        Hashable
+            Includes are compared by resolved path and by the version
+            of every file in their expansion (see `Linker.include_version()`),
+            other statements are compared by structure
+        """
+        if (
+            isinstance(glob_st, IncludeFile)
+            and (
+                inc_path := lnk.resolve_include(
+                    file_path, glob_st.include_type, glob_st.include_path[1:-1]
+                )
+            )
+            is not None
+        ):
+            return (IncludeFile, inc_path, lnk.include_version(inc_path))
+        return structural_hash(glob_st)
+
+    def match_prefix(
+        self, glob_stmts: Iterator[GlobalStmt], file_path: Optional[Path] = None
+    ) -> tuple[bool, list[GlobalStmt]]:
+        """Consume statements from the start of a page for as long as
+        they match the prefix of the snapshot
+
+        Parameters
+        ----------
+        glob_stmts : Iterator[GlobalStmt]
+            Statements of the page before linking
+        file_path : Path | None, default=None
+            Virtual path of the page
+
+        Returns
+        -------
+        tuple[bool, list[GlobalStmt]]
+            Whether the entire prefix matched, and the consumed statements
+        """
+        consumed: list[GlobalStmt] = []
+        matched = 0
+        while (
+            matched < self.prefix_len
+            and (glob_st := next(glob_stmts, None)) is not None
+        ):
+            consumed.append(glob_st)
+            if _is_whitespace_output(glob_st):
+                continue
+            if (
+                CodegenSnapshot.prefix_key(glob_st, self._cg_state.lnk, file_path)
+                != self._prefix_keys[matched]
+            ):
+                break
+            matched += 1
+        return (matched == self.prefix_len, consumed)
+
+    def fork(self) -> tuple[CodegenState, list[GlobalStmt], bool, set[Path]]:
+        """
+        Returns
+        -------
+        tuple[CodegenState, list[GlobalStmt], bool, set[Path]]
+            Forked state, deferred prefix statements,
+            whether the prefix declared any functions/subs,
+            and the files included by the prefix
+        """
+        return (
+            self._cg_state.fork(StringIO(), StringIO(), StringIO()),
+            list(self._deferred_st),
+            self._user_methods,
+            set(self._included),
+        )
+
+
+def create_snapshot(
+    prefix_code: str,
+    lnk: Linker,
+    suppress_exc: bool = True,
+    exc_file: IO = sys.stdout,
+    *,
+    file_path: Optional[Path] = None,
+) -> CodegenSnapshot:
+    """Run code generation for the declarations of a common prefix once,
+    so that pages that start with the same prefix can be generated from a fork
+
+    Parameters
+    ----------
+    prefix_code : str
+        Code that every page starts with, usually a list of include directives
+    lnk : Linker
+    suppress_exc : bool, default=True
+    exc_file : IO, default=sys.stdout
+    file_path : Path | None, default=None
+        Virtual path used to resolve `file=` includes in the prefix
+
+    Returns
+    -------
+    CodegenSnapshot
+    """
+    cg_state = _new_codegen_state(lnk, file_path)
+    other_st: list[GlobalStmt] = []
+    with Tokenizer(prefix_code, suppress_exc, exc_file) as tkzr:
+        prefix_st = list(generate_program(tkzr))
+    included: set[Path] = set()
+    user_methods = _declare_global_stmts(
+        link_statements(prefix_st, lnk, file_path, included), cg_state, other_st
+    )
+    return CodegenSnapshot(
+        [
+            CodegenSnapshot.prefix_key(glob_st, lnk, file_path)
+            for glob_st in prefix_st
+            if not _is_whitespace_output(glob_st)
+        ],
+        cg_state,
+        other_st,
+        user_methods,
+        included,
+    )
+
+
 def generate_code(
-    codeblock: str, lnk: Linker, suppress_exc: bool = True, exc_file: IO = sys.stdout
+    codeblock: str,
+    lnk: Linker,
+    suppress_exc: bool = True,
+    exc_file: IO = sys.stdout,
+    *,
+    file_path: Optional[Path] = None,
+    snapshot: Optional[CodegenSnapshot] = None,
+    retain_scopes: bool = False,
+    eliminate_dead_code: bool = False,
 ) -> CodegenState:
     """Separate codeblock into a template and a script
 
@@ -32,48 +271,57 @@ def generate_code(
     lnk : Linker
     suppress_exc : bool, default=True
     exc_file : IO, default=sys.stdout
+    file_path : Path | None, default=None
+        Virtual path of the codeblock, used to resolve `file=` includes
+    snapshot : CodegenSnapshot | None, default=None
+        If the codeblock starts with the prefix of the snapshot,
+        code generation continues from a fork of the snapshot
+    retain_scopes : bool, default=False
+        Keep the symbols of every scope after it is exited (for debugging)
+    eliminate_dead_code : bool, default=False
+        Remove dead stores and unused variable declarations
+        of top-level statements from the generated script
 
     Returns
     -------
     CodegenState
     """
-    # initialize state object
-    cg_state = CodegenState(Environment(), lnk, StringIO(), StringIO(), StringIO())
-    cg_state.add_symbol(Response())
-    cg_state.add_symbol(Request())
-    cg_state.add_symbol(Server())
-    for blt in filter(lambda x: x.find("builtin_", 0, 8) == 0, dir(vb_blt)):
-        cg_state.add_symbol(getattr(vb_blt, blt)())
-    # all script data should be handled in a separate "user" scope
-    cg_state.scope_mgr.enter_scope(ScopeType.SCOPE_SCRIPT_USER)
-    # separate function/sub declarations from other code
-    other_st: list[GlobalStmt] = []
+    # start parsing included files before the statements that use them
+    lnk.prefetch_includes(codeblock, file_path)
     with Tokenizer(codeblock, suppress_exc, exc_file) as tkzr:
-        # file contains user-defined functions/subs?
-        user_methods = False
-        for glob_st in generate_linked_program(tkzr, lnk):
-            if isinstance(
-                glob_st,
-                (ProcessingDirective, OptionExplicit, ErrorStmt, FunctionDecl, SubDecl),
-            ):
-                # handle setup code and function/sub declarations first
-                # this alleviates a scope resolution issue since
-                # functions can be declared AFTER they're used
-                codegen_global_stmt(glob_st, cg_state, top_level=True)
-                if not user_methods:
-                    user_methods = True
-            elif isinstance(glob_st, OutputText):
-                if (
-                    len(glob_st.directives) == 0
-                    and len(glob_st.chunks) == 1
-                    and glob_st.chunks[0].isspace()
-                ):
-                    # ignore output between statements if the output is exclusively whitespace
-                    continue
-                other_st.append(glob_st)
-            else:
-                # defer consideration of other code until after all functions/subs declared
-                other_st.append(glob_st)
+        glob_stmts = generate_program(tkzr)
+        consumed: list[GlobalStmt] = []
+        other_st: list[GlobalStmt]
+        included: set[Path]
+        prefix_matched = False
+        if snapshot is not None:
+            prefix_matched, consumed = snapshot.match_prefix(glob_stmts, file_path)
+        if snapshot is not None and prefix_matched:
+            cg_state, other_st, user_methods, included = snapshot.fork()
+            consumed.clear()
+        else:
+            # page does not share the prefix (if any), start from scratch
+            # with the statements that were consumed while matching
+            cg_state = _new_codegen_state(lnk)
+            other_st, user_methods, included = [], False, set()
+        cg_state.file_path = file_path
+        cg_state.retain_scopes = retain_scopes
+        if eliminate_dead_code:
+            cg_state.dead_code = DeadCodeTracker()
+        # separate function/sub declarations from other code
+        if _declare_global_stmts(
+            link_statements(chain(consumed, glob_stmts), lnk, file_path, included),
+            cg_state,
+            other_st,
+        ):
+            # file contains user-defined functions/subs
+            user_methods = True
+        if user_methods:
+            # decide which functions/subs are inlined before any of them are called
+            cg_state.call_graph = CallGraph()
+            cg_state.call_graph.build(
+                cg_state.sym_table, cg_state.scope_mgr.current_environment
+            )
         if user_methods and len(other_st) > 0:
             # add a blank line for readability
             print("\n", end="", file=cg_state.script_file)
@@ -82,4 +330,6 @@ def generate_code(
             codegen_global_stmt(remaining_st, cg_state, top_level=True)
     if cg_state.in_script_block:
         cg_state.end_script_block()
+    if cg_state.dead_code is not None:
+        cg_state.dead_code.remove(cg_state)
     return cg_state
@@ -0,0 +1,184 @@
+"""dead_code module"""
+
+from io import StringIO
+from typing import Any
+import attrs
+from ..ast.ast_types import GlobalStmt, LeftExpr, AssignStmt, VarDecl
+from ..ast.ast_types.traversal import iter_nodes, left_expr_names
+from .generators import CodegenState  # pylint: disable=E0401
+from .symbols.asp_object import ASPObject
+from .symbols.symbol import ValueSymbol, ConstantSymbol
+
+
+def _is_plain_name(left_expr: Any) -> bool:
+    """Left expression that only contains a symbol name"""
+    return (
+        type(left_expr) is LeftExpr  # pylint: disable=C0123
+        and len(left_expr.subnames) == 0
+        and len(left_expr.call_args) == 0
+    )
+
+
+def _is_pure(node: Any, cg_state: CodegenState) -> bool:
+    """Whether every left expression inside of `node` reads a value
+    without calling a function or using an object"""
+    curr_env = cg_state.scope_mgr.current_environment
+    for obj in iter_nodes(node):
+        if not isinstance(obj, LeftExpr):
+            continue
+        if not _is_plain_name(obj):
+            return False
+        if (
+            resv := cg_state.sym_table.nearest_symbol(
+                obj.sym_name, curr_env, track=False
+            )
+        ) is None:
+            # implicitly declared variable
+            continue
+        if isinstance(resv.symbol, ConstantSymbol):
+            continue
+        if not isinstance(resv.symbol, ValueSymbol) or isinstance(
+            resv.symbol.value, ASPObject
+        ):
+            return False
+    return True
+
+
+@attrs.define
+class DeadCodeTracker:
+    """Find top-level statements whose generated code can be removed
+
+    A store is dead if the variable is assigned again, or never used again,
+    before it is read. A variable declaration is unused if none of its
+    variables are ever read or assigned to
+
+    Only assignments of values that don't call a function or use an object
+    can be removed. Any other statement can read variables indirectly
+    (e.g., through a function body), so every earlier store is kept.
+    Reads are taken from the names in each statement and from
+    the usage statistics of the symbol table
+
+    Attributes
+    ----------
+    dead_code : dict[tuple[int, int], str]
+        Span of the generated script and description of every dead statement
+
+    Methods
+    -------
+    record(stmt, start, stop, cg_state)
+        Analyze a top-level statement after its code was generated
+    remove(cg_state)
+        Remove every dead statement from the generated script
+    """
+
+    dead_code: dict[tuple[int, int], str] = attrs.field(
+        default=attrs.Factory(dict), init=False
+    )
+    # last store of each variable that hasn't been read yet:
+    # span of the generated code, reads of the variable after the store
+    _stores: dict[str, tuple[int, int, int]] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+    # span of the generated code and symbol IDs of every variable declaration
+    _decls: list[tuple[int, int, list[int]]] = attrs.field(
+        default=attrs.Factory(list), repr=False, init=False
+    )
+
+    def record(self, stmt: GlobalStmt, start: int, stop: int, cg_state: CodegenState):
+        """
+        Parameters
+        ----------
+        stmt : GlobalStmt
+            Top-level statement
+        start : int
+            Position in the script file before the code of `stmt` was written
+        stop : int
+            Position in the script file after the code of `stmt` was written
+        cg_state : CodegenState
+        """
+        assign_st = (
+            stmt
+            if isinstance(stmt, AssignStmt) and _is_plain_name(stmt.target_expr)
+            else None
+        )
+        target = assign_st.target_expr.sym_name if assign_st is not None else None
+        read_node = assign_st.assign_expr if assign_st is not None else stmt
+        if not _is_pure(read_node, cg_state):
+            # statement may read any variable
+            self._stores.clear()
+            target = None
+        else:
+            for sym_name in left_expr_names(read_node):
+                self._stores.pop(sym_name, None)
+
+        if isinstance(stmt, VarDecl):
+            curr_scope = cg_state.sym_table.sym_scopes[
+                cg_state.scope_mgr.current_environment[-1]
+            ]
+            self._decls.append(
+                (
+                    start,
+                    stop,
+                    [
+                        curr_scope.symbol_id(var_name.extended_id.id_code)
+                        for var_name in stmt.var_name
+                    ],
+                )
+            )
+        if assign_st is None or target is None or start == stop:
+            return
+        if not _is_pure(assign_st.target_expr, cg_state):
+            # not a simple variable (e.g., an array or a function return value)
+            self._stores.pop(target, None)
+            return
+        num_reads = cg_state.sym_table.reads(target)
+        prev_store = self._stores.get(target, None)
+        if prev_store is not None and prev_store[2] == num_reads:
+            # assigned again without being read
+            self.dead_code[prev_store[:2]] = f"Removed dead store to {target}"
+        self._stores[target] = (start, stop, num_reads)
+
+    def _finish(self, cg_state: CodegenState):
+        """Find dead code that is only known at the end of the page"""
+        for sym_name, (start, stop, num_reads) in self._stores.items():
+            if cg_state.sym_table.reads(sym_name) == num_reads:
+                # never read after the last store
+                self.dead_code[(start, stop)] = f"Removed dead store to {sym_name}"
+        self._stores.clear()
+        usage = cg_state.sym_table.symbol_usage()
+        for start, stop, symbol_ids in self._decls:
+            if all(
+                symbol_id in usage
+                and usage[symbol_id].reads == 0
+                and usage[symbol_id].writes == 0
+                for symbol_id in symbol_ids
+            ):
+                self.dead_code[(start, stop)] = (
+                    "Removed unused variable declaration ("
+                    + ", ".join(
+                        usage[symbol_id].symbol_name for symbol_id in symbol_ids
+                    )
+                    + ")"
+                )
+        self._decls.clear()
+
+    def remove(self, cg_state: CodegenState):
+        """
+        Parameters
+        ----------
+        cg_state : CodegenState
+            State after code generation, the script file must be a StringIO object
+        """
+        self._finish(cg_state)
+        if len(self.dead_code) == 0:
+            return
+        assert isinstance(cg_state.script_file, StringIO)
+        script = cg_state.script_file.getvalue()
+        pruned = StringIO()
+        pos = 0
+        for (start, stop), message in sorted(self.dead_code.items()):
+            pruned.write(script[pos:start])
+            pos = stop
+            print(message, file=cg_state.error_file)
+        pruned.write(script[pos:])
+        cg_state.script_file = pruned
@@ -88,10 +88,18 @@ def codegen_global_stmt(
         ):
             cg_state.start_script_block()
         ret = str(reg_stmt_cg[type(stmt)](stmt, cg_state))
+        if cg_state.dead_code is not None:
+            start = cg_state.script_file.tell()
         print(
             ret,
             end="" if len(ret) == 0 else "\n",
             file=cg_state.script_file,
         )
+        if cg_state.dead_code is not None:
+            cg_state.dead_code.record(
+                stmt, start, cg_state.script_file.tell(), cg_state
+            )
+        # nothing refers to the scopes of a finished top-level statement
+        cg_state.collect_scopes()
         return None
     return reg_stmt_cg[type(stmt)](stmt, cg_state)
@@ -1,10 +1,14 @@
 """Code generator state classes"""
 
+import copy
+from io import StringIO
 from itertools import groupby
 from operator import itemgetter
+from pathlib import Path
 import re
 import sys
-from typing import Optional, Any, IO
+from collections.abc import Callable, Hashable
+from typing import Optional, Any, IO, TYPE_CHECKING
 
 import attrs
 from jinja2 import Environment
@@ -16,6 +20,12 @@ from ..symbols.symbol import Symbol, FunctionReturnSymbol
 from ..symbols.symbol_table import SymbolTable
 from ..symbols.functions.function import UserFunction, UserSub
 from ..symbols.adodb_base import Database, Query, RecordField
+from .codegen_return import CodegenReturn
+
+if TYPE_CHECKING:
+    # call_graph imports the symbols package, which imports this module
+    from ..call_graph import CallGraph
+    from ..dead_code import DeadCodeTracker
 
 
 @attrs.define
@@ -31,6 +41,158 @@ class FunctionReturnPointer:
     symbol_name: str
 
 
+@attrs.define
+class CallMemoEntry:
+    """Result of generating code for a call of a user-defined function or sub
+
+    Attributes
+    ----------
+    cg_ret : CodegenReturn
+        Code generated for the body of the function or sub
+    return_value : Any
+        Value of the function return symbol at the end of the body, None for subs
+    first_scope : int
+        ID of the call scope
+    num_scopes : int
+        Number of scopes entered by the call, including the call scope
+    messages : str
+        Diagnostics written to the error file while generating the body
+    """
+
+    cg_ret: CodegenReturn = attrs.field(default=attrs.Factory(CodegenReturn))
+    return_value: Any = attrs.field(default=None)
+    first_scope: int = attrs.field(default=0)
+    num_scopes: int = attrs.field(default=1)
+    messages: str = attrs.field(default="", repr=False)
+
+
+@attrs.define
+class CallMemo:
+    """Generated code of user-defined function and sub calls by call signature
+
+    A call signature combines the function or sub symbol, the constant values
+    (or expressions) of the arguments, and the version of every symbol
+    outside of the function that its body can read
+
+    Attributes
+    ----------
+    enabled : bool, default=True
+    hits : int
+    misses : int
+
+    Methods
+    -------
+    get(key)
+    put(key, entry, refs)
+    free_names(call_sym, compute)
+        Names that the body of a function or sub reads from enclosing scopes
+    exclude(call_sym)
+        Stop memoizing calls of a function or sub
+    is_excluded(call_sym)
+    fork()
+    """
+
+    enabled: bool = attrs.field(default=True)
+    hits: int = attrs.field(default=0, init=False)
+    misses: int = attrs.field(default=0, init=False)
+    _entries: dict[Hashable, CallMemoEntry] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+    # keys contain object IDs, keep those objects alive as long as the memo
+    _refs: list[Any] = attrs.field(default=attrs.Factory(list), repr=False, init=False)
+    _free_names: dict[int, tuple[Symbol, frozenset[str]]] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+    # functions and subs with side effects, by object ID
+    _excluded: dict[int, Symbol] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+
+    def get(self, key: Hashable) -> Optional[CallMemoEntry]:
+        """
+        Parameters
+        ----------
+        key : Hashable
+            Call signature
+
+        Returns
+        -------
+        CallMemoEntry | None
+        """
+        if (entry := self._entries.get(key, None)) is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, entry: CallMemoEntry, refs: list[Any]):
+        """
+        Parameters
+        ----------
+        key : Hashable
+            Call signature
+        entry : CallMemoEntry
+        refs : list[Any]
+            Objects whose IDs are part of `key`
+        """
+        self._entries[key] = entry
+        self._refs.extend(refs)
+
+    def free_names(
+        self, call_sym: Symbol, compute: Callable[[], frozenset[str]]
+    ) -> frozenset[str]:
+        """
+        Parameters
+        ----------
+        call_sym : Symbol
+            UserFunction or UserSub symbol
+        compute : Callable[[], frozenset[str]]
+            Called on the first request for `call_sym`
+
+        Returns
+        -------
+        frozenset[str]
+        """
+        if (cached := self._free_names.get(id(call_sym), None)) is None:
+            cached = self._free_names[id(call_sym)] = (call_sym, compute())
+        return cached[1]
+
+    def exclude(self, call_sym: Symbol):
+        """
+        Parameters
+        ----------
+        call_sym : Symbol
+            UserFunction or UserSub symbol
+        """
+        self._excluded[id(call_sym)] = call_sym
+
+    def is_excluded(self, call_sym: Symbol) -> bool:
+        """
+        Parameters
+        ----------
+        call_sym : Symbol
+
+        Returns
+        -------
+        bool
+        """
+        return id(call_sym) in self._excluded
+
+    def fork(self) -> "CallMemo":
+        """
+        Returns
+        -------
+        CallMemo
+            Copy of the memo that can be extended independently
+        """
+        forked = CallMemo(self.enabled)
+        forked._entries = dict(self._entries)
+        forked._refs = list(self._refs)
+        forked._free_names = dict(self._free_names)
+        forked._excluded = dict(self._excluded)
+        return forked
+
+
 @attrs.define
 class CodegenState:
     """
@@ -41,9 +203,22 @@ class CodegenState:
     script_file : IO
     template_file : IO
     error_file : IO
+    file_path : Path | None, default=None
+        Virtual path of the file whose statements are being generated,
+        used to resolve `file=` includes
     scope_mgr : ScopeManager
     sym_table : SymbolTable
     func_returns : list[tuple[int, str]]
+    call_memo : CallMemo
+    call_graph : CallGraph | None
+        Summaries of the user-defined functions and subs, None to inline every call
+    retain_scopes : bool, default=False
+        Keep the symbols of exited scopes for debugging
+    dead_code : DeadCodeTracker | None
+        Dead stores and unused variables of the top-level statements,
+        None to keep every statement
+    collected_scopes : int
+        Number of exited scopes whose symbols were removed
 
     Methods
     -------
@@ -51,6 +226,12 @@ class CodegenState:
         Create a new script output block
     end_script_block()
         End the current script output block
+    side_effects()
+        Counters of the output recorded outside of generated code
+    collect_scopes()
+        Remove the symbols of exited scopes
+    fork(script_file, template_file, error_file)
+        Continue code generation from a copy of this state
     """
 
     jinja_env: Environment
@@ -58,6 +239,7 @@ class CodegenState:
     script_file: IO
     template_file: IO
     error_file: IO = attrs.field(default=sys.stderr)
+    file_path: Optional[Path] = attrs.field(default=None, kw_only=True)
     scope_mgr: ScopeManager = attrs.field(
         default=attrs.Factory(ScopeManager), init=False
     )
@@ -87,6 +269,13 @@ class CodegenState:
         default=attrs.Factory(list), repr=False, init=False
     )
 
+    call_memo: CallMemo = attrs.field(default=attrs.Factory(CallMemo), init=False)
+    call_graph: Optional["CallGraph"] = attrs.field(default=None, init=False)
+
+    retain_scopes: bool = attrs.field(default=False, kw_only=True)
+    collected_scopes: int = attrs.field(default=0, init=False)
+    dead_code: Optional["DeadCodeTracker"] = attrs.field(default=None, init=False)
+
     @property
     def in_script_block(self) -> bool:
         """Flag indicating whether the previous global statement was
@@ -200,9 +389,7 @@ class CodegenState:
         AssertionError
         """
         assert (
-            self.scope_mgr.scope_registry.nodes[self.scope_mgr.current_scope][
-                "scope_type"
-            ]
+            self.scope_mgr.scope_type(self.scope_mgr.current_scope)
             == ScopeType.SCOPE_FUNCTION_DEFINITION
         ), "Function must be defined within a function definition scope"
         assert (
@@ -239,9 +426,7 @@ class CodegenState:
         AssertionError
         """
         assert (
-            self.scope_mgr.scope_registry.nodes[self.scope_mgr.current_scope][
-                "scope_type"
-            ]
+            self.scope_mgr.scope_type(self.scope_mgr.current_scope)
             == ScopeType.SCOPE_SUB_DEFINITION
         ), "Sub must be defined within a sub definition scope"
         assert (
@@ -274,9 +459,8 @@ class CodegenState:
         AssertionError
         """
         assert (
-            call_scope in self.scope_mgr.scope_registry
-            and self.scope_mgr.scope_registry.nodes[call_scope]["scope_type"]
-            == ScopeType.SCOPE_FUNCTION_CALL
+            self.scope_mgr.has_scope(call_scope)
+            and self.scope_mgr.scope_type(call_scope) == ScopeType.SCOPE_FUNCTION_CALL
         ), "call_scope must point to a function call scope"
         assert (
             (scp_sym := self.sym_table.sym_scopes.get(call_scope, None)) is not None
@@ -450,3 +634,93 @@ class CodegenState:
         assert self._in_script_block and self.current_script_block is not None
         self._in_script_block = False
         print(f"END {self.current_script_block}\n", file=self.script_file)
+
+    def side_effects(self) -> tuple[Any, ...]:
+        """Counters of everything a statement can record besides its generated code
+        (output expressions, script blocks, database objects, function returns)
+
+        Returns
+        -------
+        tuple[Any, ...]
+            Equal before and after a statement without such side effects
+        """
+        return (
+            self._in_script_block,
+            len(self._script_blocks),
+            len(self._func_returns),
+            self._curr_output_id,
+            len(self.db_cxns),
+            len(self.db_queries),
+            len(self.db_query_fields),
+        )
+
+    def collect_scopes(self) -> int:
+        """Remove the symbols of transient scopes that have been exited
+
+        Scopes that are still referenced by a function return pointer
+        are kept until a later collection. Does nothing if `retain_scopes` is set
+
+        Returns
+        -------
+        int
+            Number of scopes removed
+        """
+        if self.retain_scopes or len(self.scope_mgr.exited) == 0:
+            return 0
+        referenced = {ret_pnt.call_scope for ret_pnt in self._func_returns}
+        kept: list[int] = []
+        num_removed = 0
+        for scope_id in self.scope_mgr.exited:
+            if scope_id in referenced:
+                kept.append(scope_id)
+            elif self.sym_table.remove_scope(scope_id):
+                num_removed += 1
+        self.scope_mgr.exited = kept
+        self.collected_scopes += num_removed
+        return num_removed
+
+    def fork(
+        self, script_file: IO, template_file: IO, error_file: IO = sys.stderr
+    ) -> "CodegenState":
+        """Continue code generation from a copy of this state
+
+        The symbol table is forked copy-on-write, so symbol scopes are only copied
+        once they are used by either state. Output written so far is replayed
+        into the new files
+
+        Parameters
+        ----------
+        script_file : IO
+        template_file : IO
+        error_file : IO, default=sys.stderr
+
+        Returns
+        -------
+        CodegenState
+
+        Raises
+        ------
+        AssertionError
+            If the script or template output of this state cannot be replayed
+        """
+        assert isinstance(self.script_file, StringIO) and isinstance(
+            self.template_file, StringIO
+        ), "Only states that write to StringIO objects can be forked"
+        forked = copy.copy(self)
+        forked.script_file = script_file
+        forked.template_file = template_file
+        forked.error_file = error_file
+        print(self.script_file.getvalue(), end="", file=script_file)
+        print(self.template_file.getvalue(), end="", file=template_file)
+        forked.scope_mgr = self.scope_mgr.fork()
+        forked.sym_table = self.sym_table.fork()
+        forked._script_blocks = list(self._script_blocks)
+        forked._func_returns = list(self._func_returns)
+        forked.output_exprs = dict(self.output_exprs)
+        forked.db_cxns = list(self.db_cxns)
+        forked.db_queries = list(self.db_queries)
+        forked.db_query_fields = list(self.db_query_fields)
+        forked._cxn_to_query = list(self._cxn_to_query)
+        forked._query_to_field = list(self._query_to_field)
+        forked.call_memo = self.call_memo.fork()
+        return forked
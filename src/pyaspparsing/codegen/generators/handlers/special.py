@@ -2,7 +2,6 @@
 # IncludeFile
 # OutputText
 
-from pathlib import Path
 from ....ast.ast_types import (
     EvalExpr,
     LeftExpr,
@@ -66,27 +65,38 @@ def cg_include_file(
     CodegenReturn
     """
     # try to include file
-    inc_path = Path(stmt.include_path[1:-1])
-    if (inc_prog := cg_state.lnk.request(inc_path)) is not None:
-        for glob_st in inc_prog.global_stmt_list:
-            if isinstance(glob_st, OutputText) and (
-                len(glob_st.directives) == 0
-                and len(glob_st.chunks) == 1
-                and glob_st.chunks[0].isspace()
-            ):
-                # ignore output between statements if the output is exclusively whitespace
-                continue
-            cg_ret.combine(
-                codegen_global_stmt(
-                    (
-                        Parser.reinterpret_output_block(glob_st)
-                        if isinstance(glob_st, OutputText)
-                        else glob_st
+    inc_path = cg_state.lnk.resolve_include(
+        cg_state.file_path, stmt.include_type, stmt.include_path[1:-1]
+    )
+    if (
+        inc_path is not None
+        and (inc_prog := cg_state.lnk.request(inc_path)) is not None
+    ):
+        # file= includes of the included file are relative to that file
+        includer = cg_state.file_path
+        cg_state.file_path = inc_path
+        try:
+            for glob_st in inc_prog.global_stmt_list:
+                if isinstance(glob_st, OutputText) and (
+                    len(glob_st.directives) == 0
+                    and len(glob_st.chunks) == 1
+                    and glob_st.chunks[0].isspace()
+                ):
+                    # ignore output between statements if the output is exclusively whitespace
+                    continue
+                cg_ret.combine(
+                    codegen_global_stmt(
+                        (
+                            Parser.reinterpret_output_block(glob_st)
+                            if isinstance(glob_st, OutputText)
+                            else glob_st
+                        ),
+                        cg_state,
                     ),
-                    cg_state,
-                ),
-                indent=False,
-            )
+                    indent=False,
+                )
+        finally:
+            cg_state.file_path = includer
     else:
         print(f"Unresolved include: {stmt.include_path}", file=cg_state.error_file)
     return cg_ret
@@ -1,13 +1,18 @@
+from collections.abc import Hashable
+from contextlib import contextmanager
 from difflib import SequenceMatcher
 from inspect import signature, Signature
 from io import StringIO
-from typing import Any, Generator
+from typing import Any, Generator, Optional
 import attrs
+from .... import EvaluatorError
 from ....ast.ast_types import (
     FormatterMixin,
     Expr,
     EvalExpr,
     LeftExpr,
+    BlockStmt,
+    InlineStmt,
     PropertyExpr,
     ResponseExpr,
     RequestExpr,
@@ -29,6 +34,8 @@ from ....ast.ast_types import (
     ExitStmt,
     EraseStmt,
 )
+from ....ast.ast_types.expression_compiler import compile_expr
+from ....ast.ast_types.traversal import left_expr_names
 from ...symbols.asp_object import ASPObject
 from ...symbols.symbol import (
     ValueSymbol,
@@ -40,9 +47,10 @@ from ...symbols.symbol import (
     ForLoopIteratorTargetSymbol,
 )
 from ...symbols.symbol_table import ResolvedSymbol
+from ...symbols.table_snapshot import SymbolTableSnapshot
 from ...symbols.functions.function import ASPFunction, UserFunction, UserSub
 from ...scope import ScopeType
-from ..codegen_state import CodegenState
+from ..codegen_state import CodegenState, CallMemoEntry
 from ..codegen_return import CodegenReturn
 from ..codegen_reg import create_global_cg_func, codegen_global_stmt
 from .expression_finalizer import finalize_expr
@@ -280,12 +288,318 @@ def cghelper_setup_user_arguments(
             )
             assert len(arg_resv) > 0
             # refer to the name in the nearest enclosing scope
-            cg_state.sym_table.sym_scopes[call_scp].sym_table[marg].ref_name = arg_resv[
-                -1
-            ].symbol.symbol_name
-            cg_state.sym_table.sym_scopes[call_scp].sym_table[
-                marg
-            ].ref_scope = arg_resv[-1].scope
+            arg_sym = cg_state.sym_table.sym_scopes[call_scp].materialize(marg)
+            arg_sym.ref_name = arg_resv[-1].symbol.symbol_name
+            arg_sym.ref_scope = arg_resv[-1].scope
+
+
+def cghelper_free_names(
+    call_sym: UserFunction | UserSub, cg_state: CodegenState
+) -> frozenset[str]:
+    """
+    Parameters
+    ----------
+    call_sym : UserFunction | UserSub
+    cg_state : CodegenState
+
+    Returns
+    -------
+    frozenset[str]
+        Names used in the body that are not defined in the definition scope
+    """
+
+    def _compute() -> frozenset[str]:
+        nonlocal call_sym, cg_state
+        if isinstance(call_sym, UserFunction):
+            def_scope, body = call_sym.func_scope_id, call_sym.func_body
+        else:
+            def_scope, body = call_sym.sub_scope_id, call_sym.sub_body
+        local_names = (
+            cg_state.sym_table.sym_scopes[def_scope].sym_table
+            if def_scope in cg_state.sym_table.sym_scopes
+            else {}
+        )
+        return frozenset(
+            name for name in left_expr_names(body) if name not in local_names
+        )
+
+    return cg_state.call_memo.free_names(call_sym, _compute)
+
+
+def cghelper_call_signature(
+    call_sym: UserFunction | UserSub, cargs: tuple[Any, ...], cg_state: CodegenState
+) -> Optional[tuple[Hashable, list[Any]]]:
+    """Memo key of a call to a user-defined function or sub
+
+    Parameters
+    ----------
+    call_sym : UserFunction | UserSub
+    cargs : tuple[Any, ...]
+        Arguments of the call
+    cg_state : CodegenState
+
+    Returns
+    -------
+    tuple[Hashable, list[Any]] | None
+        Key and the objects whose IDs are part of the key,
+        or None if the call cannot be memoized
+    """
+    memo = cg_state.call_memo
+    if not memo.enabled or memo.is_excluded(call_sym):
+        return None
+    curr_env = cg_state.scope_mgr.current_environment
+    names = set(cghelper_free_names(call_sym, cg_state))
+    # abstract argument values: constants, or the expression that was passed
+    arg_sig: list[Hashable] = []
+    for carg, arg_val in zip(
+        cargs, cg_state.sym_table.try_resolve_args(cargs, curr_env)
+    ):
+        if isinstance(arg_val, EvalExpr):
+            const_val = arg_val.expr_value
+            try:
+                hash(const_val)
+            except TypeError:
+                const_val = repr(const_val)
+            arg_sig.append((type(arg_val.expr_value).__name__, const_val))
+        else:
+            arg_sig.append(repr(carg))
+            names.update(left_expr_names(carg))
+    # version of every outer symbol that the body can read,
+    # including the bodies of other functions and subs that it calls
+    outer_state: list[Hashable] = []
+    refs: list[Any] = [call_sym]
+    visited = {id(call_sym)}
+    pending = sorted(names, reverse=True)
+    while len(pending) > 0:
+        name = pending.pop()
+        if (
+            resv := cg_state.sym_table.nearest_symbol(name, curr_env, track=False)
+        ) is None:
+            outer_state.append((name, None))
+            continue
+        sym = resv.symbol
+        if isinstance(sym, ASPObject) or (
+            isinstance(sym, ValueSymbol) and isinstance(sym.value, ASPObject)
+        ):
+            # objects keep state outside of the symbol table
+            return None
+        if isinstance(sym, (UserFunction, UserSub)) and id(sym) not in visited:
+            visited.add(id(sym))
+            pending.extend(
+                sorted(cghelper_free_names(sym, cg_state) - names, reverse=True)
+            )
+            names.update(cghelper_free_names(sym, cg_state))
+        outer_state.append(
+            (
+                name,
+                resv.scope,
+                id(sym),
+                cg_state.sym_table.sym_scopes[resv.scope].version(name),
+            )
+        )
+        refs.append(sym)
+    return ((id(call_sym), tuple(arg_sig), tuple(outer_state)), refs)
+
+
+@contextmanager
+def cghelper_memoize_call(
+    call_sym: UserFunction | UserSub,
+    cargs: tuple[Any, ...],
+    memo_key: Optional[tuple[Hashable, list[Any]]],
+    cg_state: CodegenState,
+) -> Generator[Optional[CallMemoEntry], None, None]:
+    """Record the code generated for a call
+
+    The body of the with statement fills in `cg_ret` and `return_value`
+    of the yielded entry. The entry is only saved if the call had no effect
+    outside of its own scopes; otherwise, the function or sub is excluded
+    from memoization
+
+    Parameters
+    ----------
+    call_sym : UserFunction | UserSub
+    cargs : tuple[Any, ...]
+    memo_key : tuple[Hashable, list[Any]] | None
+        Result of `cghelper_call_signature()`, nothing is recorded if None
+    cg_state : CodegenState
+
+    Yields
+    ------
+    CallMemoEntry | None
+    """
+    if memo_key is None:
+        yield None
+        return
+    entry = CallMemoEntry(first_scope=cg_state.scope_mgr.num_scopes)
+    effects = cg_state.side_effects()
+    error_file = cg_state.error_file
+    cg_state.error_file = StringIO()
+    try:
+        yield entry
+    finally:
+        entry.messages = cg_state.error_file.getvalue()
+        cg_state.error_file = error_file
+        print(entry.messages, end="", file=error_file)
+    entry.num_scopes = cg_state.scope_mgr.num_scopes - entry.first_scope
+    if (
+        cg_state.side_effects() != effects
+        # if statements print the IDs of their scopes
+        or any(
+            cg_state.scope_mgr.scope_type(scope_id) == ScopeType.SCOPE_IF_BRANCH
+            for scope_id in range(entry.first_scope + 1, cg_state.scope_mgr.num_scopes)
+        )
+        # body modified an outer symbol
+        or (after_key := cghelper_call_signature(call_sym, cargs, cg_state)) is None
+        or after_key[0] != memo_key[0]
+    ):
+        cg_state.call_memo.exclude(call_sym)
+        return
+    cg_state.call_memo.put(memo_key[0], entry, memo_key[1])
+
+
+def cghelper_replay_call(
+    entry: CallMemoEntry,
+    def_scope: int,
+    ret_name: Optional[str],
+    cg_state: CodegenState,
+) -> CodegenReturn:
+    """Repeat a memoized call without generating code for the body again
+
+    Parameters
+    ----------
+    entry : CallMemoEntry
+    def_scope : int
+        Definition scope of the function or sub
+    ret_name : str | None
+        Name of the function return symbol, None for subs
+    cg_state : CodegenState
+
+    Returns
+    -------
+    CodegenReturn
+    """
+    # enter the same number of scopes, so that later scope IDs do not change
+    call_scp = cg_state.scope_mgr.replay_scopes(
+        entry.first_scope, entry.first_scope + entry.num_scopes
+    )
+    cg_state.sym_table.overlay_scope(def_scope, call_scp)
+    if ret_name is not None:
+        cg_state.sym_table.sym_scopes[call_scp].materialize(
+            ret_name
+        ).return_value = entry.return_value
+        cg_state.add_function_return(call_scp, ret_name)
+    print(entry.messages, end="", file=cg_state.error_file)
+    cg_ret = CodegenReturn()
+    cg_ret.combine(entry.cg_ret, indent=False)
+    return cg_ret
+
+
+def cghelper_should_inline(
+    call_sym: UserFunction | UserSub, cg_state: CodegenState
+) -> bool:
+    """
+    Parameters
+    ----------
+    call_sym : UserFunction | UserSub
+    cg_state : CodegenState
+
+    Returns
+    -------
+    bool
+        False if the call should be emitted as a call (see `CallGraph.should_inline()`)
+    """
+    return cg_state.call_graph is None or cg_state.call_graph.should_inline(
+        call_sym.symbol_name
+    )
+
+
+def cghelper_forget_call_effects(
+    call_sym: UserFunction | UserSub, left_expr: LeftExpr, cg_state: CodegenState
+):
+    """Mark every variable that a call which was not inlined may assign to
+    as a runtime value, so that its value before the call is not used anymore
+
+    These are the globals written by the function or sub (including the functions
+    and subs that it calls), and the variables passed by reference
+
+    Parameters
+    ----------
+    call_sym : UserFunction | UserSub
+    left_expr : LeftExpr
+    cg_state : CodegenState
+    """
+    names: set[str] = set()
+    if cg_state.call_graph is not None:
+        names.update(cg_state.call_graph.globals_written(call_sym.symbol_name))
+    def_scope = cg_state.sym_table.sym_scopes.peek(
+        (
+            call_sym.func_scope_id
+            if isinstance(call_sym, UserFunction)
+            else call_sym.sub_scope_id
+        ),
+        None,
+    )
+    cargs = left_expr.call_args.get(left_expr.end_idx - 1, None) or ()
+    for marg, carg in zip(call_sym.arg_names, cargs):
+        if (
+            def_scope is not None
+            and isinstance(def_scope.sym_table.get(marg, None), ReferenceMethodArgument)
+            and isinstance(carg, LeftExpr)
+            and carg.end_idx == 0
+        ):
+            names.add(carg.sym_name)
+    curr_env = cg_state.scope_mgr.current_environment
+    for name in sorted(names):
+        if (
+            resv := cg_state.sym_table.nearest_symbol(name, curr_env, track=False)
+        ) is None:
+            continue
+        scope, sym = resv.scope, resv.symbol
+        while (
+            isinstance(sym, ReferenceMethodArgument)
+            and sym.ref_scope is not None
+            and sym.ref_name is not None
+        ):
+            # variable passed by reference to an inlined function or sub
+            scope, name = sym.ref_scope, sym.ref_name
+            sym = cg_state.sym_table.sym_scopes[scope].sym_table[name]
+        sym_scope = cg_state.sym_table.sym_scopes[scope]
+        if isinstance(sym, ArraySymbol):
+            arr_sym = sym_scope.materialize(name)
+            arr_sym.insert_many(
+                [(idx, RuntimeValueExpr(name)) for idx in arr_sym.array_data]
+            )
+            sym_scope.track_assign(name)
+        elif isinstance(sym, ValueMethodArgument) or (
+            isinstance(sym, ValueSymbol) and not isinstance(sym.value, ASPObject)
+        ):
+            sym_scope.assign(LeftExpr(name), RuntimeValueExpr(name))
+
+
+def cghelper_emit_user_function(
+    call_sym: UserFunction, left_expr: LeftExpr, cg_state: CodegenState
+) -> CodegenReturn:
+    """Call a user-defined function without inlining its body
+
+    The return value of the call is the call expression itself
+
+    Parameters
+    ----------
+    call_sym : UserFunction
+    left_expr : LeftExpr
+    cg_state : CodegenState
+    """
+    cg_ret = CodegenReturn()
+    cg_ret.append(f"{display_left_expr(left_expr)}; // function call (not inlined)")
+    with cg_state.scope_mgr.temporary_scope(ScopeType.SCOPE_FUNCTION_CALL):
+        call_scp = cg_state.scope_mgr.current_scope
+        cg_state.sym_table.overlay_scope(call_sym.func_scope_id, call_scp)
+        cg_state.sym_table.sym_scopes[call_scp].materialize(
+            left_expr.sym_name
+        ).return_value = left_expr
+    cghelper_forget_call_effects(call_sym, left_expr, cg_state)
+    cg_state.add_function_return(call_scp, left_expr.sym_name)
+    return cg_ret
 
 
 def cghelper_call_user_function(
@@ -293,6 +607,8 @@ def cghelper_call_user_function(
 ) -> CodegenReturn:
     """Call a user-defined function
 
+    Calls with the same signature are only generated once (see `CallMemo`)
+
     Parameters
     ----------
     res_scope : int
@@ -303,26 +619,44 @@ def cghelper_call_user_function(
     call_sym: UserFunction = cg_state.sym_table.sym_scopes[res_scope].sym_table[
         left_expr.sym_name
     ]
-    with cg_state.scope_mgr.temporary_scope(ScopeType.SCOPE_FUNCTION_CALL):
-        call_scp = cg_state.scope_mgr.current_scope
-        # copy function signature into new scope
-        cg_state.sym_table.copy_scope(call_sym.func_scope_id, call_scp)
-        # setup function arguments
-        if (num_args := len(call_sym.arg_names)) > 0:
-            assert (
-                cargs := left_expr.call_args.get(left_expr.end_idx - 1, None)
-            ) is not None and len(cargs) == num_args, (
-                "Number of arguments in left expression "
-                "must match number of function arguments"
-            )
-            cghelper_setup_user_arguments(call_sym.arg_names, cargs, cg_state)
-        # copy-and-paste function body into current statement
-        for body_stmt in call_sym.func_body:
-            cg_ret.combine(codegen_global_stmt(body_stmt, cg_state), indent=False)
-        # make a pointer to the return value
-        cg_state.add_function_return(
-            cg_state.scope_mgr.current_scope, left_expr.sym_name
+    if not cghelper_should_inline(call_sym, cg_state):
+        return cghelper_emit_user_function(call_sym, left_expr, cg_state)
+    cargs: tuple[Any, ...] = ()
+    if (num_args := len(call_sym.arg_names)) > 0:
+        assert (
+            cargs := left_expr.call_args.get(left_expr.end_idx - 1, None)
+        ) is not None and len(cargs) == num_args, (
+            "Number of arguments in left expression "
+            "must match number of function arguments"
         )
+    memo_key = cghelper_call_signature(call_sym, cargs, cg_state)
+    if (
+        memo_key is not None
+        and (entry := cg_state.call_memo.get(memo_key[0])) is not None
+    ):
+        return cghelper_replay_call(
+            entry, call_sym.func_scope_id, left_expr.sym_name, cg_state
+        )
+    with cghelper_memoize_call(call_sym, cargs, memo_key, cg_state) as memo_entry:
+        with cg_state.scope_mgr.temporary_scope(ScopeType.SCOPE_FUNCTION_CALL):
+            call_scp = cg_state.scope_mgr.current_scope
+            # overlay function signature, symbols are copied when assigned
+            cg_state.sym_table.overlay_scope(call_sym.func_scope_id, call_scp)
+            # setup function arguments
+            if num_args > 0:
+                cghelper_setup_user_arguments(call_sym.arg_names, cargs, cg_state)
+            # copy-and-paste function body into current statement
+            for body_stmt in call_sym.func_body:
+                cg_ret.combine(codegen_global_stmt(body_stmt, cg_state), indent=False)
+        if memo_entry is not None:
+            memo_entry.cg_ret = cg_ret
+            memo_entry.return_value = (
+                cg_state.sym_table.sym_scopes[call_scp]
+                .sym_table[left_expr.sym_name]
+                .return_value
+            )
+    # make a pointer to the return value
+    cg_state.add_function_return(call_scp, left_expr.sym_name)
     return cg_ret
 
 
@@ -331,6 +665,8 @@ def cghelper_call_user_sub(
 ) -> CodegenReturn:
     """Call a user-defined sub
 
+    Calls with the same signature are only generated once (see `CallMemo`)
+
     Parameters
     ----------
     res_scope : int
@@ -341,22 +677,37 @@ def cghelper_call_user_sub(
     call_sym: UserSub = cg_state.sym_table.sym_scopes[res_scope].sym_table[
         left_expr.sym_name
     ]
-    with cg_state.scope_mgr.temporary_scope(ScopeType.SCOPE_SUB_CALL):
-        call_scp = cg_state.scope_mgr.current_scope
-        # copy sub signature into new scope
-        cg_state.sym_table.copy_scope(call_sym.sub_scope_id, call_scp)
-        # setup sub arguments
-        if (num_args := len(call_sym.arg_names)) > 0:
-            assert (
-                cargs := left_expr.call_args.get(left_expr.end_idx - 1, None)
-            ) is not None and len(cargs) == num_args, (
-                "Number of arguments in left expression "
-                "must match number of sub arguments"
-            )
-            cghelper_setup_user_arguments(call_sym.arg_names, cargs, cg_state)
-        # copy-and-paste sub body into current statement
-        for body_stmt in call_sym.sub_body:
-            cg_ret.combine(codegen_global_stmt(body_stmt, cg_state), indent=False)
+    if not cghelper_should_inline(call_sym, cg_state):
+        cg_ret.append(f"{display_left_expr(left_expr)}; // sub call (not inlined)")
+        cghelper_forget_call_effects(call_sym, left_expr, cg_state)
+        return cg_ret
+    cargs: tuple[Any, ...] = ()
+    if (num_args := len(call_sym.arg_names)) > 0:
+        assert (
+            cargs := left_expr.call_args.get(left_expr.end_idx - 1, None)
+        ) is not None and len(cargs) == num_args, (
+            "Number of arguments in left expression "
+            "must match number of sub arguments"
+        )
+    memo_key = cghelper_call_signature(call_sym, cargs, cg_state)
+    if (
+        memo_key is not None
+        and (entry := cg_state.call_memo.get(memo_key[0])) is not None
+    ):
+        return cghelper_replay_call(entry, call_sym.sub_scope_id, None, cg_state)
+    with cghelper_memoize_call(call_sym, cargs, memo_key, cg_state) as memo_entry:
+        with cg_state.scope_mgr.temporary_scope(ScopeType.SCOPE_SUB_CALL):
+            call_scp = cg_state.scope_mgr.current_scope
+            # overlay sub signature, symbols are copied when assigned
+            cg_state.sym_table.overlay_scope(call_sym.sub_scope_id, call_scp)
+            # setup sub arguments
+            if num_args > 0:
+                cghelper_setup_user_arguments(call_sym.arg_names, cargs, cg_state)
+            # copy-and-paste sub body into current statement
+            for body_stmt in call_sym.sub_body:
+                cg_ret.combine(codegen_global_stmt(body_stmt, cg_state), indent=False)
+        if memo_entry is not None:
+            memo_entry.cg_ret = cg_ret
     return cg_ret
 
 
@@ -406,6 +757,11 @@ def cghelper_call(
                 f"Skipped {sym_resv[0].symbol.symbol_name} function call (empty function body)",
                 file=cg_state.error_file,
             )
+        elif not cghelper_should_inline(sym_resv[0].symbol, cg_state):
+            cg_ret.combine(
+                cghelper_call_user_function(sym_resv[0].scope, left_expr, cg_state),
+                indent=False,
+            )
         else:
             cg_ret.append(f"{display_str} {'{'}")
             cg_ret.combine(
@@ -418,6 +774,11 @@ def cghelper_call(
                 f"Skipped {sym_resv[0].symbol.symbol_name} sub call (empty sub body)",
                 file=cg_state.error_file,
             )
+        elif not cghelper_should_inline(sym_resv[0].symbol, cg_state):
+            cg_ret.combine(
+                cghelper_call_user_sub(sym_resv[0].scope, left_expr, cg_state),
+                indent=False,
+            )
         else:
             cg_ret.append(f"{display_str} {'{'}")
             cg_ret.combine(
@@ -429,6 +790,159 @@ def cghelper_call(
     return cg_ret
 
 
+def cghelper_bulk_array_target(
+    stmt: AssignStmt, cg_state: CodegenState
+) -> Optional[ResolvedSymbol]:
+    """Find the array that an assignment in the body of a for loop stores to
+
+    Parameters
+    ----------
+    stmt : AssignStmt
+    cg_state : CodegenState
+
+    Returns
+    -------
+    ResolvedSymbol | None
+        None if the target is not an item of an array
+    """
+    lhs_expr = stmt.target_expr
+    if (
+        stmt.is_new
+        or len(lhs_expr.subnames) != 0
+        or lhs_expr.end_idx != 1
+        or (arr_idx := lhs_expr.call_args.get(0, None)) is None
+        or len(arr_idx) == 0
+    ):
+        return None
+    # nearest enclosing definition of the target symbol
+    arr_resv = cg_state.sym_table.nearest_symbol(
+        lhs_expr.sym_name, cg_state.scope_mgr.current_environment, track=False
+    )
+    if (
+        arr_resv is None
+        or not isinstance(arr_resv.symbol, ArraySymbol)
+        or len(arr_idx) != len(arr_resv.symbol.rank_list)
+    ):
+        return None
+    return arr_resv
+
+
+def cghelper_body_may_write(
+    block_stmts: list[BlockStmt], sym_name: str, cg_state: CodegenState
+) -> bool:
+    """Check whether a user function or sub called in a loop body may assign to a symbol
+
+    Parameters
+    ----------
+    block_stmts : list[BlockStmt]
+        Body of the loop
+    sym_name : str
+    cg_state : CodegenState
+
+    Returns
+    -------
+    bool
+        True if a function or sub called in `block_stmts` (or a function or sub
+        that it calls) writes `sym_name`, or if this cannot be determined
+        because no call graph was built
+    """
+    curr_env = cg_state.scope_mgr.current_environment
+    for name in left_expr_names(block_stmts):
+        if (
+            call_resv := cg_state.sym_table.nearest_symbol(name, curr_env, track=False)
+        ) is None or not isinstance(call_resv.symbol, (UserFunction, UserSub)):
+            continue
+        if (
+            cg_state.call_graph is None
+            or name not in cg_state.call_graph.summaries
+            or sym_name in cg_state.call_graph.globals_written(name)
+        ):
+            return True
+    return False
+
+
+def cghelper_bulk_array_assign(
+    stmts: list[AssignStmt],
+    arr_resv: ResolvedSymbol,
+    target_name: str,
+    loop_range: range,
+    cg_state: CodegenState,
+) -> Optional[CodegenReturn]:
+    """Evaluate the item assignments of an array for every iteration of a for loop
+
+    Only assignments where the array indices and the assigned value
+    depend on nothing but the loop target and constants can be evaluated.
+    Every assignment of an iteration is stored before the next iteration,
+    so elements are overwritten in the same order as when the loop runs
+
+    Parameters
+    ----------
+    stmts : list[AssignStmt]
+        Every assignment to the array in the body of the for loop, in order
+    arr_resv : ResolvedSymbol
+        Target array (see `cghelper_bulk_array_target()`)
+    target_name : str
+        Name of the for loop target
+    loop_range : range
+        Values taken by the for loop target
+    cg_state : CodegenState
+
+    Returns
+    -------
+    CodegenReturn | None
+        None if the assignments cannot be evaluated in bulk
+    """
+    try:
+        comp_stmts = [
+            (
+                [
+                    compile_expr(idx, [target_name])
+                    for idx in stmt.target_expr.call_args[0]
+                ],
+                compile_expr(stmt.assign_expr, [target_name]),
+            )
+            for stmt in stmts
+        ]
+    except EvaluatorError:
+        # depends on something other than the loop target
+        return None
+
+    arr_name = arr_resv.symbol.symbol_name
+    arr_scope = cg_state.sym_table.sym_scopes[arr_resv.scope]
+    arr_sym = arr_scope.materialize(arr_name)
+    # number of iterations where the indices of each assignment are out of range
+    num_skipped = [0] * len(comp_stmts)
+
+    def _bulk_items() -> Generator[tuple[tuple[int, ...], Any], None, None]:
+        for loop_val in map(EvalExpr, loop_range):
+            for stmt_idx, (comp_idx, comp_val) in enumerate(comp_stmts):
+                idx = tuple(comp(loop_val).expr_value for comp in comp_idx)
+                if arr_sym.array_data.offset(idx) < 0:
+                    num_skipped[stmt_idx] += 1
+                    continue
+                yield (idx, comp_val(loop_val))
+
+    try:
+        num_inserted = arr_sym.insert_many(_bulk_items())
+    except (ArithmeticError, TypeError, ValueError):
+        # an iteration failed to evaluate, nothing was inserted
+        return None
+    arr_scope.track_assign(arr_name)
+    cg_ret = CodegenReturn()
+    for stmt, stmt_skipped in zip(stmts, num_skipped):
+        cg_ret.append(
+            f"Assign to {display_left_expr(stmt.target_expr)} "
+            f"// {num_inserted} elements from {len(loop_range)} iterations evaluated"
+        )
+        if stmt_skipped > 0:
+            print(
+                f"Skipped assignment to {display_left_expr(stmt.target_expr)} "
+                f"(subscript out of range) in {stmt_skipped} iterations",
+                file=cg_state.error_file,
+            )
+    return cg_ret
+
+
 # ======== CODE GENERATION FUNCTIONS ========
 
 
@@ -490,6 +1004,50 @@ def cg_redim_stmt(
     CodegenReturn
     """
     cg_ret.append("Redim statement")
+    curr_env = cg_state.scope_mgr.current_environment
+    for redim_decl in stmt.redim_decl_list:
+        rank_list = [
+            bound.expr_value
+            for bound in cg_state.sym_table.try_resolve_args(
+                tuple(redim_decl.expr_list), curr_env
+            )
+            if isinstance(bound, EvalExpr)
+            and isinstance(bound.expr_value, int)
+            and not isinstance(bound.expr_value, bool)
+        ]
+        if len(rank_list) == 0 or len(rank_list) != len(redim_decl.expr_list):
+            # bounds are not known at compile time
+            continue
+        redim_name = redim_decl.extended_id.id_code
+        if (
+            redim_resv := cg_state.sym_table.nearest_symbol(
+                redim_name, curr_env, track=False
+            )
+        ) is None:
+            # implicitly declared array
+            cg_state.add_symbol(ArraySymbol(redim_name, rank_list, dynamic=True))
+            continue
+        redim_scope = cg_state.sym_table.sym_scopes[redim_resv.scope]
+        if isinstance(redim_resv.symbol, ArraySymbol):
+            if not redim_resv.symbol.dynamic:
+                # array declared with bounds (e.g., Dim arr(10)) is fixed,
+                # a runtime error in VBScript
+                continue
+            try:
+                redim_scope.materialize(redim_name).redim(rank_list, stmt.preserve)
+            except ValueError:
+                # ReDim Preserve changed a dimension other than the last,
+                # a runtime error in VBScript
+                continue
+            redim_scope.track_assign(redim_name)
+        elif type(redim_resv.symbol) is ValueSymbol:  # pylint: disable=C0123
+            # dynamic array declared without bounds (e.g., Dim arr())
+            redim_scope[redim_name] = ArraySymbol(
+                redim_name,
+                rank_list,
+                access_mod=redim_resv.symbol.access_mod,
+                dynamic=True,
+            )
     return cg_ret
 
 
@@ -586,106 +1144,110 @@ def cg_assign_stmt(
     rhs_expr = stmt.assign_expr
     if isinstance(rhs_expr, LeftExpr):
         # try to evaluate expression before assigning to target
-        found = False
-        for scp in reversed(curr_env):
-            if (
-                scp_sym := cg_state.sym_table.sym_scopes.get(scp, None)
-            ) is not None and (
-                rhs_sym := scp_sym.sym_table.get(rhs_expr.sym_name)
-            ) is not None:
-                found = True
-                if isinstance(rhs_sym, ReferenceMethodArgument):
-                    # method argument passed by reference
-                    # resolve reference before trying to evaluate expression
-                    assert (
-                        rhs_sym.ref_scope is not None and rhs_sym.ref_name is not None
-                    )
-                    rhs_sym = cg_state.sym_table.sym_scopes[
-                        rhs_sym.ref_scope
-                    ].sym_table[rhs_sym.ref_name]
-                if isinstance(rhs_sym, ValueMethodArgument):
-                    # method argument passed by value
-                    rhs_expr = rhs_sym.value
-                    break
-                elif isinstance(rhs_sym, ArraySymbol):
-                    # array variable
-                    try:
-                        rhs_expr = rhs_sym.retrieve(rhs_expr)
-                    except AssertionError:
-                        rhs_expr = EvalExpr("PLACEHOLDER")
-                    break
-                elif isinstance(rhs_sym, ValueSymbol):
-                    if isinstance(rhs_sym.value, ASPObject):
-                        # object created in script
-                        cghelper_call_object(rhs_expr, cg_state, res_scope=scp)
-                    else:
-                        # simple variable
-                        rhs_expr = rhs_sym.value
-                        break
-                elif isinstance(rhs_sym, ForLoopIteratorTargetSymbol):
-                    # TODO: add a for loop iteration expression
-                    rhs_expr = EvalExpr("PLACEHOLDER")
-                    break
-                elif isinstance(rhs_sym, ForLoopRangeTargetSymbol):
-                    rhs_expr = EvalExpr("PLACEHOLDER")
-                    break
-                elif isinstance(rhs_sym, ASPObject):
-                    # builtin object
-                    cghelper_call_object(rhs_expr, cg_state)
-                elif isinstance(rhs_sym, ASPFunction):
-                    # builtin function
-                    cghelper_call_builtin_function(rhs_expr, cg_state)
-                elif isinstance(rhs_sym, UserFunction):
-                    # user-defined function
-                    cghelper_call_user_function(scp, rhs_expr, cg_state)
-                # overwrite expression with function return value
-                rhs_expr = cg_state.function_return_symbols[-1].return_value
-                cg_state.pop_function_return()
-                break
-        if not found:
+        if (
+            rhs_resv := cg_state.sym_table.nearest_symbol(rhs_expr.sym_name, curr_env)
+        ) is None:
             raise ValueError(
                 "Could not find symbol associated with assignment expression"
             )
+        rhs_sym = rhs_resv.symbol
+        if isinstance(rhs_sym, ReferenceMethodArgument):
+            # method argument passed by reference
+            # resolve reference before trying to evaluate expression
+            assert rhs_sym.ref_scope is not None and rhs_sym.ref_name is not None
+            rhs_sym = cg_state.sym_table.sym_scopes[rhs_sym.ref_scope].sym_table[
+                rhs_sym.ref_name
+            ]
+        if isinstance(rhs_sym, ValueMethodArgument):
+            # method argument passed by value
+            rhs_expr = rhs_sym.value
+        elif isinstance(rhs_sym, ArraySymbol):
+            # array variable
+            try:
+                rhs_expr = rhs_sym.retrieve(rhs_expr)
+            except AssertionError:
+                rhs_expr = EvalExpr("PLACEHOLDER")
+        elif isinstance(rhs_sym, ValueSymbol) and not isinstance(
+            rhs_sym.value, ASPObject
+        ):
+            # simple variable
+            rhs_expr = rhs_sym.value
+        elif isinstance(rhs_sym, ForLoopIteratorTargetSymbol):
+            # TODO: add a for loop iteration expression
+            rhs_expr = EvalExpr("PLACEHOLDER")
+        elif isinstance(rhs_sym, ForLoopRangeTargetSymbol):
+            rhs_expr = EvalExpr("PLACEHOLDER")
+        else:
+            if isinstance(rhs_sym, ValueSymbol):
+                # object created in script
+                cghelper_call_object(rhs_expr, cg_state, res_scope=rhs_resv.scope)
+            elif isinstance(rhs_sym, ASPObject):
+                # builtin object
+                cghelper_call_object(rhs_expr, cg_state)
+            elif isinstance(rhs_sym, ASPFunction):
+                # builtin function
+                cghelper_call_builtin_function(rhs_expr, cg_state)
+            elif isinstance(rhs_sym, UserFunction):
+                # user-defined function
+                cghelper_call_user_function(rhs_resv.scope, rhs_expr, cg_state)
+            # overwrite expression with function return value
+            rhs_expr = cg_state.function_return_symbols[-1].return_value
+            cg_state.pop_function_return()
+    else:
+        # value is stored unevaluated, record the symbols that it reads
+        for name in left_expr_names(rhs_expr):
+            cg_state.sym_table.nearest_symbol(name, curr_env)
 
     lhs_expr = stmt.target_expr
-    for scp in reversed(curr_env):
-        if (scp_sym := cg_state.sym_table.sym_scopes.get(scp, None)) is not None and (
-            lhs_sym := scp_sym.sym_table.get(lhs_expr.sym_name, None)
-        ) is not None:
-            if isinstance(lhs_sym, ASPObject):
-                # property assignment on builtin object
+    if (
+        lhs_resv := cg_state.sym_table.nearest_symbol(
+            lhs_expr.sym_name, curr_env, track=False
+        )
+    ) is not None:
+        scp, lhs_sym = lhs_resv.scope, lhs_resv.symbol
+        if isinstance(lhs_sym, ASPObject):
+            # property assignment on builtin object
+            # treat property assignment as function call
+            cghelper_call_object(
+                PropertyExpr.from_assignment(lhs_expr, rhs_expr),
+                cg_state,
+            )
+        elif isinstance(lhs_sym, ValueSymbol):
+            if scp != curr_env[-1]:
+                # symbol defined in an enclosing scope
+                cg_state.add_symbol(LocalAssignmentSymbol.from_value_symbol(lhs_sym))
+            if lhs_expr.end_idx > 0 and isinstance(lhs_sym.value, ASPObject):
+                # property assignment on user-created object
                 # treat property assignment as function call
                 cghelper_call_object(
                     PropertyExpr.from_assignment(lhs_expr, rhs_expr),
                     cg_state,
+                    res_scope=curr_env[-1],
                 )
-            elif isinstance(lhs_sym, ValueSymbol):
-                if scp != curr_env[-1]:
-                    # symbol defined in an enclosing scope
-                    cg_state.add_symbol(
-                        LocalAssignmentSymbol.from_value_symbol(lhs_sym)
-                    )
-                if lhs_expr.end_idx > 0 and isinstance(lhs_sym.value, ASPObject):
-                    # property assignment on user-created object
-                    # treat property assignment as function call
-                    cghelper_call_object(
-                        PropertyExpr.from_assignment(lhs_expr, rhs_expr),
-                        cg_state,
-                        res_scope=curr_env[-1],
-                    )
-                else:
-                    cg_state.sym_table.sym_scopes[curr_env[-1]].assign(
-                        lhs_expr, rhs_expr
-                    )
-            elif isinstance(lhs_sym, ArraySymbol):
-                for ckey in lhs_expr.call_args.keys():
-                    lhs_expr.call_args[ckey] = cg_state.sym_table.try_resolve_args(
-                        lhs_expr.call_args[ckey], curr_env
-                    )
-                cg_state.sym_table.sym_scopes[scp].assign(lhs_expr, rhs_expr)
             else:
-                cg_state.sym_table.sym_scopes[scp].assign(lhs_expr, rhs_expr)
-            return cg_ret
+                cg_state.sym_table.sym_scopes[curr_env[-1]].assign(lhs_expr, rhs_expr)
+        elif isinstance(lhs_sym, ArraySymbol):
+            for ckey in lhs_expr.call_args.keys():
+                lhs_expr.call_args[ckey] = cg_state.sym_table.try_resolve_args(
+                    lhs_expr.call_args[ckey], curr_env
+                )
+            arr_idx = lhs_expr.call_args.get(0, None) or ()
+            if all(
+                isinstance(idx, EvalExpr) and isinstance(idx.expr_value, int)
+                for idx in arr_idx
+            ) and (
+                lhs_sym.array_data.offset(tuple(idx.expr_value for idx in arr_idx)) < 0
+            ):
+                print(
+                    f"Skipped assignment to {display_left_expr(lhs_expr)} "
+                    "(subscript out of range)",
+                    file=cg_state.error_file,
+                )
+                return cg_ret
+            cg_state.sym_table.sym_scopes[scp].assign(lhs_expr, rhs_expr)
+        else:
+            cg_state.sym_table.sym_scopes[scp].assign(lhs_expr, rhs_expr)
+        return cg_ret
     # did not find symbol
     assert (
         not cg_state.sym_table.option_explicit
@@ -718,6 +1280,20 @@ def cg_exit_stmt(
     return cg_ret
 
 
+@attrs.define(repr=False, slots=False)
+class RuntimeValueExpr(FormatterMixin, Expr):
+    """Value of a variable that is only known when the page runs,
+    e.g., after a call that was not inlined assigned to the variable
+
+    Attributes
+    ----------
+    sym_name : str
+        Name of the variable
+    """
+
+    sym_name: str
+
+
 @attrs.define(repr=False, slots=False)
 class BranchingExpr(FormatterMixin, Expr):
     """Graph type representing all possible values for
@@ -772,6 +1348,10 @@ def cg_if_stmt(
         else:
             local_branches[name] = [branch_val]
 
+    # every branch starts from the symbols before the if statement
+    base_symbols = cg_state.sym_table.snapshot()
+    branch_symbols: list[SymbolTableSnapshot] = []
+
     cg_ret.append(f"If[{cg_state.scope_mgr.current_scope}] {'{'}")
     with cg_state.scope_mgr.temporary_scope(ScopeType.SCOPE_IF_BRANCH):
         main_branch_scope = cg_state.scope_mgr.current_scope
@@ -789,8 +1369,10 @@ def cg_if_stmt(
             ].sym_table.items():
                 if isinstance(sym_type, LocalAssignmentSymbol):
                     _add_branch_scopes(sym_name, main_branch_scope)
+    branch_symbols.append(cg_state.sym_table.snapshot())
 
     for else_stmt in stmt.else_stmt_list:
+        cg_state.sym_table.restore(base_symbols)
         with cg_state.scope_mgr.temporary_scope(ScopeType.SCOPE_IF_BRANCH):
             else_branch_scope = cg_state.scope_mgr.current_scope
             else_branch_ret = CodegenReturn()
@@ -817,13 +1399,15 @@ def cg_if_stmt(
                             )
                         else:
                             _add_branch_scopes(sym_name, else_branch_scope)
+        branch_symbols.append(cg_state.sym_table.snapshot())
     cg_ret.append("}")
+    cg_state.sym_table.merge_branches(base_symbols, branch_symbols)
 
     # update value symbols in enclosing scopes
     for bname, bvals in local_branches.items():
         # don't catch index error
         bsym: ResolvedSymbol = cg_state.sym_table.resolve_symbol(
-            LeftExpr(bname), cg_state.scope_mgr.current_environment
+            LeftExpr(bname), cg_state.scope_mgr.current_environment, track=False
         )[-1]
         assert isinstance(bsym.symbol, ValueSymbol)
         bdef = local_defaults.get(bname, finalize_expr(bsym.symbol.value, cg_state))
@@ -851,14 +1435,14 @@ def cg_if_stmt(
                         print(f"{'{{'}{val_b[j1:j2]}{'}}'}", end="", file=res_str)
                     case "equal":
                         print(val_a[i1:i2], end="", file=res_str)
-            cg_state.sym_table.sym_scopes[bsym.scope].sym_table[bname].value = EvalExpr(
-                res_str.getvalue()
+            cg_state.sym_table.sym_scopes[bsym.scope].materialize(bname).value = (
+                EvalExpr(res_str.getvalue())
             )
         else:
-            cg_state.sym_table.sym_scopes[bsym.scope].sym_table[
-                bname
-            ].value = BranchingExpr(
-                ValueSymbol(bsym.symbol.symbol_name, bsym.symbol.value), bvals, bdef
+            cg_state.sym_table.sym_scopes[bsym.scope].materialize(bname).value = (
+                BranchingExpr(
+                    ValueSymbol(bsym.symbol.symbol_name, bsym.symbol.value), bvals, bdef
+                )
             )
 
     return cg_ret
@@ -903,16 +1487,22 @@ def cg_select_stmt(
     -------
     CodegenReturn
     """
+    # every case starts from the symbols before the select statement
+    base_symbols = cg_state.sym_table.snapshot()
+    case_symbols: list[SymbolTableSnapshot] = []
     cg_ret.append("Select statement {")
     for case_stmt in stmt.case_stmt_list:
+        cg_state.sym_table.restore(base_symbols)
         case_cg = CodegenReturn()
         case_cg.append("Case statement {")
         with cg_state.scope_mgr.temporary_scope(ScopeType.SCOPE_SELECT_CASE):
             for case_block_stmt in case_stmt.block_stmt_list:
                 case_cg.combine(codegen_global_stmt(case_block_stmt, cg_state))
+        case_symbols.append(cg_state.sym_table.snapshot())
         case_cg.append("}")
         cg_ret.combine(case_cg)
     cg_ret.append("}")
+    cg_state.sym_table.merge_branches(base_symbols, case_symbols)
     return cg_ret
 
 
@@ -956,17 +1546,69 @@ def cg_for_stmt(
     CodegenReturn
     """
     cg_ret.append("For statement {")
+    loop_range: Optional[range] = None
     if stmt.each_in_expr is not None:
         cg_state.add_symbol(
             ForLoopIteratorTargetSymbol(stmt.target_id.id_code, stmt.each_in_expr)
         )
     else:
-        cg_state.add_symbol(
-            ForLoopRangeTargetSymbol(
-                stmt.target_id.id_code, stmt.eq_expr, stmt.to_expr, stmt.step_expr
+        target_sym = ForLoopRangeTargetSymbol(
+            stmt.target_id.id_code, stmt.eq_expr, stmt.to_expr, stmt.step_expr
+        )
+        cg_state.add_symbol(target_sym)
+        # loop body can only be evaluated in bulk if every iteration runs
+        # and the loop target is never reassigned
+        if all(
+            map(
+                lambda x: isinstance(x, InlineStmt)
+                and not isinstance(x, ExitStmt)
+                and not (
+                    isinstance(x, AssignStmt)
+                    and x.target_expr.sym_name == stmt.target_id.id_code
+                ),
+                stmt.block_stmt_list,
             )
+        ):
+            loop_range = target_sym.iteration_range
+    # assignments to the same array are evaluated together,
+    # at the position of the first one
+    bulk_groups: dict[tuple[int, str], tuple[ResolvedSymbol, list[AssignStmt]]] = {}
+    if loop_range is not None:
+        for block_stmt in stmt.block_stmt_list:
+            if (
+                isinstance(block_stmt, AssignStmt)
+                and (arr_resv := cghelper_bulk_array_target(block_stmt, cg_state))
+                is not None
+            ):
+                bulk_groups.setdefault(
+                    (arr_resv.scope, arr_resv.symbol.symbol_name), (arr_resv, [])
+                )[1].append(block_stmt)
+    group_starts = {
+        id(group_stmts[0]): (arr_resv, group_stmts)
+        for arr_resv, group_stmts in bulk_groups.values()
+        # the array must not be used by another statement of the body,
+        # or assigned by a function or sub that the body calls
+        if not any(
+            all(block_stmt is not group_stmt for group_stmt in group_stmts)
+            and arr_resv.symbol.symbol_name in left_expr_names(block_stmt)
+            for block_stmt in stmt.block_stmt_list
         )
+        and not cghelper_body_may_write(
+            stmt.block_stmt_list, arr_resv.symbol.symbol_name, cg_state
+        )
+    }
+    bulk_evaluated: set[int] = set()
     for block_stmt in stmt.block_stmt_list:
+        if id(block_stmt) in bulk_evaluated:
+            continue
+        if (group := group_starts.get(id(block_stmt), None)) is not None and (
+            bulk_ret := cghelper_bulk_array_assign(
+                group[1], group[0], stmt.target_id.id_code, loop_range, cg_state
+            )
+        ) is not None:
+            cg_ret.combine(bulk_ret)
+            bulk_evaluated.update(map(id, group[1]))
+            continue
         cg_ret.combine(codegen_global_stmt(block_stmt, cg_state))
     cg_ret.append("}")
     return cg_ret
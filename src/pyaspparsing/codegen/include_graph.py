@@ -0,0 +1,183 @@
+"""include_graph module"""
+
+from collections import deque
+from collections.abc import Iterable
+from pathlib import Path
+import attrs
+import networkx as nx
+from .. import LinkerError, TokenizerError
+from .linker import Linker, scan_includes
+
+
+@attrs.define
+class IncludeGraph:
+    """Dependency graph between the files of a set of virtual directories
+
+    Each node is the virtual path of a file;
+    an edge (page, inc) means that `page` includes `inc`
+
+    Node attributes
+    - exists: whether the file was found in a registered virtual directory
+    - scanned: whether the include directives of the file could be read
+    - page: whether the file was added as a page (see `add_page()`),
+      files that are only reached through includes don't have this attribute
+
+    Attributes
+    ----------
+    lnk : Linker
+    graph : networkx.DiGraph
+
+    Methods
+    -------
+    build(suffixes)
+        Scan every page of the registered virtual directories
+    add_page(file_path)
+        Scan a page and the files it includes
+    update(file_path)
+        Scan a file again after it changed
+    cycles()
+        List the include cycles in the graph
+    assert_acyclic()
+    dependents(file_path)
+        Files that directly or indirectly include a file
+    pages_to_rebuild(file_path)
+        Pages affected by a change to a file
+    """
+
+    lnk: Linker
+    graph: nx.DiGraph = attrs.field(default=attrs.Factory(nx.DiGraph), init=False)
+
+    def build(self, suffixes: Iterable[str] = (".asp",)):
+        """
+        Parameters
+        ----------
+        suffixes : Iterable[str], default=(".asp",)
+            File extensions of the pages to scan;
+            included files are scanned regardless of their extension
+        """
+        suffixes = {suffix.casefold() for suffix in suffixes}
+        for vdir in self.lnk.virtual_dirs.values():
+            for phys_path in sorted(vdir.actual_path.rglob("*")):
+                if phys_path.is_file() and phys_path.suffix.casefold() in suffixes:
+                    self.add_page(
+                        vdir.root_name
+                        / phys_path.relative_to(vdir.actual_path).as_posix()
+                    )
+
+    def add_page(self, file_path: Path):
+        """
+        Parameters
+        ----------
+        file_path : Path
+            Virtual path of the page
+        """
+        self.graph.add_node(file_path, page=True)
+        self._scan(file_path)
+
+    def update(self, file_path: Path):
+        """Read the include directives of a file again,
+        replacing the includes found by an earlier scan
+
+        Files that are newly included are scanned as well
+
+        Parameters
+        ----------
+        file_path : Path
+            Virtual path of the file that changed
+        """
+        if file_path in self.graph:
+            self.graph.remove_edges_from(list(self.graph.out_edges(file_path)))
+            self.graph.nodes[file_path].pop("scanned", None)
+        self._scan(file_path)
+
+    def _scan(self, file_path: Path):
+        """Scan a file and every file it includes that was not scanned yet"""
+        queue: deque[Path] = deque([file_path])
+        while len(queue) > 0:
+            curr_path = queue.popleft()
+            if self.graph.nodes.get(curr_path, {}).get("scanned", None) is not None:
+                # already visited
+                continue
+            phys_path = self.lnk.physical_path(curr_path)
+            exists = phys_path is not None and phys_path.is_file()
+            self.graph.add_node(curr_path, exists=exists, scanned=False)
+            if not exists:
+                continue
+            try:
+                with open(phys_path, "r") as inc_file:  # pylint: disable=W1514
+                    includes = scan_includes(inc_file.read())
+            except (OSError, UnicodeDecodeError, TokenizerError):
+                continue
+            self.graph.nodes[curr_path]["scanned"] = True
+            for inc_type, inc_path in includes:
+                if (
+                    inc_node := self.lnk.resolve_include(curr_path, inc_type, inc_path)
+                ) is None:
+                    # file= include outside of every virtual directory
+                    continue
+                self.graph.add_edge(curr_path, inc_node)
+                queue.append(inc_node)
+
+    def cycles(self) -> list[list[Path]]:
+        """
+        Returns
+        -------
+        list[list[Path]]
+            Each cycle is a list of files where every file includes the next,
+            and the last file includes the first
+        """
+        return list(nx.simple_cycles(self.graph))
+
+    def assert_acyclic(self):
+        """
+        Raises
+        ------
+        LinkerError
+            If any file directly or indirectly includes itself
+        """
+        try:
+            cycle = nx.find_cycle(self.graph)
+        except nx.NetworkXNoCycle:
+            return
+        raise LinkerError(
+            "Include cycle detected: "
+            + " -> ".join(str(src) for src, _ in cycle)
+            + f" -> {cycle[0][0]}"
+        )
+
+    def dependents(self, file_path: Path) -> set[Path]:
+        """
+        Parameters
+        ----------
+        file_path : Path
+            Virtual path of a file
+
+        Returns
+        -------
+        set[Path]
+            Every file that directly or indirectly includes `file_path`
+        """
+        if file_path not in self.graph:
+            return set()
+        return nx.ancestors(self.graph, file_path)
+
+    def pages_to_rebuild(self, file_path: Path) -> set[Path]:
+        """
+        Parameters
+        ----------
+        file_path : Path
+            Virtual path of the file that changed
+
+        Returns
+        -------
+        set[Path]
+            Pages affected by the change
+            (including `file_path` itself if it is a page)
+        """
+        if file_path not in self.graph:
+            return set()
+        return {
+            page
+            for page in self.dependents(file_path) | {file_path}
+            if self.graph.nodes[page].get("page", False)
+        }
@@ -1,9 +1,17 @@
 """linker module"""
 
+import asyncio
+from collections.abc import AsyncGenerator, Iterable
+from concurrent.futures import Executor, Future
+from io import StringIO
+import os
 from pathlib import Path
+import posixpath
 from typing import Optional, Generator
 import attrs
-from ..ast.tokenizer.state_machine import Tokenizer
+from .. import LinkerError, TokenizerError
+from ..ast.tokenizer.state_machine import Tokenizer, tokenize
+from ..ast.tokenizer.token_types import TokenType
 from ..ast.ast_types import (
     generate_program,
     Program,
@@ -11,7 +19,104 @@ from ..ast.ast_types import (
     IncludeFile,
     IncludeType,
 )
-from .virtual_dir import VirtualDirectory
+from .virtual_dir import ParsedFile, VirtualDirectory
+
+
+def scan_includes(codeblock: str) -> list[tuple[IncludeType, str]]:
+    """Find the include directives of a file without parsing it
+
+    Parameters
+    ----------
+    codeblock : str
+
+    Returns
+    -------
+    list[tuple[IncludeType, str]]
+        Include type and unquoted include path, in order of appearance
+
+    Raises
+    ------
+    TokenizerError
+        If the codeblock cannot be tokenized
+    """
+    includes: list[tuple[IncludeType, str]] = []
+    inc_type: Optional[IncludeType] = None
+    with StringIO() as err_msg:
+        for tok in tokenize(codeblock, False, err_msg):
+            if tok.token_type == TokenType.INCLUDE_TYPE:
+                inc_type = (
+                    IncludeType.INCLUDE_FILE
+                    if codeblock[tok.token_src].casefold() == "file"
+                    else IncludeType.INCLUDE_VIRTUAL
+                )
+            elif tok.token_type == TokenType.INCLUDE_PATH and inc_type is not None:
+                # ignore quotes on ends
+                includes.append((inc_type, codeblock[tok.token_src][1:-1]))
+                inc_type = None
+    return includes
+
+
+@attrs.define
+class ExpandedInclude:
+    """Statements of an include file with every nested include expanded in place
+
+    Attributes
+    ----------
+    occurrences : list[Path]
+        Virtual path of every file in the expansion, in order of inclusion.
+        Index 0 is the expanded file itself;
+        a file that is included twice has two occurrences
+    stmts : list[tuple[tuple[int, ...], GlobalStmt]]
+        Each statement with its chain of occurrences,
+        from the expanded file down to the file that contains the statement
+    deps : dict[Path, Program | None]
+        Program of every file in the expansion, as returned by `Linker.request()`.
+        None for nested includes that could not be parsed
+
+    Methods
+    -------
+    splice(seen)
+        Generate the statements of the expansion
+    """
+
+    occurrences: list[Path] = attrs.field(default=attrs.Factory(list))
+    stmts: list[tuple[tuple[int, ...], GlobalStmt]] = attrs.field(
+        default=attrs.Factory(list), repr=False
+    )
+    deps: dict[Path, Optional[Program]] = attrs.field(
+        default=attrs.Factory(dict), repr=False
+    )
+
+    def splice(
+        self, seen: Optional[set[Path]] = None
+    ) -> Generator[GlobalStmt, None, None]:
+        """
+        Parameters
+        ----------
+        seen : set[Path] | None, default=None
+            If None, every occurrence is generated (classic ASP textual inclusion).
+            Otherwise, occurrences of files in `seen` are skipped together with
+            the files they include, and generated files are added to `seen`
+
+        Yields
+        ------
+        GlobalStmt
+        """
+        if seen is None:
+            yield from (stmt for _, stmt in self.stmts)
+            return
+        accepted: set[int] = set()
+        for occ_chain, stmt in self.stmts:
+            for occ in occ_chain:
+                if occ in accepted:
+                    continue
+                if self.occurrences[occ] in seen:
+                    # file was already included, skip this occurrence
+                    break
+                accepted.add(occ)
+                seen.add(self.occurrences[occ])
+            else:
+                yield stmt
 
 
 @attrs.define
@@ -21,20 +126,62 @@ class Linker:
     ----------
     virtual_dirs : Dict[str, VirtualDirectory]
         Registry of virtual directories
+    executor : concurrent.futures.Executor | None, default=None
+        Thread or process pool used to parse included files ahead of time.
+        If None, included files are parsed when they are first requested
+    include_once : bool, default=False
+        Whether a file that has already been included by a page
+        is skipped when it is included again.
+        Classic ASP includes the file again
 
     Methods
     -------
     register_dir(root_name, act_path)
         Register a virtual directory in virtual_dirs
+    physical_path(file_path)
+        Map a virtual path to its physical location
+    virtual_path(phys_path)
+        Map a physical path to its location in a virtual directory
+    resolve_include(includer, inc_type, inc_path)
+        Resolve the path of an include directive to a virtual path
+    prefetch(file_path)
+        Start parsing a file (and the files it includes) in the executor
+    prefetch_includes(codeblock, file_path)
+        Start parsing the files included by a codeblock in the executor
     request(file_path)
         Request a file from a registered virtual directory
+    request_async(file_path)
+        Request a file without blocking the event loop
+    expand_include(file_path)
+        Request a file with its nested includes expanded
+    expand_include_async(file_path)
+        Request a file with its nested includes expanded without blocking the event loop
+    include_version(file_path)
+        Version of every file in the expansion of an include
     """
 
     virtual_dirs: dict[str, VirtualDirectory] = attrs.field(
         default=attrs.Factory(dict), init=False
     )
+    executor: Optional[Executor] = attrs.field(default=None, kw_only=True)
+    include_once: bool = attrs.field(default=False, kw_only=True)
+    # normalized include resolutions, shared by every page linked with this linker
+    # key is (physical directory of including file, include path) for file= includes
+    # and (None, include path) for virtual= includes
+    _resolve_cache: dict[tuple[Optional[Path], str], Optional[Path]] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+    # transitive expansion of every include file requested through expand_include
+    _expand_cache: dict[Path, ExpandedInclude] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+    # program cached by a virtual directory and its copy with rewritten includes,
+    # the cached program is shared and must not be modified
+    _rewrite_cache: dict[Path, tuple[Program, Program]] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
 
-    def register_dir(self, root_name: str, act_path: Path):
+    def register_dir(self, root_name: str, act_path: Path, **cache_options):
         """
         Parameters
         ----------
@@ -42,6 +189,9 @@ class Linker:
             The name used to identify the virtual directory
         act_path : Path
             Physical path of the virtual directory
+        **cache_options
+            Request cache settings passed to VirtualDirectory
+            (max_ast_bytes, negative_ttl, check_stat, source_store, ast_store)
 
         Raises
         ------
@@ -51,7 +201,180 @@ class Linker:
         assert (
             root_name not in self.virtual_dirs
         ), f"A virtual directory already exists under the name '{root_name}'"
-        self.virtual_dirs[root_name] = VirtualDirectory(Path(f"/{root_name}"), act_path)
+        self.virtual_dirs[root_name] = VirtualDirectory(
+            Path(f"/{root_name}"), act_path, **cache_options
+        )
+        # a new directory may resolve includes that previously failed
+        self._resolve_cache.clear()
+        self._expand_cache.clear()
+        self._rewrite_cache.clear()
+
+    def physical_path(self, file_path: Path) -> Optional[Path]:
+        """
+        Parameters
+        ----------
+        file_path : Path
+            Absolute path to a file in a virtual directory
+
+        Returns
+        -------
+        Path | None
+            None if no virtual directory has been registered for file_path
+        """
+        if (
+            len(file_path.parts) < 2
+            or (vdir := self.virtual_dirs.get(file_path.parts[1], None)) is None
+        ):
+            return None
+        return vdir.physical_path(file_path)
+
+    def virtual_path(self, phys_path: Path) -> Optional[Path]:
+        """
+        Parameters
+        ----------
+        phys_path : Path
+            Normalized physical path of a file
+
+        Returns
+        -------
+        Path | None
+            Path in the most specific virtual directory that contains phys_path,
+            or None if phys_path is outside of every registered virtual directory
+        """
+        best_len = -1
+        best_path: Optional[Path] = None
+        for vdir in self.virtual_dirs.values():
+            vdir_path = Path(os.path.normpath(vdir.actual_path))
+            if phys_path.is_relative_to(vdir_path) and len(vdir_path.parts) > best_len:
+                best_len = len(vdir_path.parts)
+                best_path = vdir.root_name / phys_path.relative_to(vdir_path).as_posix()
+        return best_path
+
+    def resolve_include(
+        self, includer: Optional[Path], inc_type: IncludeType, inc_path: str
+    ) -> Optional[Path]:
+        """Resolve the path of an include directive to a normalized virtual path
+
+        Parameters
+        ----------
+        includer : Path | None
+            Virtual path of the file that contains the include directive
+        inc_type : IncludeType
+        inc_path : str
+            Unquoted include path
+
+        Returns
+        -------
+        Path | None
+            `virtual=` paths are absolute;
+            `file=` paths are relative to the physical directory of the including file.
+            None if a `file=` include cannot be mapped to a virtual directory
+        """
+        inc_path = inc_path.replace("\\", "/")
+        # physical directory that a file= include is relative to
+        base_dir: Optional[Path] = None
+        if inc_type != IncludeType.INCLUDE_VIRTUAL:
+            if includer is None or (inc_phys := self.physical_path(includer)) is None:
+                return None
+            base_dir = inc_phys.parent
+        cache_key = (base_dir, inc_path)
+        if cache_key in self._resolve_cache:
+            return self._resolve_cache[cache_key]
+        resolved: Optional[Path]
+        if base_dir is None:
+            resolved = Path(posixpath.normpath(posixpath.join("/", inc_path)))
+        else:
+            resolved = self.virtual_path(Path(os.path.normpath(base_dir / inc_path)))
+        self._resolve_cache[cache_key] = resolved
+        return resolved
+
+    def prefetch(self, file_path: Path):
+        """Submit a file to the executor so that a later request does not block
+        for the whole parse
+
+        The files included by the prefetched file are prefetched
+        as soon as it has been parsed
+
+        Parameters
+        ----------
+        file_path : Path
+            Path to a file in a virtual directory.
+            Ignored if no executor is set or the virtual directory is not registered
+        """
+        self._prefetch(file_path, set())
+
+    def _prefetch(self, file_path: Path, visited: set[Path]):
+        """Prefetch a file, then its includes that are not in `visited`
+
+        `visited` is shared by every file reached from the same call to `prefetch()`,
+        so include cycles end once each file in the cycle has been visited
+        """
+        if self.executor is None:
+            return
+        file_path = Path(posixpath.normpath(file_path.as_posix()))
+        if (
+            file_path in visited
+            or len(file_path.parts) < 2
+            or (vdir := self.virtual_dirs.get(file_path.parts[1], None)) is None
+        ):
+            return
+        visited.add(file_path)
+        try:
+            fut = vdir.prefetch(file_path, self.executor, new_only=True)
+        except RuntimeError as exc:
+            if "after shutdown" not in str(exc):
+                raise
+            # executor has been shut down, fall back to parsing on request
+            return
+        if fut is not None:
+            # includes of a file that was submitted earlier are
+            # prefetched by the callback of the earlier submission
+            fut.add_done_callback(
+                lambda done: self._prefetch_nested(file_path, done, visited)
+            )
+
+    def _prefetch_nested(self, file_path: Path, fut: Future, visited: set[Path]):
+        """Prefetch the includes of a file once its parse has finished"""
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        parsed: ParsedFile = fut.result()
+        if (prog := parsed[0]) is None:
+            return
+        for stmt in prog.global_stmt_list:
+            if (
+                isinstance(stmt, IncludeFile)
+                and (
+                    inc_path := self.resolve_include(
+                        file_path, stmt.include_type, stmt.include_path[1:-1]
+                    )
+                )
+                is not None
+            ):
+                self._prefetch(inc_path, visited)
+
+    def prefetch_includes(self, codeblock: str, file_path: Optional[Path] = None):
+        """Discover the include directives of a codeblock from its tokens
+        and prefetch the included files before the statements are parsed
+
+        Parameters
+        ----------
+        codeblock : str
+        file_path : Path | None, default=None
+            Virtual path of the codeblock, required to resolve `file=` includes
+        """
+        if self.executor is None:
+            return
+        try:
+            includes = scan_includes(codeblock)
+        except TokenizerError:
+            # the parser reports the error when it reaches it
+            return
+        visited: set[Path] = set()
+        for inc_type, inc_path in includes:
+            if (
+                resolved := self.resolve_include(file_path, inc_type, inc_path)
+            ) is not None:
+                self._prefetch(resolved, visited)
 
     def request(self, file_path: Path) -> Optional[Program]:
         """
@@ -72,39 +395,389 @@ class Linker:
         AssertionError
             If the virtual directory associated with file_path has not been registered
         """
+        # normalize so that every spelling of a path shares one cache entry
+        file_path = Path(posixpath.normpath(file_path.as_posix()))
         root_name = file_path.parts[1]
         assert (
             root_name in self.virtual_dirs
         ), f"No virtual directory has been registered for the name '{root_name}'"
-        return self.virtual_dirs[root_name].request(file_path)
+        return self._rewrite_file_includes(
+            file_path, self.virtual_dirs[root_name].request(file_path)
+        )
 
+    async def request_async(self, file_path: Path) -> Optional[Program]:
+        """Asynchronous variant of `request()`
 
-def generate_linked_program(
-    tkzr: Tokenizer, lnk: Linker
+        The file is read in a worker thread and parsed in the executor
+        (or the default executor of the event loop if executor is None);
+        concurrent requests for the same file share one parse
+
+        Parameters
+        ----------
+        file_path : Path
+            Path to a file in a virtual directory.
+            The virtual directory must already have been registered using register_dir()
+
+        Returns
+        -------
+        Program | None
+            Program if the file exists and can be parsed;
+            otherwise, None
+
+        Raises
+        ------
+        AssertionError
+            If the virtual directory associated with file_path has not been registered
+        """
+        file_path = Path(posixpath.normpath(file_path.as_posix()))
+        root_name = file_path.parts[1]
+        assert (
+            root_name in self.virtual_dirs
+        ), f"No virtual directory has been registered for the name '{root_name}'"
+        return self._rewrite_file_includes(
+            file_path,
+            await self.virtual_dirs[root_name].request_async(file_path, self.executor),
+        )
+
+    def _rewrite_file_includes(
+        self, file_path: Path, prog: Optional[Program]
+    ) -> Optional[Program]:
+        """Rewrite the `file=` includes of a requested program as `virtual=` includes,
+        returns a copy if any include was rewritten"""
+        if prog is None:
+            return None
+        if (cached := self._rewrite_cache.get(file_path, None)) is not None and (
+            cached[0] is prog
+        ):
+            return cached[1]
+        # file= includes of the requested file can only be resolved
+        # while its location is known, rewrite them as virtual= includes
+        stmt_list: Optional[list[GlobalStmt]] = None
+        for idx, stmt in enumerate(prog.global_stmt_list):
+            if (
+                isinstance(stmt, IncludeFile)
+                and stmt.include_type == IncludeType.INCLUDE_FILE
+                and (
+                    inc_path := self.resolve_include(
+                        file_path, stmt.include_type, stmt.include_path[1:-1]
+                    )
+                )
+                is not None
+            ):
+                if stmt_list is None:
+                    stmt_list = list(prog.global_stmt_list)
+                stmt_list[idx] = IncludeFile(
+                    IncludeType.INCLUDE_VIRTUAL, f'"{inc_path.as_posix()}"'
+                )
+        rewritten = prog if stmt_list is None else Program(stmt_list)
+        self._rewrite_cache[file_path] = (prog, rewritten)
+        return rewritten
+
+    def expand_include(self, file_path: Path) -> Optional[ExpandedInclude]:
+        """
+        Parameters
+        ----------
+        file_path : Path
+            Path to a file in a virtual directory
+
+        Returns
+        -------
+        ExpandedInclude | None
+            None if the file does not exist or cannot be parsed.
+            The expansion is cached until one of the files in it changes
+
+        Raises
+        ------
+        LinkerError
+            If the file directly or indirectly includes itself
+        """
+        return self._expand(Path(posixpath.normpath(file_path.as_posix())), ())
+
+    def include_version(
+        self, file_path: Path
+    ) -> tuple[tuple[Path, Optional[tuple[int, int]]], ...]:
+        """
+        Parameters
+        ----------
+        file_path : Path
+            Path to a file in a virtual directory
+
+        Returns
+        -------
+        tuple[tuple[Path, tuple[int, int] | None], ...]
+            (path, (mtime_ns, size)) of every file in the expansion of `file_path`,
+            the version of a file is None if it cannot be accessed.
+            Empty if the file cannot be expanded
+        """
+        try:
+            expanded = self.expand_include(file_path)
+        except LinkerError:
+            return ()
+        if expanded is None:
+            return ()
+        versions: list[tuple[Path, Optional[tuple[int, int]]]] = []
+        for dep_path in expanded.deps:
+            try:
+                stat = os.stat(self.physical_path(dep_path))
+                versions.append((dep_path, (stat.st_mtime_ns, stat.st_size)))
+            except (OSError, TypeError):
+                # TypeError: virtual directory was not registered
+                versions.append((dep_path, None))
+        return tuple(versions)
+
+    async def expand_include_async(self, file_path: Path) -> Optional[ExpandedInclude]:
+        """Asynchronous variant of `expand_include()`
+
+        Every file in the expansion is requested concurrently,
+        then the files are expanded in a worker thread
+
+        Parameters
+        ----------
+        file_path : Path
+            Path to a file in a virtual directory
+
+        Returns
+        -------
+        ExpandedInclude | None
+            None if the file does not exist or cannot be parsed
+
+        Raises
+        ------
+        LinkerError
+            If the file directly or indirectly includes itself
+        """
+        file_path = Path(posixpath.normpath(file_path.as_posix()))
+        await self._load_async(file_path, frozenset())
+        # every file is cached now, but expanding still checks each file with os.stat
+        # and parses it again if it changed or was evicted in the meantime
+        return await asyncio.to_thread(self._expand, file_path, ())
+
+    async def _load_async(self, file_path: Path, active: frozenset[Path]):
+        """Request a file and the files it includes, `active` is the include chain"""
+        if file_path in active or (prog := await self.request_async(file_path)) is None:
+            # cycles are reported by _expand()
+            return
+        await asyncio.gather(
+            *(
+                self._load_async(inc_path, active | {file_path})
+                for stmt in prog.global_stmt_list
+                if isinstance(stmt, IncludeFile)
+                and (
+                    inc_path := self.resolve_include(
+                        file_path, stmt.include_type, stmt.include_path[1:-1]
+                    )
+                )
+                is not None
+            )
+        )
+
+    def _expand(
+        self, file_path: Path, active: tuple[Path, ...]
+    ) -> Optional[ExpandedInclude]:
+        """Expand a file, `active` is the chain of files currently being expanded"""
+        if file_path in active:
+            raise LinkerError(
+                "Include cycle detected: "
+                + " -> ".join(str(inc_path) for inc_path in active)
+                + f" -> {file_path}"
+            )
+        if (prog := self.request(file_path)) is None:
+            return None
+        if (
+            (cached := self._expand_cache.get(file_path, None)) is not None
+            and cached.deps[file_path] is prog
+            and all(
+                self.request(dep_path) is dep_prog
+                for dep_path, dep_prog in cached.deps.items()
+                if dep_path != file_path
+            )
+        ):
+            # no file in the expansion has been parsed again since it was cached
+            return cached
+        expanded = ExpandedInclude([file_path], deps={file_path: prog})
+        for stmt in prog.global_stmt_list:
+            if (
+                isinstance(stmt, IncludeFile)
+                and (
+                    inc_path := self.resolve_include(
+                        file_path, stmt.include_type, stmt.include_path[1:-1]
+                    )
+                )
+                is not None
+            ):
+                if (nested := self._expand(inc_path, (*active, file_path))) is None:
+                    expanded.deps[inc_path] = None
+                else:
+                    # shift nested occurrences behind the ones already in the expansion
+                    offset = len(expanded.occurrences)
+                    expanded.occurrences.extend(nested.occurrences)
+                    expanded.deps.update(nested.deps)
+                    expanded.stmts.extend(
+                        ((0, *(occ + offset for occ in occ_chain)), nested_stmt)
+                        for occ_chain, nested_stmt in nested.stmts
+                    )
+                    continue
+            expanded.stmts.append(((0,), stmt))
+        self._expand_cache[file_path] = expanded
+        return expanded
+
+
+def link_statements(
+    stmts: Iterable[GlobalStmt],
+    lnk: Linker,
+    file_path: Optional[Path] = None,
+    seen: Optional[set[Path]] = None,
 ) -> Generator[GlobalStmt, None, None]:
-    """Generate a program where the IncludeFile AST types are replaced with
-    the parsed content of the included file
+    """Replace the IncludeFile AST types in a sequence of global statements with
+    the parsed content of the included file, including nested includes
 
     Parameters
     ----------
-    tkzr : Tokenizer
+    stmts : Iterable[GlobalStmt]
     lnk : Linker
+    file_path : Path | None, default=None
+        Virtual path of the file that contains the statements,
+        required to resolve `file=` includes
+    seen : set[Path] | None, default=None
+        Files that have already been included by the page,
+        only used if `lnk.include_once` is set.
+        Updated with the files included by the statements
 
     Yields
     ------
     GlobalStmt
     """
-    for stmt in generate_program(tkzr):
-        # virtual include?
+    if lnk.include_once and seen is None:
+        seen = set()
+    for stmt in stmts:
         if (
             isinstance(stmt, IncludeFile)
-            and stmt.include_type == IncludeType.INCLUDE_VIRTUAL
-        ):
             # make path from token source (ignore quotes on ends)
-            inc_path = Path(stmt.include_path[1:-1])
-            if (inc_prog := lnk.request(inc_path)) is not None:
+            and (
+                inc_path := lnk.resolve_include(
+                    file_path, stmt.include_type, stmt.include_path[1:-1]
+                )
+            )
+            is not None
+        ):
+            if (expanded := lnk.expand_include(inc_path)) is not None:
                 # replace IncludeFile with parsed include program
-                yield from inc_prog.global_stmt_list
+                yield from expanded.splice(seen if lnk.include_once else None)
                 continue
         # otherwise, just yield the statement
         yield stmt
+
+
+def generate_linked_program(
+    tkzr: Tokenizer, lnk: Linker, file_path: Optional[Path] = None
+) -> Generator[GlobalStmt, None, None]:
+    """Generate a program where the IncludeFile AST types are replaced with
+    the parsed content of the included file
+
+    Parameters
+    ----------
+    tkzr : Tokenizer
+    lnk : Linker
+    file_path : Path | None, default=None
+        Virtual path of the file being linked,
+        required to resolve `file=` includes
+
+    Yields
+    ------
+    GlobalStmt
+
+    Notes
+    -----
+    If `lnk.executor` is set, the included files are submitted to it before the
+    first statement is parsed; linking only blocks on an include
+    when the statement stream reaches it
+    """
+    lnk.prefetch_includes(tkzr.codeblock, file_path)
+    yield from link_statements(generate_program(tkzr), lnk, file_path)
+
+
+def parse_page(codeblock: str) -> Program:
+    """Parse a page before linking
+
+    Defined at module level so that it can be submitted to a process pool
+
+    Parameters
+    ----------
+    codeblock : str
+
+    Returns
+    -------
+    Program
+
+    Raises
+    ------
+    TokenizerError
+    ParserError
+    """
+    with StringIO() as err_msg:
+        with Tokenizer(codeblock, False, err_msg) as tkzr:
+            return Program.from_tokenizer(tkzr)
+
+
+async def generate_linked_program_async(
+    codeblock: str, lnk: Linker, file_path: Optional[Path] = None
+) -> AsyncGenerator[GlobalStmt, None]:
+    """Asynchronous variant of `generate_linked_program()`
+
+    The page is parsed in `lnk.executor` (or the default executor of the event loop)
+    while its includes are requested concurrently;
+    iteration only waits on an include when the statement stream reaches it
+
+    Parameters
+    ----------
+    codeblock : str
+    lnk : Linker
+    file_path : Path | None, default=None
+        Virtual path of the page being linked,
+        required to resolve `file=` includes
+
+    Yields
+    ------
+    GlobalStmt
+    """
+    loaders: dict[Path, asyncio.Task] = {}
+    try:
+        try:
+            includes = scan_includes(codeblock)
+        except TokenizerError:
+            # the parser reports the error
+            includes = []
+        for inc_type, inc_path in includes:
+            if (
+                resolved := lnk.resolve_include(file_path, inc_type, inc_path)
+            ) is not None and resolved not in loaders:
+                loaders[resolved] = asyncio.create_task(
+                    lnk.expand_include_async(resolved)
+                )
+        prog = await asyncio.get_running_loop().run_in_executor(
+            lnk.executor, parse_page, codeblock
+        )
+        seen: Optional[set[Path]] = set() if lnk.include_once else None
+        for stmt in prog.global_stmt_list:
+            if (
+                isinstance(stmt, IncludeFile)
+                and (
+                    inc_path := lnk.resolve_include(
+                        file_path, stmt.include_type, stmt.include_path[1:-1]
+                    )
+                )
+                is not None
+            ):
+                if inc_path not in loaders:
+                    loaders[inc_path] = asyncio.create_task(
+                        lnk.expand_include_async(inc_path)
+                    )
+                if (expanded := await loaders[inc_path]) is not None:
+                    for inc_stmt in expanded.splice(seen):
+                        yield inc_stmt
+                    continue
+            yield stmt
+    finally:
+        # stop loading includes if iteration ends early
+        for loader in loaders.values():
+            loader.cancel()
@@ -1,7 +1,9 @@
 """Scope stack management"""
 
 from contextlib import contextmanager
+import copy
 import enum
+from typing import Optional
 import attrs
 import networkx as nx
 
@@ -40,32 +42,92 @@ class ScopeType(enum.Enum):
     SCOPE_FOR = enum.auto()
 
 
+# scopes that nothing refers to once they are exited
+# (definition scopes are templates for every call)
+TRANSIENT_SCOPE_TYPES = frozenset(
+    {
+        ScopeType.SCOPE_SUB_CALL,
+        ScopeType.SCOPE_FUNCTION_CALL,
+        ScopeType.SCOPE_IF,
+        ScopeType.SCOPE_IF_BRANCH,
+        ScopeType.SCOPE_WITH,
+        ScopeType.SCOPE_SELECT,
+        ScopeType.SCOPE_SELECT_CASE,
+        ScopeType.SCOPE_LOOP,
+        ScopeType.SCOPE_FOR,
+    }
+)
+
+
 @attrs.define
 class ScopeManager:
     """
     Attributes
     ----------
     scope_registry : networkx.DiGraph
+        Scope tree as a graph, built on demand for analysis
     scope_stack : list[int]
+    exited : list[int]
+        Transient scopes that were exited since the last collection
+        (see `CodegenState.collect_scopes()`)
 
     Methods
     -------
     enter_scope(scope_type)
     exit_scope()
     temporary_scope(scope_type)
+    replay_scopes(first_id, stop_id)
+    scope_type(scope_id)
+    parent_scope(scope_id)
+    has_scope(scope_id)
+    is_ancestor(anc_id, scope_id)
     get_scope_environment(scope_id)
+    fork()
     """
 
-    scope_registry: nx.DiGraph = attrs.field(
-        default=attrs.Factory(nx.DiGraph), repr=False, init=False
-    )
     scope_stack: list[int] = attrs.field(default=attrs.Factory(list), init=False)
-    _curr_scope_id: int = attrs.field(default=-1, repr=False, init=False)
+    exited: list[int] = attrs.field(default=attrs.Factory(list), init=False)
+    # parent of every scope by scope ID, -1 for the top-level script scope
+    _parents: list[int] = attrs.field(
+        default=attrs.Factory(list), repr=False, init=False
+    )
+    _scope_types: list[ScopeType] = attrs.field(
+        default=attrs.Factory(list), repr=False, init=False
+    )
+    # enclosing scopes of every scope by scope ID (including the scope itself),
+    # computed once when the scope is entered
+    _environments: list[tuple[int, ...]] = attrs.field(
+        default=attrs.Factory(list), repr=False, init=False
+    )
+    _registry: Optional[nx.DiGraph] = attrs.field(default=None, repr=False, init=False)
 
     def __attrs_post_init__(self):
         # top-level script scope will always be at ID 0 (zero)
         self.enter_scope(ScopeType.SCOPE_SCRIPT_BUILTIN)
 
+    @property
+    def scope_registry(self) -> nx.DiGraph:
+        """Graph with an edge from every scope to each of its child scopes
+
+        Node attributes
+        - scope_type: ScopeType of the scope
+
+        Returns
+        -------
+        networkx.DiGraph
+            Rebuilt after new scopes have been entered; do not modify
+        """
+        if self._registry is None or len(self._registry) != len(self._parents):
+            self._registry = nx.DiGraph()
+            for scope_id, scope_type in enumerate(self._scope_types):
+                self._registry.add_node(scope_id, scope_type=scope_type)
+            self._registry.add_edges_from(
+                (parent_id, scope_id)
+                for scope_id, parent_id in enumerate(self._parents)
+                if parent_id >= 0
+            )
+        return self._registry
+
     @property
     def current_scope(self) -> int:
         """
@@ -81,15 +143,43 @@ class ScopeManager:
         return self.scope_stack[-1]
 
     @property
-    def current_environment(self) -> list[int]:
+    def num_scopes(self) -> int:
+        """Number of scopes entered so far, also the ID of the next scope
+
+        Returns
+        -------
+        int
+        """
+        return len(self._parents)
+
+    @property
+    def current_environment(self) -> tuple[int, ...]:
         """Get all scopes visible to the current scope
         (including the current scope)
 
         Returns
         -------
-        list[int]
+        tuple[int, ...]
+        """
+        return self._environments[self.current_scope]
+
+    def fork(self) -> "ScopeManager":
+        """Copy the scope tree and stack so that
+        scopes can be entered independently of this manager
+
+        Returns
+        -------
+        ScopeManager
         """
-        return self.get_scope_environment(self.current_scope)
+        forked = copy.copy(self)
+        # environment tuples are immutable and shared between both managers
+        forked._parents = list(self._parents)
+        forked._scope_types = list(self._scope_types)
+        forked._environments = list(self._environments)
+        forked._registry = None
+        forked.scope_stack = list(self.scope_stack)
+        forked.exited = list(self.exited)
+        return forked
 
     def enter_scope(self, scope_type: ScopeType):
         """Enter into a narrower scope and push it onto the stack
@@ -99,17 +189,24 @@ class ScopeManager:
         scope_type : ScopeType
         """
         assert isinstance(scope_type, ScopeType)
-        self._curr_scope_id += 1
-        self.scope_registry.add_node(self._curr_scope_id, scope_type=scope_type)
+        scope_id = len(self._parents)
         if len(self.scope_stack) > 0:
             # link to enclosing scope
-            self.scope_registry.add_edge(self.scope_stack[-1], self._curr_scope_id)
-        self.scope_stack.append(self._curr_scope_id)
+            parent_id = self.scope_stack[-1]
+            self._environments.append((*self._environments[parent_id], scope_id))
+        else:
+            parent_id = -1
+            self._environments.append((scope_id,))
+        self._parents.append(parent_id)
+        self._scope_types.append(scope_type)
+        self.scope_stack.append(scope_id)
 
     def exit_scope(self):
         """Pop the current scope off the stack"""
         assert len(self.scope_stack) > 0
-        self.scope_stack.pop()
+        scope_id = self.scope_stack.pop()
+        if self._scope_types[scope_id] in TRANSIENT_SCOPE_TYPES:
+            self.exited.append(scope_id)
 
     @contextmanager
     def temporary_scope(self, scope_type: ScopeType):
@@ -125,7 +222,105 @@ class ScopeManager:
         finally:
             self.exit_scope()
 
-    def get_scope_environment(self, scope_id: int) -> list[int]:
+    def replay_scopes(self, first_id: int, stop_id: int) -> int:
+        """Create copies of a range of scopes under the current scope
+
+        The scopes must have been entered one after the other,
+        starting with `first_id` (e.g., the scopes of a function call).
+        The copy of `first_id` becomes a child of the current scope,
+        every other copy keeps its parent within the range.
+        The scope stack is not modified, transient copies are added to `exited`
+
+        Parameters
+        ----------
+        first_id : int
+        stop_id : int
+            ID after the last scope of the range
+
+        Returns
+        -------
+        int
+            ID of the copy of `first_id`
+
+        Raises
+        ------
+        AssertionError
+        """
+        assert 0 <= first_id < stop_id <= len(self._parents)
+        offset = len(self._parents) - first_id
+        curr_scope = self.current_scope
+        for scope_id in range(first_id, stop_id):
+            parent_id = self._parents[scope_id]
+            if first_id <= parent_id < stop_id:
+                parent_id += offset
+            else:
+                assert scope_id == first_id, "Scopes must be descendants of first_id"
+                parent_id = curr_scope
+            self._environments.append(
+                (*self._environments[parent_id], scope_id + offset)
+            )
+            self._parents.append(parent_id)
+            self._scope_types.append(self._scope_types[scope_id])
+            if self._scope_types[scope_id] in TRANSIENT_SCOPE_TYPES:
+                # copies are never entered, they are exited right away
+                self.exited.append(scope_id + offset)
+        return first_id + offset
+
+    def has_scope(self, scope_id: int) -> bool:
+        """
+        Parameters
+        ----------
+        scope_id : int
+
+        Returns
+        -------
+        bool
+            Whether the scope has been entered at some point
+        """
+        return 0 <= scope_id < len(self._parents)
+
+    def scope_type(self, scope_id: int) -> ScopeType:
+        """
+        Parameters
+        ----------
+        scope_id : int
+
+        Returns
+        -------
+        ScopeType
+        """
+        return self._scope_types[scope_id]
+
+    def parent_scope(self, scope_id: int) -> Optional[int]:
+        """
+        Parameters
+        ----------
+        scope_id : int
+
+        Returns
+        -------
+        int | None
+            None for the top-level script scope
+        """
+        return parent_id if (parent_id := self._parents[scope_id]) >= 0 else None
+
+    def is_ancestor(self, anc_id: int, scope_id: int) -> bool:
+        """
+        Parameters
+        ----------
+        anc_id : int
+        scope_id : int
+
+        Returns
+        -------
+        bool
+            Whether `anc_id` encloses `scope_id` (a scope encloses itself)
+        """
+        anc_depth = len(self._environments[anc_id]) - 1
+        scope_env = self._environments[scope_id]
+        return len(scope_env) > anc_depth and scope_env[anc_depth] == anc_id
+
+    def get_scope_environment(self, scope_id: int) -> tuple[int, ...]:
         """Get list of enclosing scopes for the given `scope_id`
 
         Parameters
@@ -134,6 +329,7 @@ class ScopeManager:
 
         Returns
         -------
-        List[int]
+        tuple[int, ...]
+            From the top-level script scope down to `scope_id`
         """
-        return nx.dijkstra_path(self.scope_registry, 0, scope_id)
+        return self._environments[scope_id]
@@ -0,0 +1,384 @@
+"""source_store module"""
+
+from collections import OrderedDict
+from collections.abc import Iterable
+import codecs
+import mmap
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Optional
+import attrs
+
+# code page of a processing directive, e.g., <%@ Language="VBScript" CodePage=65001 %>
+CODEPAGE_PATTERN = re.compile(rb"<%@[^%]*?\bcodepage\s*=\s*\"?(\d+)", re.IGNORECASE)
+# number of bytes searched for a processing directive
+CODEPAGE_SCAN_BYTES = 64 * 1024
+
+
+def codepage_to_encoding(codepage: int) -> str:
+    """
+    Parameters
+    ----------
+    codepage : int
+        Windows code page identifier
+
+    Returns
+    -------
+    str
+        Name of the matching Python codec
+
+    Raises
+    ------
+    LookupError
+        If Python does not support the code page
+    """
+    match codepage:
+        case 65001:
+            encoding = "utf-8"
+        case 1200:
+            encoding = "utf-16-le"
+        case 1201:
+            encoding = "utf-16-be"
+        case 20127:
+            encoding = "ascii"
+        case 28591:
+            encoding = "latin-1"
+        case _:
+            encoding = f"cp{codepage}"
+    return codecs.lookup(encoding).name
+
+
+@attrs.define
+class SourceFile:
+    """Memory-mapped file in a source store
+
+    Attributes
+    ----------
+    phys_path : Path
+    mtime_ns : int
+        Modification time of the file when it was mapped
+    size : int
+        Size of the file in bytes when it was mapped
+    codepage : int | None
+        Code page declared in the processing directive of the file, if any
+    checkpoints : dict[str, list[int] | None]
+        Byte offset index of the file per encoding, filled by SourceStore
+
+    Methods
+    -------
+    view()
+        Zero-copy view of the file content
+    close()
+    """
+
+    phys_path: Path
+    mtime_ns: int
+    size: int
+    codepage: Optional[int] = attrs.field(default=None)
+    # empty files cannot be mapped and use an empty bytes object instead
+    _buf: mmap.mmap | bytes = attrs.field(default=b"", repr=False)
+    # byte offset of every checkpoint_interval-th character, per encoding;
+    # None if every character is a single byte
+    checkpoints: dict[str, Optional[list[int]]] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+
+    @staticmethod
+    def open(phys_path: Path) -> "SourceFile":
+        """Map a file into memory
+
+        Parameters
+        ----------
+        phys_path : Path
+
+        Returns
+        -------
+        SourceFile
+
+        Raises
+        ------
+        OSError
+            If the file cannot be opened
+        """
+        with open(phys_path, "rb") as src_file:
+            stat = os.fstat(src_file.fileno())
+            buf: mmap.mmap | bytes = (
+                mmap.mmap(src_file.fileno(), 0, access=mmap.ACCESS_READ)
+                if stat.st_size > 0
+                else b""
+            )
+        codepage = None
+        if (
+            directive := CODEPAGE_PATTERN.search(buf, 0, CODEPAGE_SCAN_BYTES)
+        ) is not None:
+            codepage = int(directive.group(1))
+        return SourceFile(phys_path, stat.st_mtime_ns, stat.st_size, codepage, buf)
+
+    def view(self) -> memoryview:
+        """
+        Returns
+        -------
+        memoryview
+            Read-only view of the mapped bytes, release it before closing the file
+        """
+        return memoryview(self._buf)
+
+    def close(self):
+        """Unmap the file"""
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._buf = b""
+
+
+@attrs.define
+class SourceStore:
+    """Memory-mapped source files of one or more virtual directories
+
+    Files are mapped once and decoded on demand with the code page
+    declared in their processing directive (or default_codepage).
+    Only the most recently decoded strings are kept alive;
+    character positions in a decoded file (e.g., token slices) are mapped
+    back to byte offsets through a sparse index of checkpoints
+
+    Attributes
+    ----------
+    default_codepage : int, default=65001
+        Code page of files without a CODEPAGE processing directive
+    max_decoded : int, default=32
+        Number of decoded files kept in memory
+    checkpoint_interval : int, default=4096
+        Number of characters between two entries of the byte offset index
+
+    Methods
+    -------
+    open(phys_path)
+        Get the mapped file, remapping it if it changed on disk
+    map_all(root_path, suffixes)
+        Map every file under a directory
+    read(phys_path, codepage)
+        Decode a file
+    byte_offset(phys_path, char_offset, codepage)
+        Map a position in the decoded file to a position in the file bytes
+    byte_slice(phys_path, char_slice, codepage)
+        Map a token slice to a slice of the file bytes
+    close()
+        Unmap every file
+    """
+
+    default_codepage: int = attrs.field(default=65001, kw_only=True)
+    max_decoded: int = attrs.field(
+        default=32, validator=attrs.validators.ge(0), kw_only=True
+    )
+    checkpoint_interval: int = attrs.field(
+        default=4096, validator=attrs.validators.gt(0), kw_only=True
+    )
+    _files: dict[Path, SourceFile] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+    # decoded content by (physical path, encoding), most recently used at the end
+    _decoded: OrderedDict[tuple[Path, str], str] = attrs.field(
+        default=attrs.Factory(OrderedDict), repr=False, init=False
+    )
+    _lock: threading.RLock = attrs.field(
+        default=attrs.Factory(threading.RLock), repr=False, eq=False, init=False
+    )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, tb):
+        self.close()
+
+    def open(self, phys_path: Path) -> SourceFile:
+        """
+        Parameters
+        ----------
+        phys_path : Path
+
+        Returns
+        -------
+        SourceFile
+
+        Raises
+        ------
+        OSError
+            If the file cannot be opened
+        """
+        stat = os.stat(phys_path)
+        with self._lock:
+            if (src_file := self._files.get(phys_path, None)) is not None:
+                if (src_file.mtime_ns, src_file.size) == (
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                ):
+                    return src_file
+                # file changed on disk, drop mapping and decoded content
+                self._forget(phys_path)
+            src_file = SourceFile.open(phys_path)
+            self._files[phys_path] = src_file
+            return src_file
+
+    def map_all(self, root_path: Path, suffixes: Optional[Iterable[str]] = None):
+        """
+        Parameters
+        ----------
+        root_path : Path
+            Physical directory to map recursively
+        suffixes : Iterable[str] | None, default=None
+            File extensions to map. If None, every file is mapped
+        """
+        if suffixes is not None:
+            suffixes = {suffix.casefold() for suffix in suffixes}
+        for phys_path in root_path.rglob("*"):
+            if phys_path.is_file() and (
+                suffixes is None or phys_path.suffix.casefold() in suffixes
+            ):
+                self.open(phys_path)
+
+    def _forget(self, phys_path: Path):
+        """Remove a file and its decoded content, must hold _lock"""
+        if (src_file := self._files.pop(phys_path, None)) is not None:
+            src_file.close()
+        for key in [key for key in self._decoded if key[0] == phys_path]:
+            del self._decoded[key]
+
+    def _encoding(self, src_file: SourceFile, codepage: Optional[int]) -> str:
+        if codepage is None:
+            codepage = (
+                src_file.codepage
+                if src_file.codepage is not None
+                else self.default_codepage
+            )
+        return codepage_to_encoding(codepage)
+
+    def read(
+        self, phys_path: Path, codepage: Optional[int] = None
+    ) -> tuple[str, tuple[int, int]]:
+        """Decode a file, same interface as `virtual_dir.read_source()`
+
+        Parameters
+        ----------
+        phys_path : Path
+        codepage : int | None, default=None
+            Overrides the code page declared by the file
+
+        Returns
+        -------
+        tuple[str, tuple[int, int]]
+            Decoded content and (mtime_ns, size) of the mapped file
+
+        Raises
+        ------
+        OSError
+            If the file cannot be opened
+        UnicodeDecodeError
+        """
+        with self._lock:
+            src_file = self.open(phys_path)
+            encoding = self._encoding(src_file, codepage)
+            stat = (src_file.mtime_ns, src_file.size)
+            if (text := self._decoded.get((phys_path, encoding), None)) is not None:
+                self._decoded.move_to_end((phys_path, encoding))
+                return (text, stat)
+            with src_file.view() as buf:
+                # decode straight from the mapping, without copying to bytes first
+                text = str(buf, encoding)
+            if encoding not in src_file.checkpoints:
+                src_file.checkpoints[encoding] = self._build_checkpoints(
+                    text, encoding, src_file.size
+                )
+            if self.max_decoded > 0:
+                self._decoded[(phys_path, encoding)] = text
+                while len(self._decoded) > self.max_decoded:
+                    self._decoded.popitem(last=False)
+            return (text, stat)
+
+    def _build_checkpoints(
+        self, text: str, encoding: str, size: int
+    ) -> Optional[list[int]]:
+        """Byte offset of every checkpoint_interval-th character"""
+        if len(text) == size:
+            # one byte per character, offsets are identical
+            return None
+        checkpoints = [0]
+        for start in range(0, len(text), self.checkpoint_interval):
+            checkpoints.append(
+                checkpoints[-1]
+                + len(text[start : start + self.checkpoint_interval].encode(encoding))
+            )
+        return checkpoints
+
+    def byte_offset(
+        self, phys_path: Path, char_offset: int, codepage: Optional[int] = None
+    ) -> int:
+        """
+        Parameters
+        ----------
+        phys_path : Path
+        char_offset : int
+            Position in the decoded content of the file
+        codepage : int | None, default=None
+            Code page the file was decoded with, if overridden
+
+        Returns
+        -------
+        int
+            Position of the same character in the file bytes
+
+        Raises
+        ------
+        OSError
+            If the file cannot be opened
+        UnicodeDecodeError
+        """
+        with self._lock:
+            src_file = self.open(phys_path)
+            encoding = self._encoding(src_file, codepage)
+            if encoding not in src_file.checkpoints:
+                # index is built while decoding
+                self.read(phys_path, codepage)
+            checkpoints = src_file.checkpoints[encoding]
+            if checkpoints is None:
+                return char_offset
+            num_skipped = min(
+                char_offset // self.checkpoint_interval, len(checkpoints) - 1
+            )
+            remaining = char_offset - num_skipped * self.checkpoint_interval
+            byte_pos = checkpoints[num_skipped]
+            # decode forward from the checkpoint until enough characters are seen
+            decoder = codecs.getincrementaldecoder(encoding)()
+            with src_file.view() as buf:
+                while remaining > 0 and byte_pos < src_file.size:
+                    remaining -= len(decoder.decode(buf[byte_pos : byte_pos + 1]))
+                    byte_pos += 1
+            return byte_pos
+
+    def byte_slice(
+        self, phys_path: Path, char_slice: slice, codepage: Optional[int] = None
+    ) -> slice:
+        """
+        Parameters
+        ----------
+        phys_path : Path
+        char_slice : slice
+            Slice of the decoded content (e.g., `Token.token_src`)
+        codepage : int | None, default=None
+            Code page the file was decoded with, if overridden
+
+        Returns
+        -------
+        slice
+            Slice of the file bytes that contains the same characters
+        """
+        return slice(
+            self.byte_offset(phys_path, char_slice.start, codepage),
+            self.byte_offset(phys_path, char_slice.stop, codepage),
+        )
+
+    def close(self):
+        """Unmap every file and drop all decoded content"""
+        with self._lock:
+            for phys_path in list(self._files):
+                self._forget(phys_path)
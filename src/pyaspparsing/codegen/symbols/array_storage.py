@@ -0,0 +1,303 @@
+"""array_storage module"""
+
+from collections.abc import Iterable, Iterator, MutableMapping, Sequence
+from typing import Any, Optional
+
+# fill ratio from which sparse storage is converted to a flat list
+DENSE_FILL_RATIO = 0.5
+# fill ratio under which a flat list is converted back to sparse storage
+# (lower than DENSE_FILL_RATIO, so that storage doesn't switch back and forth)
+SPARSE_FILL_RATIO = 0.125
+# flat lists are never allocated for more elements than this
+MAX_DENSE_SIZE = 1 << 20
+
+# marker for unassigned elements of a flat list
+_EMPTY = object()
+
+
+class ArrayStorage(MutableMapping[tuple[int, ...], Any]):
+    """Elements of a VBScript array, keyed by index tuple
+
+    Elements are kept in a dict while few of them are assigned (sparse storage)
+    and in a flat list of every element once the fill ratio reaches
+    DENSE_FILL_RATIO (dense storage). Only assigned elements are part of the mapping
+
+    The flat list is in column-major order (the first index varies fastest),
+    the layout of a VBScript array in memory. ReDim Preserve can only change
+    the upper bound of the last dimension, so it only truncates or extends the list
+
+    Attributes
+    ----------
+    bounds : tuple[int, ...]
+        Upper bound of each dimension (lower bounds are always 0)
+    size : int
+        Number of elements
+    is_dense : bool
+
+    Methods
+    -------
+    offset(idx)
+        Position of an element in the flat list
+    store(idx, value)
+        Assign an element if the index is valid
+    store_many(items)
+    redim(bounds, preserve)
+        Change the bounds of the array
+    """
+
+    def __init__(self, bounds: Sequence[int]):
+        self._set_bounds(bounds)
+        # elements of sparse storage, always empty while the storage is dense
+        self._sparse: dict[tuple[int, ...], Any] = {}
+        self._dense: Optional[list[Any]] = None
+        # number of assigned elements in the flat list
+        self._count = 0
+
+    def _set_bounds(self, bounds: Sequence[int]):
+        """Compute the strides and the size of the new bounds"""
+        self._bounds = tuple(bounds)
+        self._strides: list[int] = []
+        size = 1
+        for bound in self._bounds:
+            self._strides.append(size)
+            size *= max(bound + 1, 0)
+        self._size = size
+
+    @property
+    def bounds(self) -> tuple[int, ...]:
+        """
+        Returns
+        -------
+        tuple[int, ...]
+        """
+        return self._bounds
+
+    @property
+    def size(self) -> int:
+        """
+        Returns
+        -------
+        int
+        """
+        return self._size
+
+    @property
+    def is_dense(self) -> bool:
+        """
+        Returns
+        -------
+        bool
+        """
+        return self._dense is not None
+
+    def offset(self, idx: tuple[int, ...]) -> int:
+        """
+        Parameters
+        ----------
+        idx : tuple[int, ...]
+
+        Returns
+        -------
+        int
+            Position of the element in column-major order,
+            -1 if `idx` is not a tuple of integers (excluding bool)
+            within the bounds of the array
+        """
+        if len(idx) != len(self._bounds):
+            return -1
+        pos = 0
+        for ival, bound, stride in zip(idx, self._bounds, self._strides):
+            # bool is a subclass of int, but True is not a valid index
+            if isinstance(ival, bool) or not (
+                isinstance(ival, int) and 0 <= ival <= bound
+            ):
+                return -1
+            pos += ival * stride
+        return pos
+
+    def _index(self, pos: int) -> tuple[int, ...]:
+        """Index tuple of a position in the flat list"""
+        idx: list[int] = []
+        for bound in self._bounds:
+            pos, ival = divmod(pos, bound + 1)
+            idx.append(ival)
+        return tuple(idx)
+
+    def __getitem__(self, idx: tuple[int, ...]) -> Any:
+        if self._dense is None:
+            return self._sparse[idx]
+        if (pos := self.offset(idx)) < 0 or (value := self._dense[pos]) is _EMPTY:
+            raise KeyError(idx)
+        return value
+
+    def store(self, idx: tuple[int, ...], value: Any) -> bool:
+        """
+        Parameters
+        ----------
+        idx : tuple[int, ...]
+        value : Any
+
+        Returns
+        -------
+        bool
+            False if `idx` is not valid for this array (nothing is assigned)
+        """
+        if (pos := self.offset(idx)) < 0:
+            return False
+        if self._dense is None:
+            self._sparse[idx] = value
+            self._check_fill()
+        else:
+            if self._dense[pos] is _EMPTY:
+                self._count += 1
+            self._dense[pos] = value
+        return True
+
+    def __setitem__(self, idx: tuple[int, ...], value: Any):
+        if not self.store(idx, value):
+            raise IndexError(f"Index {idx} is out of the bounds {self._bounds}")
+
+    def store_many(self, items: Iterable[tuple[tuple[int, ...], Any]]) -> int:
+        """Assign multiple elements at once
+
+        Invalid indices are skipped, same as `store()`.
+        Nothing is assigned if `items` raises an exception
+
+        Parameters
+        ----------
+        items : Iterable[tuple[tuple[int, ...], Any]]
+            Pairs of (idx, value)
+
+        Returns
+        -------
+        int
+            Number of distinct elements that were assigned
+        """
+        valid = {
+            pos: (idx, value) for idx, value in items if (pos := self.offset(idx)) >= 0
+        }
+        if self._dense is None:
+            self._sparse.update(valid.values())
+            self._check_fill()
+        else:
+            for pos, (_, value) in valid.items():
+                if self._dense[pos] is _EMPTY:
+                    self._count += 1
+                self._dense[pos] = value
+        return len(valid)
+
+    def __delitem__(self, idx: tuple[int, ...]):
+        if self._dense is None:
+            del self._sparse[idx]
+            return
+        if (pos := self.offset(idx)) < 0 or self._dense[pos] is _EMPTY:
+            raise KeyError(idx)
+        self._dense[pos] = _EMPTY
+        self._count -= 1
+        self._check_fill()
+
+    def __iter__(self) -> Iterator[tuple[int, ...]]:
+        if self._dense is None:
+            yield from self._sparse
+            return
+        for pos, value in enumerate(self._dense):
+            if value is not _EMPTY:
+                yield self._index(pos)
+
+    def __len__(self) -> int:
+        return len(self._sparse) if self._dense is None else self._count
+
+    def __contains__(self, idx: object) -> bool:
+        if self._dense is None:
+            return idx in self._sparse
+        return (
+            isinstance(idx, tuple)
+            and (pos := self.offset(idx)) >= 0
+            and self._dense[pos] is not _EMPTY
+        )
+
+    def __copy__(self) -> "ArrayStorage":
+        storage_copy = ArrayStorage(self._bounds)
+        if self._dense is None:
+            storage_copy._sparse = dict(self._sparse)
+        else:
+            storage_copy._dense = list(self._dense)
+            storage_copy._count = self._count
+        return storage_copy
+
+    def __repr__(self) -> str:
+        return (
+            f"<{type(self).__name__} bounds={self._bounds!r}; "
+            f"{'dense' if self.is_dense else 'sparse'}, {len(self)} of {self._size}>"
+        )
+
+    def _check_fill(self):
+        """Switch storage when the fill ratio crosses a threshold"""
+        if self._dense is None:
+            if (
+                0 < self._size <= MAX_DENSE_SIZE
+                and len(self._sparse) >= DENSE_FILL_RATIO * self._size
+            ):
+                dense = [_EMPTY] * self._size
+                for idx, value in self._sparse.items():
+                    dense[self.offset(idx)] = value
+                self._dense, self._count, self._sparse = dense, len(self._sparse), {}
+        elif self._count < SPARSE_FILL_RATIO * self._size:
+            self._sparse = {
+                self._index(pos): value
+                for pos, value in enumerate(self._dense)
+                if value is not _EMPTY
+            }
+            self._dense, self._count = None, 0
+
+    def redim(self, bounds: Sequence[int], preserve: bool = False):
+        """
+        Parameters
+        ----------
+        bounds : Sequence[int]
+            New upper bound of each dimension
+        preserve : bool, default=False
+            Whether elements that are within the new bounds are kept
+            (ReDim Preserve), otherwise every element is removed
+
+        Raises
+        ------
+        ValueError
+            If `preserve` is True and a dimension other than the last
+            would change (not allowed by VBScript)
+        """
+        bounds = tuple(bounds)
+        if not preserve:
+            self._set_bounds(bounds)
+            self._sparse, self._dense, self._count = {}, None, 0
+            return
+        if len(bounds) != len(self._bounds) or bounds[:-1] != self._bounds[:-1]:
+            raise ValueError("ReDim Preserve can only change the last dimension")
+        new_last = bounds[-1] if len(bounds) > 0 else 0
+        self._set_bounds(bounds)
+        if self._dense is None:
+            if len(self._sparse) > 0 and new_last < max(
+                idx[-1] for idx in self._sparse
+            ):
+                self._sparse = {
+                    idx: value
+                    for idx, value in self._sparse.items()
+                    if idx[-1] <= new_last
+                }
+        elif self._size > MAX_DENSE_SIZE:
+            self._sparse = {
+                self._index(pos): value
+                for pos, value in enumerate(self._dense)
+                if value is not _EMPTY
+            }
+            self._dense, self._count = None, 0
+            return
+        elif self._size < len(self._dense):
+            # elements of the removed columns are at the end of the list
+            self._count -= sum(
+                value is not _EMPTY for value in self._dense[self._size :]
+            )
+            del self._dense[self._size :]
+        else:
+            self._dense.extend([_EMPTY] * (self._size - len(self._dense)))
+        self._check_fill()
@@ -0,0 +1,466 @@
+"""persistent_map module"""
+
+from collections.abc import Callable, Iterator, Mapping, MutableMapping
+import copy
+from typing import Any, Optional, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+# number of hash bits consumed per trie level
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+# hashes are reduced to 64 bits, deeper levels only hold collisions
+_MAX_SHIFT = 64
+_MISSING = object()
+
+
+def _hash(key: Any) -> int:
+    return hash(key) & 0xFFFF_FFFF_FFFF_FFFF
+
+
+class _Node:
+    """Trie node, never modified after it is created
+
+    Each set bit of `bitmap` has a pair of items in `entries`:
+    (key, value) for a leaf, or (_Node, None) for a subtree.
+    From _MAX_SHIFT on, nodes are collision lists with a bitmap of 0
+    """
+
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap: int, entries: tuple):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+_EMPTY_NODE = _Node(0, ())
+
+
+def _find(node: _Node, shift: int, key_hash: int, key: Any) -> Any:
+    while shift < _MAX_SHIFT:
+        bit = 1 << ((key_hash >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return _MISSING
+        idx = 2 * (node.bitmap & (bit - 1)).bit_count()
+        entry_key = node.entries[idx]
+        if isinstance(entry_key, _Node):
+            node = entry_key
+            shift += _BITS
+            continue
+        return node.entries[idx + 1] if entry_key == key else _MISSING
+    # collision list
+    for idx in range(0, len(node.entries), 2):
+        if node.entries[idx] == key:
+            return node.entries[idx + 1]
+    return _MISSING
+
+
+def _merge_leaves(shift: int, key_a: Any, val_a: Any, key_b: Any, val_b: Any) -> _Node:
+    """Subtree that contains two leaves with different keys"""
+    if shift >= _MAX_SHIFT:
+        return _Node(0, (key_a, val_a, key_b, val_b))
+    frag_a = (_hash(key_a) >> shift) & _MASK
+    frag_b = (_hash(key_b) >> shift) & _MASK
+    if frag_a == frag_b:
+        return _Node(
+            1 << frag_a,
+            (_merge_leaves(shift + _BITS, key_a, val_a, key_b, val_b), None),
+        )
+    if frag_a > frag_b:
+        key_a, val_a, key_b, val_b = key_b, val_b, key_a, val_a
+        frag_a, frag_b = frag_b, frag_a
+    return _Node((1 << frag_a) | (1 << frag_b), (key_a, val_a, key_b, val_b))
+
+
+def _assoc(
+    node: _Node, shift: int, key_hash: int, key: Any, value: Any
+) -> tuple[_Node, bool]:
+    """Copy of the path to `key` with the new value, and whether `key` was added"""
+    if shift >= _MAX_SHIFT:
+        coll_entries = list(node.entries)
+        for idx in range(0, len(coll_entries), 2):
+            if coll_entries[idx] == key:
+                coll_entries[idx + 1] = value
+                return (_Node(0, tuple(coll_entries)), False)
+        return (_Node(0, (*coll_entries, key, value)), True)
+    bit = 1 << ((key_hash >> shift) & _MASK)
+    idx = 2 * (node.bitmap & (bit - 1)).bit_count()
+    if not node.bitmap & bit:
+        entries = node.entries
+        return (
+            _Node(node.bitmap | bit, (*entries[:idx], key, value, *entries[idx:])),
+            True,
+        )
+    entry_key, entry_val = node.entries[idx], node.entries[idx + 1]
+    if isinstance(entry_key, _Node):
+        child, added = _assoc(entry_key, shift + _BITS, key_hash, key, value)
+        new_entry: tuple = (child, None)
+    elif entry_key == key:
+        if entry_val is value:
+            return (node, False)
+        new_entry, added = (key, value), False
+    else:
+        new_entry = (
+            _merge_leaves(shift + _BITS, entry_key, entry_val, key, value),
+            None,
+        )
+        added = True
+    entries = node.entries
+    return (
+        _Node(node.bitmap, (*entries[:idx], *new_entry, *entries[idx + 2 :])),
+        added,
+    )
+
+
+def _dissoc(node: _Node, shift: int, key_hash: int, key: Any) -> Optional[_Node]:
+    """Copy of the path to `key` without it, None if the node becomes empty
+
+    Raises
+    ------
+    KeyError
+    """
+    if shift >= _MAX_SHIFT:
+        for idx in range(0, len(node.entries), 2):
+            if node.entries[idx] == key:
+                entries = node.entries[:idx] + node.entries[idx + 2 :]
+                return _Node(0, entries) if len(entries) > 0 else None
+        raise KeyError(key)
+    bit = 1 << ((key_hash >> shift) & _MASK)
+    if not node.bitmap & bit:
+        raise KeyError(key)
+    idx = 2 * (node.bitmap & (bit - 1)).bit_count()
+    entry_key = node.entries[idx]
+    entries = node.entries
+    if isinstance(entry_key, _Node):
+        if (child := _dissoc(entry_key, shift + _BITS, key_hash, key)) is not None:
+            return _Node(
+                node.bitmap, (*entries[:idx], child, None, *entries[idx + 2 :])
+            )
+    elif entry_key != key:
+        raise KeyError(key)
+    if node.bitmap == bit:
+        return None
+    return _Node(node.bitmap & ~bit, entries[:idx] + entries[idx + 2 :])
+
+
+def _iter_items(node: _Node) -> Iterator[tuple[Any, Any]]:
+    stack = [node]
+    while len(stack) > 0:
+        curr = stack.pop()
+        for idx in range(0, len(curr.entries), 2):
+            if isinstance(entry_key := curr.entries[idx], _Node):
+                stack.append(entry_key)
+            else:
+                yield (entry_key, curr.entries[idx + 1])
+
+
+def _changed_keys(node_a: _Node, node_b: _Node, shift: int) -> Iterator[Any]:
+    """Keys whose value differs by identity, skipping shared subtrees"""
+    if node_a is node_b:
+        return
+    if shift < _MAX_SHIFT:
+        bits = node_a.bitmap | node_b.bitmap
+        while bits:
+            bit = bits & -bits
+            bits ^= bit
+            in_a, in_b = bool(node_a.bitmap & bit), bool(node_b.bitmap & bit)
+            entry_a = entry_b = None
+            if in_a:
+                idx = 2 * (node_a.bitmap & (bit - 1)).bit_count()
+                entry_a = node_a.entries[idx : idx + 2]
+            if in_b:
+                idx = 2 * (node_b.bitmap & (bit - 1)).bit_count()
+                entry_b = node_b.entries[idx : idx + 2]
+            if (
+                entry_a is not None
+                and entry_b is not None
+                and isinstance(entry_a[0], _Node)
+                and isinstance(entry_b[0], _Node)
+            ):
+                yield from _changed_keys(entry_a[0], entry_b[0], shift + _BITS)
+                continue
+            yield from _changed_leaves(
+                _Node(bit, entry_a) if entry_a is not None else _EMPTY_NODE,
+                _Node(bit, entry_b) if entry_b is not None else _EMPTY_NODE,
+            )
+        return
+    yield from _changed_leaves(node_a, node_b)
+
+
+def _changed_leaves(node_a: _Node, node_b: _Node) -> Iterator[Any]:
+    items_a = dict(_iter_items(node_a))
+    items_b = dict(_iter_items(node_b))
+    for key, val_a in items_a.items():
+        if items_b.pop(key, _MISSING) is not val_a:
+            yield key
+    yield from items_b
+
+
+class PersistentMap(Mapping[K, V]):
+    """Immutable mapping with structural sharing (hash array mapped trie)
+
+    `set()` and `delete()` return a new map that shares every unchanged
+    part of the trie with this map, in O(log n) time.
+    Taking a snapshot of a map is O(1): keep a reference to it
+
+    Methods
+    -------
+    set(key, value)
+    delete(key)
+    changed_keys(other)
+        Keys whose value is not the same object in both maps
+    """
+
+    __slots__ = ("_root", "_len")
+
+    def __init__(self, items: Optional[Mapping[K, V]] = None):
+        self._root = _EMPTY_NODE
+        self._len = 0
+        if items is not None:
+            for key, value in items.items():
+                self._root, added = _assoc(self._root, 0, _hash(key), key, value)
+                self._len += added
+
+    @classmethod
+    def _from_root(cls, root: _Node, length: int) -> "PersistentMap[K, V]":
+        new_map = cls.__new__(cls)
+        new_map._root = root
+        new_map._len = length
+        return new_map
+
+    def __getitem__(self, key: K) -> V:
+        if (value := _find(self._root, 0, _hash(key), key)) is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: K, default: Any = None) -> Any:
+        if (value := _find(self._root, 0, _hash(key), key)) is _MISSING:
+            return default
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return _find(self._root, 0, _hash(key), key) is not _MISSING
+
+    def __iter__(self) -> Iterator[K]:
+        for key, _ in _iter_items(self._root):
+            yield key
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __repr__(self) -> str:
+        return f"PersistentMap({dict(_iter_items(self._root))!r})"
+
+    def items(self):
+        # avoid a lookup per key
+        return dict(_iter_items(self._root)).items()
+
+    def set(self, key: K, value: V) -> "PersistentMap[K, V]":
+        """
+        Parameters
+        ----------
+        key : K
+        value : V
+
+        Returns
+        -------
+        PersistentMap[K, V]
+            New map where `key` maps to `value`
+        """
+        root, added = _assoc(self._root, 0, _hash(key), key, value)
+        if root is self._root:
+            return self
+        return self._from_root(root, self._len + added)
+
+    def delete(self, key: K) -> "PersistentMap[K, V]":
+        """
+        Parameters
+        ----------
+        key : K
+
+        Returns
+        -------
+        PersistentMap[K, V]
+            New map without `key`
+
+        Raises
+        ------
+        KeyError
+        """
+        root = _dissoc(self._root, 0, _hash(key), key)
+        return self._from_root(root if root is not None else _EMPTY_NODE, self._len - 1)
+
+    def changed_keys(self, other: "PersistentMap[K, V]") -> Iterator[K]:
+        """
+        Parameters
+        ----------
+        other : PersistentMap[K, V]
+
+        Yields
+        ------
+        K
+            Every key that is missing from one of the maps, or whose values
+            are different objects. Subtrees shared by both maps are skipped
+        """
+        # pylint: disable=W0212
+        #         ~~~~~~~~^^^^^ _root is "protected",
+        #                       but we're accessing from the same class
+        yield from _changed_keys(other._root, self._root, 0)
+
+
+class CopyOnWriteMap(MutableMapping[K, V]):
+    """Mutable mapping of mutable values over a persistent map
+
+    Values are shared with every snapshot and fork of the mapping;
+    a shared value is copied the first time it is retrieved with `[]`
+    or `materialize()` (retrieved values may be modified in place).
+    Use `peek()` for read-only access without a copy
+
+    Methods
+    -------
+    materialize(key)
+        Retrieve a value that may be modified in place
+    peek(key)
+        Retrieve a value without taking ownership of it
+    share(key, value)
+        Insert a value without taking ownership of it
+    snapshot()
+        Current content as a persistent map, in O(1)
+    restore(snapshot)
+        Replace the content with a snapshot, in O(1)
+    fork()
+        Independent copy of the mapping, in O(1)
+    changed_keys(other)
+        Keys whose value is not the same object in both mappings
+    """
+
+    def __init__(self, copy_value: Callable[[V], V], items: Optional[Mapping] = None):
+        self._copy_value = copy_value
+        self._map: PersistentMap[K, V] = PersistentMap(items)
+        # keys of values that were copied since the last snapshot
+        self._owned: set[K] = set() if items is None else set(items)
+
+    def __getitem__(self, key: K) -> V:
+        return self.materialize(key)
+
+    def materialize(self, key: K) -> V:
+        """
+        Parameters
+        ----------
+        key : K
+
+        Returns
+        -------
+        V
+            Value owned by this mapping, copied if it is shared
+
+        Raises
+        ------
+        KeyError
+        """
+        value = self._map[key]
+        if key not in self._owned:
+            value = self._copy_value(value)
+            self._map = self._map.set(key, value)
+            self._owned.add(key)
+        return value
+
+    def peek(self, key: K, default: Any = None) -> Any:
+        """
+        Parameters
+        ----------
+        key : K
+        default : Any, default=None
+
+        Returns
+        -------
+        V | Any
+            Value that may be shared with a snapshot, must not be modified
+        """
+        return self._map.get(key, default)
+
+    def __setitem__(self, key: K, value: V):
+        self._map = self._map.set(key, value)
+        self._owned.add(key)
+
+    def __delitem__(self, key: K):
+        self._map = self._map.delete(key)
+        self._owned.discard(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._map
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self._map)
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self._map.items())!r})"
+
+    def get(self, key: K, default: Any = None) -> Any:
+        if key in self._map:
+            return self[key]
+        return default
+
+    def share(self, key: K, value: V):
+        """Insert a value that is still used elsewhere,
+        it is copied before it is modified
+
+        Parameters
+        ----------
+        key : K
+        value : V
+        """
+        self._map = self._map.set(key, value)
+        self._owned.discard(key)
+
+    def snapshot(self) -> PersistentMap[K, V]:
+        """
+        Returns
+        -------
+        PersistentMap[K, V]
+            Current content, values are copied before they are modified again
+        """
+        self._owned = set()
+        return self._map
+
+    def restore(self, snapshot: PersistentMap[K, V]):
+        """
+        Parameters
+        ----------
+        snapshot : PersistentMap[K, V]
+            Content returned by `snapshot()`
+        """
+        self._map = snapshot
+        self._owned = set()
+
+    def fork(self):
+        """
+        Returns
+        -------
+        CopyOnWriteMap[K, V]
+            New mapping that shares every value with this mapping
+        """
+        forked = copy.copy(self)
+        forked.restore(self.snapshot())
+        return forked
+
+    def changed_keys(self, other: "CopyOnWriteMap[K, V]") -> Iterator[K]:
+        """
+        Parameters
+        ----------
+        other : CopyOnWriteMap[K, V]
+
+        Yields
+        ------
+        K
+            Every key that is missing from one of the mappings, or whose values
+            are different objects (see `PersistentMap.changed_keys()`)
+        """
+        # pylint: disable=W0212
+        #         ~~~~~~~~^^^^^ _map is "protected",
+        #                       but we're accessing from the same class
+        yield from self._map.changed_keys(other._map)
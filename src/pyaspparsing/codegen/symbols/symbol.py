@@ -1,5 +1,6 @@
 """Symbol base class"""
 
+from collections.abc import Iterable
 from functools import partial
 from typing import Optional, Any
 import attrs
@@ -7,6 +8,7 @@ from ...ast.ast_types.base import Expr, AccessModifierType
 from ...ast.ast_types.declarations import VarName, FieldName
 from ...ast.ast_types.expressions import LeftExpr
 from ...ast.ast_types.optimize import EvalExpr
+from .array_storage import ArrayStorage
 
 
 @attrs.define(repr=False, slots=False)
@@ -132,18 +134,27 @@ class ArraySymbol(Symbol):
     Attributes
     ----------
     rank_list : List[int], default=[]
-    array_data : Dict[Tuple[int, ...], Any], default={}
+        Upper bound of each dimension
+    array_data : ArrayStorage
+        Assigned elements by index tuple
     access_mod : AccessModifierType | None, default=None
+    dynamic : bool, default=False
+        Whether the array can be resized by ReDim
+        (declared without bounds, e.g., Dim arr())
     """
 
     rank_list: list[int] = attrs.field(
         default=attrs.Factory(list),
         validator=attrs.validators.deep_iterable(attrs.validators.instance_of(int)),
     )
-    array_data: dict[tuple[int, ...], Any] = attrs.field(
-        default=attrs.Factory(dict), init=False
+    array_data: ArrayStorage = attrs.field(
+        default=attrs.Factory(
+            lambda self: ArrayStorage(self.rank_list), takes_self=True
+        ),
+        init=False,
     )
     access_mod: Optional[AccessModifierType] = attrs.field(default=None, kw_only=True)
+    dynamic: bool = attrs.field(default=False, kw_only=True)
 
     def __repr__(self):
         match self.access_mod:
@@ -203,17 +214,25 @@ class ArraySymbol(Symbol):
         idx : Tuple[int, ...]
         value : Any
         """
-        if not len(idx) == len(self.rank_list) or not all(
-            map(lambda x: isinstance(x, int), idx)
-        ):
-            return
-            # raise ValueError(
-            #     "idx must be a tuple of integers that is the same length as the array's rank list"
-            # )
-        if not all(map(lambda ival: 0 <= ival[0] <= ival[1], zip(idx, self.rank_list))):
-            # raise ValueError("Each idx[i] must be in the range [0, rank_list[i]]")
-            return
-        self.array_data[idx] = value
+        # invalid indices are ignored
+        self.array_data.store(idx, value)
+
+    def insert_many(self, items: Iterable[tuple[tuple[int, ...], Any]]) -> int:
+        """Insert multiple values at once
+
+        Invalid indices are skipped, same as `insert()`
+
+        Parameters
+        ----------
+        items : Iterable[Tuple[Tuple[int, ...], Any]]
+            Pairs of (idx, value)
+
+        Returns
+        -------
+        int
+            Number of values that were inserted
+        """
+        return self.array_data.store_many(items)
 
     def retrieve(self, left_expr: LeftExpr) -> Any:
         """
@@ -235,20 +254,31 @@ class ArraySymbol(Symbol):
             and (idx := left_expr.call_args.get(0, None)) is not None
         ), "left_expr must match 'sym_name(...)'"
 
-        def _unwrap_eval_expr():
-            nonlocal idx
-            for item in idx:
-                if isinstance(item, EvalExpr):
-                    yield item.expr_value
-                else:
-                    yield item
-
-        idx = tuple(_unwrap_eval_expr())
+        idx = tuple(
+            [item.expr_value if isinstance(item, EvalExpr) else item for item in idx]
+        )
         assert len(idx) == len(self.rank_list) and all(
-            map(lambda x: isinstance(x, int), idx)
+            isinstance(ival, int) for ival in idx
         ), "idx must be a tuple of integers that is the same length as the array's rank list"
         return self.array_data[idx]
 
+    def redim(self, rank_list: list[int], preserve: bool = False):
+        """
+        Parameters
+        ----------
+        rank_list : List[int]
+            New upper bound of each dimension
+        preserve : bool, default=False
+            Whether the elements within the new bounds are kept (ReDim Preserve)
+
+        Raises
+        ------
+        ValueError
+            If `preserve` is True and a dimension other than the last would change
+        """
+        self.array_data.redim(rank_list, preserve)
+        self.rank_list = list(rank_list)
+
 
 @attrs.define(repr=False, slots=False)
 class ConstantSymbol(Symbol):
@@ -409,6 +439,38 @@ class ForLoopRangeTargetSymbol(Symbol):
             and (self.range_step is None or isinstance(self.range_step, EvalExpr))
         )
 
+    @property
+    def iteration_range(self) -> Optional[range]:
+        """Materialize the iteration space of the for loop
+
+        Returns
+        -------
+        range | None
+            The values taken by the loop target, in order;
+            None if the loop bounds are not constant integers
+            or if the step is zero
+        """
+        if not self.constant_evaluation:
+            return None
+        range_values = (
+            self.range_from.expr_value,
+            self.range_to.expr_value,
+            1 if self.range_step is None else self.range_step.expr_value,
+        )
+        if not all(
+            map(
+                lambda x: isinstance(x, int) and not isinstance(x, bool),
+                range_values,
+            )
+        ):
+            return None
+        start, stop, step = range_values
+        if step == 0:
+            # loop would never terminate
+            return None
+        # 'To' bound is inclusive
+        return range(start, stop + (1 if step > 0 else -1), step)
+
 
 @attrs.define(repr=False, slots=False)
 class ForLoopIteratorTargetSymbol(Symbol):
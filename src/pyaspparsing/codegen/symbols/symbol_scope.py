@@ -0,0 +1,431 @@
+"""symbol_scope module"""
+
+from array import array
+import copy
+from typing import Optional, Generator
+import attrs
+from ...ast.ast_types import Expr, LeftExpr, EvalExpr
+from .array_storage import ArrayStorage
+from .persistent_map import CopyOnWriteMap
+from .symbol import (
+    Symbol,
+    ValueSymbol,
+    LocalAssignmentSymbol,
+    ArraySymbol,
+    FunctionReturnSymbol,
+    ValueMethodArgument,
+)
+
+
+def copy_symbol(symbol: Symbol) -> Symbol:
+    """Copy a symbol so that it can be modified independently
+
+    Container attributes (e.g., array elements) are copied,
+    values inside of the symbol (e.g., expressions) are shared
+
+    Parameters
+    ----------
+    symbol : Symbol
+
+    Returns
+    -------
+    Symbol
+    """
+    sym_copy = copy.copy(symbol)
+    for attr_name, attr_val in list(getattr(sym_copy, "__dict__", {}).items()):
+        if isinstance(attr_val, (list, dict, set, ArrayStorage)):
+            setattr(sym_copy, attr_name, copy.copy(attr_val))
+    return sym_copy
+
+
+class SymbolMap(CopyOnWriteMap[str, Symbol]):
+    """Symbols of a scope by name
+
+    Symbols are shared with every scope that was copied or overlaid from this one.
+    Unlike CopyOnWriteMap, retrieving a symbol with `[]` does not copy it;
+    a shared symbol is only copied by `materialize()`
+    """
+
+    def __init__(self):
+        super().__init__(copy_symbol)
+
+    def __getitem__(self, key: str) -> Symbol:
+        return self._map[key]
+
+
+@attrs.define
+class SymbolScope:
+    """
+    Attributes
+    ----------
+    sym_table : SymbolMap, default={}
+
+    Methods
+    -------
+    overlay(base)
+    add_symbol(symbol, symbol_id)
+    symbol_id(key)
+    track_read(key)
+    track_assign(key)
+    reads(key)
+    writes(key)
+    usage()
+    version(key)
+    materialize(key)
+    assign(asgn)
+    call(left_expr)
+    copy()
+    merge(base, branch)
+    """
+
+    sym_table: SymbolMap = attrs.field(default=attrs.Factory(SymbolMap), init=False)
+
+    # usage statistics are stored in one slot per symbol name
+    _slots: dict[str, int] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+    # symbol ID of each slot, -1 if the symbol was not added through a symbol table
+    _symbol_ids: array = attrs.field(
+        default=attrs.Factory(lambda: array("q")), repr=False, init=False
+    )
+    # how many times has the symbol been retrieved?
+    _sym_get: array = attrs.field(
+        default=attrs.Factory(lambda: array("Q")), repr=False, init=False
+    )
+    # how many times has the symbol been assigned to?
+    _sym_set: array = attrs.field(
+        default=attrs.Factory(lambda: array("Q")), repr=False, init=False
+    )
+    # how many times has the symbol been replaced or handed out for modification?
+    _versions: dict[str, int] = attrs.field(
+        default=attrs.Factory(dict), repr=False, init=False
+    )
+    # scope that this scope was overlaid on, see overlay()
+    _base: Optional["SymbolScope"] = attrs.field(default=None, repr=False, kw_only=True)
+
+    def __getitem__(self, key: str) -> Symbol:
+        if not isinstance(key, str):
+            raise TypeError("key must be a string")
+        # don't catch KeyError
+        ret = self.sym_table[key]
+        # record retrieval for later use
+        self._sym_get[self._slot(key)] += 1
+        return ret
+
+    def _slot(self, key: str) -> int:
+        """Slot of a symbol name, created on first use"""
+        if (slot := self._slots.get(key, None)) is None:
+            slot = len(self._symbol_ids)
+            self._slots[key] = slot
+            # symbols that are seen through an overlay keep the ID of the base symbol
+            self._symbol_ids.append(
+                self._base.symbol_id(key) if self._base is not None else -1
+            )
+            self._sym_get.append(0)
+            self._sym_set.append(0)
+        return slot
+
+    def symbol_id(self, key: str) -> int:
+        """
+        Parameters
+        ----------
+        key : str
+
+        Returns
+        -------
+        int
+            ID assigned by the symbol table that added the symbol,
+            -1 if the symbol was not added through a symbol table
+        """
+        if (slot := self._slots.get(key, None)) is not None:
+            return self._symbol_ids[slot]
+        return self._base.symbol_id(key) if self._base is not None else -1
+
+    def track_read(self, key: str):
+        """
+        Parameters
+        ----------
+        key : str
+
+        Raises
+        ------
+        ValueError
+        """
+        if not isinstance(key, str):
+            raise ValueError("key must be a string")
+        # record retrieval for later use
+        self._sym_get[self._slot(key)] += 1
+
+    def track_assign(self, key: str):
+        """
+        Parameters
+        ----------
+        key : str
+
+        Raises
+        ------
+        ValueError
+        """
+        if not isinstance(key, str):
+            raise ValueError("key must be a string")
+        # record assignment for later use
+        self._sym_set[self._slot(key)] += 1
+
+    def reads(self, key: str) -> int:
+        """
+        Parameters
+        ----------
+        key : str
+
+        Returns
+        -------
+        int
+            Number of reads of the symbol recorded in this scope
+        """
+        if (slot := self._slots.get(key, None)) is None:
+            return 0
+        return self._sym_get[slot]
+
+    def writes(self, key: str) -> int:
+        """
+        Parameters
+        ----------
+        key : str
+
+        Returns
+        -------
+        int
+            Number of assignments to the symbol recorded in this scope
+        """
+        if (slot := self._slots.get(key, None)) is None:
+            return 0
+        return self._sym_set[slot]
+
+    def usage(self) -> Generator[tuple[str, int, int, int], None, None]:
+        """
+        Yields
+        ------
+        tuple[str, int, int, int]
+            Name, symbol ID, reads, and assignments of every symbol
+            that was used in this scope
+        """
+        for key, slot in self._slots.items():
+            yield (
+                key,
+                self._symbol_ids[slot],
+                self._sym_get[slot],
+                self._sym_set[slot],
+            )
+
+    def __setitem__(self, key: str, value: Symbol) -> None:
+        if not isinstance(key, str):
+            raise TypeError("key must be a string")
+        if not isinstance(value, Symbol):
+            raise TypeError("value must be a subclass of Symbol")
+        self.sym_table[key] = value
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self.track_assign(key)
+
+    def version(self, key: str) -> int:
+        """
+        Parameters
+        ----------
+        key : str
+
+        Returns
+        -------
+        int
+            Changes whenever the symbol is replaced or materialized for modification
+        """
+        return self._versions.get(key, 0)
+
+    @staticmethod
+    def overlay(base: "SymbolScope") -> "SymbolScope":
+        """Create a scope that starts with every symbol of another scope
+
+        The symbols are shared with `base` until they are modified
+        (see `materialize()`), the usage statistics of the new scope start empty
+
+        Parameters
+        ----------
+        base : SymbolScope
+
+        Returns
+        -------
+        SymbolScope
+        """
+        ovl_scope = SymbolScope(base=base)
+        ovl_scope.sym_table = base.sym_table.fork()
+        return ovl_scope
+
+    def materialize(self, key: str) -> Symbol:
+        """Get a symbol for modification in place
+
+        Parameters
+        ----------
+        key : str
+
+        Returns
+        -------
+        Symbol
+            Symbol owned by this scope, never shared with another scope
+        """
+        # don't catch KeyError
+        symbol = self.sym_table.materialize(key)
+        self._versions[key] = self._versions.get(key, 0) + 1
+        return symbol
+
+    def copy(self) -> "SymbolScope":
+        """Copy the scope so that its symbols can be modified independently
+
+        The copy shares every symbol with this scope until it is materialized
+        (see `materialize()`)
+
+        Returns
+        -------
+        SymbolScope
+        """
+        # pylint: disable=W0212
+        #         ~~~~~~~~^^^^^ the usage statistics are "protected",
+        #                       but we're accessing from the same class
+        scp_copy = SymbolScope(base=self._base)
+        scp_copy.sym_table = self.sym_table.fork()
+        scp_copy._slots = dict(self._slots)
+        scp_copy._symbol_ids = array("q", self._symbol_ids)
+        scp_copy._sym_get = array("Q", self._sym_get)
+        scp_copy._sym_set = array("Q", self._sym_set)
+        scp_copy._versions = dict(self._versions)
+        return scp_copy
+
+    def merge(self, base: "SymbolScope", branch: "SymbolScope"):
+        """Apply the changes of an alternative branch to this scope
+
+        Parameters
+        ----------
+        base : SymbolScope
+            Scope before the branch
+        branch : SymbolScope
+            Scope after the branch, derived from `base`
+        """
+        # symbols that are shared with base are skipped without being visited
+        for key in branch.sym_table.changed_keys(base.sym_table):
+            if key not in branch.sym_table or (
+                branch.version(key) == base.version(key) and key in base.sym_table
+            ):
+                continue
+            # symbol was replaced or modified in the branch,
+            # the version must differ from every branch that was merged before
+            self.sym_table.share(key, branch.sym_table[key])
+            self._versions[key] = max(self.version(key), branch.version(key)) + 1
+        for key, symbol_id, num_reads, num_writes in branch.usage():
+            slot = self._slot(key)
+            self._symbol_ids[slot] = symbol_id
+            self._sym_get[slot] += num_reads - base.reads(key)
+            self._sym_set[slot] += num_writes - base.writes(key)
+
+    def add_symbol(self, symbol: Symbol, symbol_id: int = -1) -> bool:
+        """Add a new symbol to the symbol table
+
+        Does nothing if the name already exists
+
+        Parameters
+        ----------
+        symbol : Symbol
+        symbol_id : int, default=-1
+            ID assigned by the symbol table, used to aggregate usage statistics
+
+        Returns
+        -------
+        bool
+            False if name already exists
+        """
+        if symbol.symbol_name in self.sym_table:
+            return False
+        # don't track this as assignment
+        self.sym_table[symbol.symbol_name] = symbol
+        self._symbol_ids[self._slot(symbol.symbol_name)] = symbol_id
+        return True
+
+    def assign(self, target_expr: LeftExpr, assign_expr: Expr):
+        """
+        Parameters
+        ----------
+        target_expr : LeftExpr
+        assign_expr : Expr
+
+        Raises
+        ------
+        AssertionError
+        """
+        # symbol should already exist, but check just in case
+        assert (
+            target_expr.sym_name in self.sym_table
+        ), "Symbol does not exist in the current scope"
+        # what type is the target expression?
+        if isinstance(
+            (val_sym := self.sym_table[target_expr.sym_name]),
+            (ValueSymbol, LocalAssignmentSymbol),
+        ):
+            if target_expr.end_idx == 0:
+                # simple variable assignment
+                # overwrite value with assignment expression
+                self[target_expr.sym_name] = type(val_sym)(
+                    target_expr.sym_name,
+                    assign_expr,
+                )
+            else:
+                raise RuntimeError
+        elif isinstance(val_sym, FunctionReturnSymbol):
+            self.materialize(target_expr.sym_name).return_value = assign_expr
+            self.track_assign(target_expr.sym_name)
+        elif isinstance(val_sym, ValueMethodArgument):
+            self.materialize(target_expr.sym_name).value = assign_expr
+            self.track_assign(target_expr.sym_name)
+        elif isinstance(val_sym, ArraySymbol):
+            # array item assignment
+            def _get_array_idx() -> Generator[int, None, None]:
+                """Extract array indices from target expression
+
+                Yields
+                ------
+                int
+                    Array index
+
+                Raises
+                ------
+                AssertionError
+                """
+                nonlocal target_expr
+                assert (
+                    len(target_expr.subnames) == 0
+                ), "Target of array assignment cannot have subnames"
+                assert (
+                    len(target_expr.call_args) == 1
+                    and (array_rank := target_expr.call_args.get(0, None)) is not None
+                ), "Target of array assignment must have exactly one non-None call record"
+                assert (
+                    len(array_rank) >= 1
+                ), "Call record in array assignment must have at least one value"
+                for idx in target_expr.call_args[0]:
+                    if isinstance(idx, EvalExpr) and isinstance(idx.expr_value, int):
+                        yield idx.expr_value
+                    else:
+                        # TODO: array index is a left expression
+                        yield None
+
+            self.materialize(target_expr.sym_name).insert(
+                tuple(_get_array_idx()), assign_expr
+            )
+            self.track_assign(target_expr.sym_name)
+
+
+class CopyOnWriteScopes(CopyOnWriteMap[int, SymbolScope]):
+    """Mapping of scope IDs to symbol scopes that can be forked cheaply
+
+    After `fork()` or `snapshot()`, the SymbolScope objects are shared;
+    a shared scope is copied the first time it is retrieved with `[]`
+    (symbols are modified in place, so every retrieval counts as a write)
+    """
+
+    def __init__(self):
+        super().__init__(SymbolScope.copy)
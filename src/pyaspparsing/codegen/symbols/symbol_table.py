@@ -1,196 +1,109 @@
 """Symbol table"""
 
-from typing import Optional, Generator, Any
+from collections.abc import Sequence
+import csv
+from typing import Optional, Any, IO
 import attrs
-from ...ast.ast_types import Expr, LeftExpr, EvalExpr
-from .symbol import (
-    Symbol,
-    ValueSymbol,
-    LocalAssignmentSymbol,
-    ArraySymbol,
-    FunctionReturnSymbol,
-    ValueMethodArgument,
-)
+from ...ast.ast_types import LeftExpr
+from .persistent_map import CopyOnWriteMap, PersistentMap
+from .symbol import Symbol, ValueSymbol
+from .symbol_scope import CopyOnWriteScopes, SymbolScope
+from .table_snapshot import SnapshotMixin
 
 
 @attrs.define
-class SymbolScope:
+class ResolvedSymbol:
     """
     Attributes
     ----------
-    sym_table : dict[str, Symbol], default={}
-
-    Methods
-    -------
-    add_symbol(symbol)
-    assign(asgn)
-    call(left_expr)
+    scope : int
+    symbol : Symbol
     """
 
-    sym_table: dict[str, Symbol] = attrs.field(default=attrs.Factory(dict), init=False)
-
-    # how many times has the symbol been retrieved?
-    _sym_get: dict[str, int] = attrs.field(
-        default=attrs.Factory(dict), repr=False, init=False
-    )
-    # how many times has the symbol been assigned to?
-    _sym_set: dict[str, int] = attrs.field(
-        default=attrs.Factory(dict), repr=False, init=False
-    )
-
-    def __getitem__(self, key: str) -> Symbol:
-        if not isinstance(key, str):
-            raise TypeError("key must be a string")
-        # don't catch KeyError
-        ret = self.sym_table[key]
-        # record retrieval for later use
-        self._sym_get[key] = self._sym_get.get(key, 0) + 1
-        return ret
-
-    def track_assign(self, key: str):
-        """
-        Parameters
-        ----------
-        key : str
-
-        Raises
-        ------
-        ValueError
-        """
-        if not isinstance(key, str):
-            raise ValueError("key must be a string")
-        # record assignment for later use
-        self._sym_set[key] = self._sym_set.get(key, 0) + 1
-
-    def __setitem__(self, key: str, value: Symbol) -> None:
-        if not isinstance(key, str):
-            raise TypeError("key must be a string")
-        if not isinstance(value, Symbol):
-            raise TypeError("value must be a subclass of Symbol")
-        self.sym_table[key] = value
-        self.track_assign(key)
-
-    def add_symbol(self, symbol: Symbol) -> bool:
-        """Add a new symbol to the symbol table
-
-        Does nothing if the name already exists
-
-        Parameters
-        ----------
-        symbol : Symbol
-
-        Returns
-        -------
-        bool
-            False if name already exists
-        """
-        if symbol.symbol_name in self.sym_table:
-            return False
-        # don't track this as assignment
-        self.sym_table[symbol.symbol_name] = symbol
-        return True
-
-    def assign(self, target_expr: LeftExpr, assign_expr: Expr):
-        """
-        Parameters
-        ----------
-        target_expr : LeftExpr
-        assign_expr : Expr
-
-        Raises
-        ------
-        AssertionError
-        """
-        # symbol should already exist, but check just in case
-        assert (
-            target_expr.sym_name in self.sym_table
-        ), "Symbol does not exist in the current scope"
-        # what type is the target expression?
-        if isinstance(
-            (val_sym := self.sym_table[target_expr.sym_name]),
-            (ValueSymbol, LocalAssignmentSymbol),
-        ):
-            if target_expr.end_idx == 0:
-                # simple variable assignment
-                # overwrite value with assignment expression
-                self[target_expr.sym_name] = type(val_sym)(
-                    target_expr.sym_name,
-                    assign_expr,
-                )
-            else:
-                raise RuntimeError
-        elif isinstance(self.sym_table[target_expr.sym_name], FunctionReturnSymbol):
-            self.sym_table[target_expr.sym_name].return_value = assign_expr
-        elif isinstance(self.sym_table[target_expr.sym_name], ValueMethodArgument):
-            self.sym_table[target_expr.sym_name].value = assign_expr
-        elif isinstance(self.sym_table[target_expr.sym_name], ArraySymbol):
-            # array item assignment
-            def _get_array_idx() -> Generator[int, None, None]:
-                """Extract array indices from target expression
-
-                Yields
-                ------
-                int
-                    Array index
-
-                Raises
-                ------
-                AssertionError
-                """
-                nonlocal target_expr
-                assert (
-                    len(target_expr.subnames) == 0
-                ), "Target of array assignment cannot have subnames"
-                assert (
-                    len(target_expr.call_args) == 1
-                    and (array_rank := target_expr.call_args.get(0, None)) is not None
-                ), "Target of array assignment must have exactly one non-None call record"
-                assert (
-                    len(array_rank) >= 1
-                ), "Call record in array assignment must have at least one value"
-                for idx in target_expr.call_args[0]:
-                    if isinstance(idx, EvalExpr) and isinstance(idx.expr_value, int):
-                        yield idx.expr_value
-                    else:
-                        # TODO: array index is a left expression
-                        yield None
-
-            self.sym_table[target_expr.sym_name].insert(
-                tuple(_get_array_idx()), assign_expr
-            )
+    scope: int
+    symbol: Symbol
 
 
 @attrs.define
-class ResolvedSymbol:
-    """
+class SymbolUsage:
+    """Usage statistics of a symbol, aggregated over every scope that used it
+
     Attributes
     ----------
+    symbol_id : int
+    symbol_name : str
     scope : int
-    symbol : Symbol
+        Scope that the symbol was added to
+    reads : int
+    writes : int
     """
 
+    symbol_id: int
+    symbol_name: str
     scope: int
-    symbol: Symbol
+    reads: int = attrs.field(default=0)
+    writes: int = attrs.field(default=0)
 
 
 @attrs.define
-class SymbolTable:
+class SymbolTable(SnapshotMixin):
     """
     Attributes
     ----------
-    sym_scopes : dict[int, SymbolScope], default={}
+    sym_scopes : CopyOnWriteScopes, default={}
     option_explicit : bool, default=False
 
     Methods
     -------
     set_explicit()
     add_symbol(symbol, scope)
+    copy_scope(src_scope, dest_scope)
+    overlay_scope(src_scope, dest_scope)
+    remove_scope(scope)
+    defining_scopes(sym_name)
+    resolve_symbol(left_expr, curr_env, track)
+    nearest_symbol(sym_name, curr_env, track)
+    try_resolve_args(call_args, curr_env)
+    reads(sym_name)
+    symbol_usage()
+    export_usage(out_file)
+    fork()
+    snapshot()
+    restore(snapshot)
+    merge_branches(base, branches)
+        See `SnapshotMixin`
     """
 
-    sym_scopes: dict[int, SymbolScope] = attrs.field(
-        default=attrs.Factory(dict), init=False
+    sym_scopes: CopyOnWriteScopes = attrs.field(
+        default=attrs.Factory(CopyOnWriteScopes), init=False
     )
     option_explicit: bool = attrs.field(default=False, init=False)
+    # scopes that define each symbol name, in order of definition
+    # (symbols are only added through add_symbol, so this is always complete)
+    _name_index: CopyOnWriteMap[str, dict[int, None]] = attrs.field(
+        default=attrs.Factory(lambda: CopyOnWriteMap(dict)), repr=False, init=False
+    )
+    # name and scope of every symbol by symbol ID
+    _symbols: PersistentMap[int, tuple[str, int]] = attrs.field(
+        default=attrs.Factory(PersistentMap), repr=False, init=False
+    )
+    # symbol IDs are never reused, not even after restore()
+    _next_id: int = attrs.field(default=0, repr=False, init=False)
+    # IDs of every symbol with a given name
+    _name_ids: CopyOnWriteMap[str, list[int]] = attrs.field(
+        default=attrs.Factory(lambda: CopyOnWriteMap(list)), repr=False, init=False
+    )
+    # reads and writes of removed scopes by symbol ID
+    _retired: PersistentMap[int, tuple[int, int]] = attrs.field(
+        default=attrs.Factory(PersistentMap), repr=False, init=False
+    )
+
+    def _index_add(self, sym_name: str, scope: int):
+        """Record that `scope` defines `sym_name`"""
+        if sym_name in self._name_index:
+            self._name_index[sym_name][scope] = None
+        else:
+            self._name_index[sym_name] = {scope: None}
 
     def set_explicit(self):
         """Register the Option Explicit statement with the symbol table
@@ -212,7 +125,14 @@ class SymbolTable:
         """
         if not scope in self.sym_scopes:
             self.sym_scopes[scope] = SymbolScope()
-        return self.sym_scopes[scope].add_symbol(symbol)
+        symbol_id = self._next_id
+        if not self.sym_scopes[scope].add_symbol(symbol, symbol_id):
+            return False
+        self._next_id += 1
+        self._index_add(symbol.symbol_name, scope)
+        self._symbols = self._symbols.set(symbol_id, (symbol.symbol_name, scope))
+        self._name_ids.setdefault(symbol.symbol_name, []).append(symbol_id)
+        return True
 
     def copy_scope(self, src_scope: int, dest_scope: int) -> bool:
         """Copy symbols from one scope into another
@@ -242,47 +162,161 @@ class SymbolTable:
             ), f"Symbol {src_name} already exists in destination scope"
         return True
 
+    def overlay_scope(self, src_scope: int, dest_scope: int) -> bool:
+        """Create a copy-on-write scope that sees every symbol of another scope
+
+        Unlike `copy_scope()`, symbols of `src_scope` are only copied
+        into `dest_scope` when they are modified, and `src_scope` is never changed
+
+        Parameters
+        ----------
+        src_scope : int
+            Scope to overlay (e.g., the definition scope of a function)
+        dest_scope : int
+            New scope, must not exist in the symbol table yet
+
+        Returns
+        -------
+        bool
+            False if `src_scope` does not exist in the symbol table
+
+        Raises
+        ------
+        AssertionError
+            If `dest_scope` already exists
+        """
+        if src_scope not in self.sym_scopes:
+            return False
+        assert dest_scope not in self.sym_scopes, "Destination scope already exists"
+        # src_scope is only read
+        src_symbols = self.sym_scopes.peek(src_scope)
+        self.sym_scopes[dest_scope] = SymbolScope.overlay(src_symbols)
+        for src_name in src_symbols.sym_table:
+            self._index_add(src_name, dest_scope)
+        return True
+
+    def remove_scope(self, scope: int) -> bool:
+        """Remove a scope and all of its symbols
+
+        The usage statistics of the scope are kept
+
+        Parameters
+        ----------
+        scope : int
+
+        Returns
+        -------
+        bool
+            False if `scope` does not exist in the symbol table
+        """
+        if scope not in self.sym_scopes:
+            return False
+        # read without triggering a copy of a shared scope
+        sym_scope: SymbolScope = self.sym_scopes.peek(scope)
+        for _, symbol_id, num_reads, num_writes in sym_scope.usage():
+            if symbol_id >= 0:
+                prev_reads, prev_writes = self._retired.get(symbol_id, (0, 0))
+                self._retired = self._retired.set(
+                    symbol_id, (prev_reads + num_reads, prev_writes + num_writes)
+                )
+        for sym_name in sym_scope.sym_table:
+            if sym_name in self._name_index:
+                scopes = self._name_index[sym_name]
+                scopes.pop(scope, None)
+                if len(scopes) == 0:
+                    del self._name_index[sym_name]
+        del self.sym_scopes[scope]
+        return True
+
+    def defining_scopes(self, sym_name: str) -> list[int]:
+        """
+        Parameters
+        ----------
+        sym_name : str
+
+        Returns
+        -------
+        list[int]
+            Every scope that defines `sym_name`, in order of definition
+        """
+        return list(self._name_index.peek(sym_name, ()))
+
     def resolve_symbol(
-        self, left_expr: LeftExpr, curr_env: Optional[list[int]] = None
+        self,
+        left_expr: LeftExpr,
+        curr_env: Optional[Sequence[int]] = None,
+        *,
+        track: bool = True,
     ) -> list[ResolvedSymbol]:
         """
         Parameters
         ----------
         left_expr : LeftExpr
-        curr_env : list[int] | None, default=None
+        curr_env : Sequence[int] | None, default=None
             If None, will search for symbol in all scopes
+        track : bool, default=True
+            Whether to record a read of the innermost symbol in curr_env
+            (never recorded if curr_env is None)
 
         Returns
         -------
         list[ResolvedSymbol]
+            Ordered from the outermost to the innermost scope of curr_env,
+            or in order of definition if curr_env is None
         """
-        ret_syms: list[ResolvedSymbol] = []
+        if (scopes := self._name_index.peek(left_expr.sym_name, None)) is None:
+            return []
         if curr_env is None:
             # search for symbol in all scopes
-            for scp in self.sym_scopes.keys():
-                if (scp_sym := self.sym_scopes.get(scp, None)) is not None and (
-                    left_sym := scp_sym.sym_table.get(left_expr.sym_name, None)
-                ) is not None:
-                    ret_syms.append(ResolvedSymbol(scp, left_sym))
+            found = scopes
         else:
             # search for symbol in current environment
             assert len(curr_env) > 0, "curr_env must not be empty"
-            for scp in curr_env:
-                # ^ order of scope resolution doesn't matter since
-                # we're searching the entire environment
-                if (scp_sym := self.sym_scopes.get(scp, None)) is not None and (
-                    left_sym := scp_sym.sym_table.get(left_expr.sym_name, None)
-                ) is not None:
-                    ret_syms.append(ResolvedSymbol(scp, left_sym))
-        return ret_syms
-
-    def try_resolve_args(self, call_args: tuple[Any, ...], curr_env: list[int]):
+            # an index entry is visible if its scope encloses the current scope
+            found = filter(scopes.__contains__, curr_env)
+        resolved = [
+            ResolvedSymbol(scp, self.sym_scopes[scp].sym_table[left_expr.sym_name])
+            for scp in found
+        ]
+        if track and curr_env is not None and len(resolved) > 0:
+            self.sym_scopes[resolved[-1].scope].track_read(left_expr.sym_name)
+        return resolved
+
+    def nearest_symbol(
+        self, sym_name: str, curr_env: Sequence[int], *, track: bool = True
+    ) -> Optional[ResolvedSymbol]:
+        """Resolve a name the way VBScript does, innermost scope first
+
+        Parameters
+        ----------
+        sym_name : str
+        curr_env : Sequence[int]
+        track : bool, default=True
+            Whether to record a read of the symbol
+
+        Returns
+        -------
+        ResolvedSymbol | None
+            Definition of `sym_name` in the innermost scope of curr_env,
+            or None if no scope in curr_env defines it
+        """
+        if (scopes := self._name_index.peek(sym_name, None)) is None:
+            return None
+        for scp in reversed(curr_env):
+            if scp in scopes:
+                sym_scope = self.sym_scopes[scp]
+                if track:
+                    sym_scope.track_read(sym_name)
+                return ResolvedSymbol(scp, sym_scope.sym_table[sym_name])
+        return None
+
+    def try_resolve_args(self, call_args: tuple[Any, ...], curr_env: Sequence[int]):
         """Try to resolve left expressions passed as call arguments
 
         Parameters
         ----------
         call_args : tuple[Any, ...]
-        curr_env : list[int]
+        curr_env : Sequence[int]
 
         Returns
         -------
@@ -293,22 +327,73 @@ class SymbolTable:
         def _resolve_helper():
             nonlocal self, call_args, curr_env
             for arg in call_args:
-                if isinstance(arg, LeftExpr):
-                    found = False
-                    for scp in reversed(curr_env):
-                        if (
-                            scp_sym := self.sym_scopes.get(scp, None)
-                        ) is not None and arg.sym_name in scp_sym.sym_table:
-                            arg_sym = scp_sym.sym_table[arg.sym_name]
-                            if isinstance(arg_sym, ValueSymbol):
-                                yield arg_sym.value
-                            else:
-                                yield arg_sym
-                            found = True
-                            break
-                    if found:
-                        continue
+                if (
+                    isinstance(arg, LeftExpr)
+                    and (arg_resv := self.nearest_symbol(arg.sym_name, curr_env))
+                    is not None
+                ):
+                    if isinstance(arg_resv.symbol, ValueSymbol):
+                        yield arg_resv.symbol.value
+                    else:
+                        yield arg_resv.symbol
+                    continue
                 # did not find symbol or arg is not a left expression
                 yield arg
 
         return tuple(_resolve_helper())
+
+    def reads(self, sym_name: str) -> int:
+        """
+        Parameters
+        ----------
+        sym_name : str
+
+        Returns
+        -------
+        int
+            Number of reads of every symbol named `sym_name`,
+            in every scope (including removed scopes)
+        """
+        total = sum(
+            self._retired.get(symbol_id, (0, 0))[0]
+            for symbol_id in self._name_ids.peek(sym_name, ())
+        )
+        for scp in self._name_index.peek(sym_name, ()):
+            # read without triggering a copy of a shared scope
+            total += self.sym_scopes.peek(scp).reads(sym_name)
+        return total
+
+    def symbol_usage(self) -> dict[int, SymbolUsage]:
+        """Aggregate the usage statistics of every scope per symbol
+
+        Returns
+        -------
+        dict[int, SymbolUsage]
+            Keyed by symbol ID, in ascending order
+        """
+        usage = {
+            symbol_id: SymbolUsage(
+                symbol_id, sym_name, scope, *self._retired.get(symbol_id, (0, 0))
+            )
+            for symbol_id, (sym_name, scope) in sorted(self._symbols.items())
+        }
+        for scope in self.sym_scopes:
+            for _, symbol_id, num_reads, num_writes in self.sym_scopes.peek(
+                scope
+            ).usage():
+                if symbol_id in usage:
+                    usage[symbol_id].reads += num_reads
+                    usage[symbol_id].writes += num_writes
+        return usage
+
+    def export_usage(self, out_file: IO):
+        """Write the aggregated usage statistics as CSV
+
+        Parameters
+        ----------
+        out_file : IO
+            Text file opened with newline=""
+        """
+        writer = csv.writer(out_file)
+        writer.writerow([fld.name for fld in attrs.fields(SymbolUsage)])
+        writer.writerows(attrs.astuple(usage) for usage in self.symbol_usage().values())
@@ -0,0 +1,165 @@
+"""table_snapshot module"""
+
+from collections.abc import Sequence
+from typing import Self
+import attrs
+from .persistent_map import CopyOnWriteMap, PersistentMap
+from .symbol_scope import CopyOnWriteScopes, SymbolScope
+
+
+@attrs.define(frozen=True)
+class SymbolTableSnapshot:
+    """Content of a symbol table at one point in time
+
+    Attributes
+    ----------
+    scopes : PersistentMap[int, SymbolScope]
+    option_explicit : bool
+    name_index : PersistentMap[str, dict[int, None]]
+        Scopes that define each symbol name
+    symbols : PersistentMap[int, tuple[str, int]]
+        Name and scope of every symbol by symbol ID
+    name_ids : PersistentMap[str, list[int]]
+        IDs of every symbol with a given name
+    retired : PersistentMap[int, tuple[int, int]]
+        Reads and writes of removed scopes by symbol ID
+    next_id : int
+        Next symbol ID when the snapshot was taken
+    """
+
+    scopes: PersistentMap[int, SymbolScope]
+    option_explicit: bool
+    name_index: PersistentMap[str, dict[int, None]] = attrs.field(repr=False)
+    symbols: PersistentMap[int, tuple[str, int]] = attrs.field(repr=False)
+    name_ids: PersistentMap[str, list[int]] = attrs.field(repr=False)
+    retired: PersistentMap[int, tuple[int, int]] = attrs.field(repr=False)
+    next_id: int = attrs.field(repr=False)
+
+
+class SnapshotMixin:
+    """Snapshots and forks of a symbol table
+
+    Every part of the symbol table is a persistent map
+    (or a copy-on-write mapping over one), so capturing and restoring
+    its content only copies references.
+    Scopes and symbols are copied the next time they are modified
+
+    Methods
+    -------
+    fork()
+        Independent copy of the symbol table in O(1)
+    snapshot()
+        Capture the content of the symbol table in O(1)
+    restore(snapshot)
+        Return to a snapshot in O(1)
+    merge_branches(base, branches)
+        Combine the results of alternative branches
+    """
+
+    # defined by SymbolTable
+    sym_scopes: CopyOnWriteScopes
+    option_explicit: bool
+    _name_index: CopyOnWriteMap[str, dict[int, None]]
+    _symbols: PersistentMap[int, tuple[str, int]]
+    _next_id: int
+    _name_ids: CopyOnWriteMap[str, list[int]]
+    _retired: PersistentMap[int, tuple[int, int]]
+
+    def fork(self) -> Self:
+        """Create a copy-on-write copy of the symbol table in O(1)
+
+        Returns
+        -------
+        SymbolTable
+        """
+        forked = type(self)()
+        forked.restore(self.snapshot())
+        return forked
+
+    def snapshot(self) -> SymbolTableSnapshot:
+        """Capture the content of the symbol table in O(1)
+
+        Scopes are shared with the snapshot and copied
+        the next time they are modified
+
+        Returns
+        -------
+        SymbolTableSnapshot
+        """
+        return SymbolTableSnapshot(
+            self.sym_scopes.snapshot(),
+            self.option_explicit,
+            self._name_index.snapshot(),
+            self._symbols,
+            self._name_ids.snapshot(),
+            self._retired,
+            self._next_id,
+        )
+
+    def restore(self, snapshot: SymbolTableSnapshot):
+        """Return to the content of a snapshot in O(1)
+
+        Symbol IDs that were assigned after the snapshot are not reused
+
+        Parameters
+        ----------
+        snapshot : SymbolTableSnapshot
+        """
+        self.sym_scopes.restore(snapshot.scopes)
+        self.option_explicit = snapshot.option_explicit
+        self._name_index.restore(snapshot.name_index)
+        self._symbols = snapshot.symbols
+        self._name_ids.restore(snapshot.name_ids)
+        self._retired = snapshot.retired
+        self._next_id = max(self._next_id, snapshot.next_id)
+
+    def merge_branches(
+        self, base: SymbolTableSnapshot, branches: Sequence[SymbolTableSnapshot]
+    ):
+        """Replace the content of the symbol table with the combined result
+        of alternative branches that all started from the same snapshot
+
+        Symbols that were changed by a branch are taken from that branch
+        (from the last one, if several branches changed the same symbol),
+        scopes and symbols that were added by any branch are kept,
+        and the usage statistics of every branch are added up
+
+        Parameters
+        ----------
+        base : SymbolTableSnapshot
+            Snapshot taken before the branches
+        branches : Sequence[SymbolTableSnapshot]
+            Snapshot taken at the end of each branch, after restoring `base`
+        """
+        self.restore(base)
+        for branch in branches:
+            # only the parts of the tries that differ from base are visited
+            for scope in branch.scopes.changed_keys(base.scopes):
+                if (branch_scope := branch.scopes.get(scope, None)) is None:
+                    # removed in the branch
+                    continue
+                if (base_scope := base.scopes.get(scope, None)) is None:
+                    # added in the branch, copied once it is modified
+                    self.sym_scopes.share(scope, branch_scope)
+                else:
+                    self.sym_scopes[scope].merge(base_scope, branch_scope)
+            for sym_name in branch.name_index.changed_keys(base.name_index):
+                for scope in branch.name_index.get(sym_name, ()):
+                    if scope in self.sym_scopes:
+                        self._name_index.setdefault(sym_name, {})[scope] = None
+            for symbol_id in branch.symbols.changed_keys(base.symbols):
+                sym_name, scope = branch.symbols[symbol_id]
+                self._symbols = self._symbols.set(symbol_id, (sym_name, scope))
+                self._name_ids.setdefault(sym_name, []).append(symbol_id)
+            for symbol_id in branch.retired.changed_keys(base.retired):
+                base_reads, base_writes = base.retired.get(symbol_id, (0, 0))
+                branch_reads, branch_writes = branch.retired.get(symbol_id, (0, 0))
+                curr_reads, curr_writes = self._retired.get(symbol_id, (0, 0))
+                self._retired = self._retired.set(
+                    symbol_id,
+                    (
+                        curr_reads + branch_reads - base_reads,
+                        curr_writes + branch_writes - base_writes,
+                    ),
+                )
+            self.option_explicit = self.option_explicit or branch.option_explicit
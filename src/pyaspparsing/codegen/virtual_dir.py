@@ -1,14 +1,192 @@
 """virtual_dir module"""
 
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
 from contextlib import ExitStack
+import enum
 from io import StringIO
+import os
 from pathlib import Path
-from typing import Optional
+import sys
+import threading
+import time
+from typing import Any, Optional
 
 import attrs
 
 from ..ast.ast_types import Program
 from ..ast.tokenizer.state_machine import Tokenizer
+from .ast_store import AstStore
+from .source_store import SourceStore
+
+
+def estimate_ast_bytes(prog: Program) -> int:
+    """Estimate the memory used by a parsed program
+
+    Parameters
+    ----------
+    prog : Program
+
+    Returns
+    -------
+    int
+        Sum of `sys.getsizeof()` over every distinct object in the tree
+    """
+    total = 0
+    seen: set[int] = set()
+    stack: list[Any] = [prog]
+    while len(stack) > 0:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (enum.Enum, type)):
+            # shared singletons are not owned by the tree
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if hasattr(obj, "__dict__"):
+            total += sys.getsizeof(obj.__dict__)
+            stack.extend(obj.__dict__.values())
+        elif attrs.has(type(obj)):
+            stack.extend(getattr(obj, fld.name) for fld in attrs.fields(type(obj)))
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+    return total
+
+
+# parsed program (None on failure) and (mtime_ns, size) of the file when it was read
+type ParsedFile = tuple[Optional[Program], Optional[tuple[int, int]]]
+
+
+def read_source(phys_path: Path) -> tuple[str, tuple[int, int]]:
+    """Read a file for parsing
+
+    Parameters
+    ----------
+    phys_path : Path
+
+    Returns
+    -------
+    tuple[str, tuple[int, int]]
+        Content of the file and (mtime_ns, size) of the file when it was read
+
+    Raises
+    ------
+    OSError
+        If the file cannot be read
+    UnicodeDecodeError
+    """
+    stat = os.stat(phys_path)
+    with open(phys_path, "r") as inc_file:  # pylint: disable=W1514
+        return (inc_file.read(), (stat.st_mtime_ns, stat.st_size))
+
+
+def parse_source(
+    codeblock: str,
+    ast_store: Optional[AstStore] = None,
+    phys_path: Optional[Path] = None,
+) -> Optional[Program]:
+    """Parse the content of a file
+
+    Defined at module level so that it can be submitted to a process pool
+
+    Parameters
+    ----------
+    codeblock : str
+    ast_store : AstStore | None, default=None
+        On-disk cache that is checked before parsing and updated after parsing
+    phys_path : Path | None, default=None
+        Physical path of the file, required to use ast_store
+
+    Returns
+    -------
+    Program | None
+        None if the codeblock cannot be parsed
+    """
+    if ast_store is not None and phys_path is not None:
+        if (prog := ast_store.get(phys_path, codeblock)) is not None:
+            return prog
+        if (prog := parse_source(codeblock)) is not None:
+            try:
+                ast_store.put(phys_path, codeblock, prog)
+            except Exception:  # pylint: disable=W0718
+                # the store is only a cache, e.g., the disk may be full
+                pass
+        return prog
+    try:
+        with ExitStack() as stack:
+            # consume error messages with throwaway buffer
+            err_msg = stack.enter_context(StringIO())
+            tkzr: Tokenizer = stack.enter_context(Tokenizer(codeblock, False, err_msg))
+            # try to parse file
+            return Program.from_tokenizer(tkzr)
+    except Exception:  # pylint: disable=W0718
+        # error type does not matter
+        return None
+
+
+def parse_file(
+    phys_path: Path,
+    source_store: Optional[SourceStore] = None,
+    ast_store: Optional[AstStore] = None,
+) -> ParsedFile:
+    """Read and parse a file
+
+    Defined at module level so that it can be submitted to a process pool
+
+    Parameters
+    ----------
+    phys_path : Path
+    source_store : SourceStore | None, default=None
+        Store to read the file from. If None, the file is opened directly
+    ast_store : AstStore | None, default=None
+        On-disk cache of parsed programs
+
+    Returns
+    -------
+    ParsedFile
+        (None, None) if the file does not exist or cannot be parsed
+    """
+    try:
+        codeblock, stat = (
+            read_source(phys_path)
+            if source_store is None
+            else source_store.read(phys_path)
+        )
+    except (OSError, UnicodeDecodeError):
+        # missing files also end up here
+        return (None, None)
+    if (prog := parse_source(codeblock, ast_store, phys_path)) is None:
+        return (None, None)
+    return (prog, stat)
+
+
+@attrs.define
+class CacheEntry:
+    """Cached result of a virtual directory request
+
+    Attributes
+    ----------
+    program : Program | None
+        None if the file does not exist or could not be parsed
+    mtime_ns : int | None
+        Modification time of the file when it was parsed
+    size : int | None
+        Size of the file when it was parsed
+    ast_bytes : int
+        Estimated memory used by the program
+    expires : float | None
+        For negative entries, `time.monotonic()` value after which
+        the file should be requested again
+    """
+
+    program: Optional[Program]
+    mtime_ns: Optional[int] = attrs.field(default=None)
+    size: Optional[int] = attrs.field(default=None)
+    ast_bytes: int = attrs.field(default=0)
+    expires: Optional[float] = attrs.field(default=None)
 
 
 @attrs.define
@@ -20,14 +198,60 @@ class VirtualDirectory:
         Root path containing the virtual name of the directory
     actual_path : Path
         Physical path of the virtual directory
+    max_ast_bytes : int | None, default=None
+        Memory budget of the request cache, measured with `estimate_ast_bytes()`.
+        Least recently used programs are evicted once the budget is exceeded.
+        If None, the cache is unbounded
+    negative_ttl : float, default=5.0
+        Seconds before a missing or unparsable file is requested again
+    check_stat : bool, default=True
+        Whether to compare the modification time and size of a file
+        with the cached values on every cache hit
+    source_store : SourceStore | None, default=None
+        Memory-mapped store that requested files are read from.
+        If None, each file is opened and decoded with the default encoding.
+        Files prefetched in an executor are always opened by the worker
+    ast_store : AstStore | None, default=None
+        On-disk cache of parsed programs shared with other processes
+
+    Methods
+    -------
+    physical_path(file_path)
+    prefetch(file_path, executor)
+    request(file_path)
+    request_async(file_path, executor)
+    invalidate(file_path)
+    clear()
     """
 
     root_name: Path = attrs.field(validator=attrs.validators.instance_of(Path))
     actual_path: Path = attrs.field()
-    # cache included files upon first request
+    max_ast_bytes: Optional[int] = attrs.field(default=None, kw_only=True)
+    negative_ttl: float = attrs.field(
+        default=5.0, validator=attrs.validators.ge(0), kw_only=True
+    )
+    check_stat: bool = attrs.field(default=True, kw_only=True)
+    source_store: Optional[SourceStore] = attrs.field(
+        default=None, repr=False, kw_only=True
+    )
+    ast_store: Optional[AstStore] = attrs.field(default=None, repr=False, kw_only=True)
+    # cache included files upon first request, most recently used at the end
     # if an error occurs during parsing, use None as placeholder
-    _req_cache: dict[Path, Optional[Program]] = attrs.field(
-        default=attrs.Factory(dict), init=False
+    _req_cache: OrderedDict[Path, CacheEntry] = attrs.field(
+        default=attrs.Factory(OrderedDict), init=False
+    )
+    _cache_bytes: int = attrs.field(default=0, repr=False, init=False)
+    # guards _req_cache, _cache_bytes, and _parse_locks
+    _lock: threading.Lock = attrs.field(
+        default=attrs.Factory(threading.Lock), repr=False, eq=False, init=False
+    )
+    # one lock per file that is currently being parsed
+    _parse_locks: dict[Path, threading.Lock] = attrs.field(
+        default=attrs.Factory(dict), repr=False, eq=False, init=False
+    )
+    # files submitted to an executor that have not been requested yet
+    _prefetched: dict[Path, Future] = attrs.field(
+        default=attrs.Factory(dict), repr=False, eq=False, init=False
     )
 
     @actual_path.validator
@@ -37,6 +261,122 @@ class VirtualDirectory:
                 "actual_path must point to an accessible physical directory"
             )
 
+    @property
+    def cache_bytes(self) -> int:
+        """Estimated memory used by all cached programs
+
+        Returns
+        -------
+        int
+        """
+        return self._cache_bytes
+
+    def physical_path(self, file_path: Path) -> Path:
+        """
+        Parameters
+        ----------
+        file_path : Path
+            Path to a file in the virtual directory.
+            Must be a subpath of root_name
+
+        Returns
+        -------
+        Path
+            Location of the file in the physical directory
+        """
+        return self.actual_path / file_path.relative_to(self.root_name)
+
+    def _file_stat(self, phys_path: Path) -> Optional[tuple[int, int]]:
+        """(mtime_ns, size) of a file for `_lookup()`, call without holding _lock"""
+        if not self.check_stat:
+            return None
+        try:
+            stat = os.stat(phys_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _lookup(
+        self, rel_path: Path, file_stat: Optional[tuple[int, int]]
+    ) -> Optional[CacheEntry]:
+        """Get a cache entry if it is still valid, must hold _lock"""
+        if (entry := self._req_cache.get(rel_path, None)) is None:
+            return None
+        if entry.program is None:
+            # negative entry
+            if entry.expires is not None and time.monotonic() >= entry.expires:
+                return None
+        elif self.check_stat and file_stat != (entry.mtime_ns, entry.size):
+            # file changed since it was parsed, or cannot be accessed
+            return None
+        self._req_cache.move_to_end(rel_path)
+        return entry
+
+    def _store(self, rel_path: Path, entry: CacheEntry):
+        """Add an entry to the cache and evict over budget, must hold _lock"""
+        if (old_entry := self._req_cache.pop(rel_path, None)) is not None:
+            self._cache_bytes -= old_entry.ast_bytes
+        self._req_cache[rel_path] = entry
+        self._cache_bytes += entry.ast_bytes
+        if self.max_ast_bytes is None:
+            return
+        while self._cache_bytes > self.max_ast_bytes and len(self._req_cache) > 1:
+            # evict least recently used, but always keep the newest entry
+            _, evicted = self._req_cache.popitem(last=False)
+            self._cache_bytes -= evicted.ast_bytes
+
+    def _make_entry(self, parsed: ParsedFile) -> CacheEntry:
+        """Wrap the result of `parse_file()` in a cache entry"""
+        prog, stat = parsed
+        if prog is None or stat is None:
+            # negative entry
+            return CacheEntry(None, expires=time.monotonic() + self.negative_ttl)
+        return CacheEntry(prog, *stat, estimate_ast_bytes(prog))
+
+    def prefetch(
+        self, file_path: Path, executor: Executor, *, new_only: bool = False
+    ) -> Optional[Future]:
+        """Start parsing a file in the background
+
+        A later `request()` for the file waits for the result instead of parsing
+
+        Parameters
+        ----------
+        file_path : Path
+            Path to a file in the virtual directory.
+            Must be a subpath of root_name
+        executor : concurrent.futures.Executor
+            Thread or process pool that runs `parse_file()`
+        new_only : bool, default=False
+            Return None if the file has already been submitted,
+            instead of the future of the earlier submission
+
+        Returns
+        -------
+        Future | None
+            Future that resolves to the result of `parse_file()`,
+            or None if the file is already cached or being parsed by a request
+
+        Raises
+        ------
+        RuntimeError
+            If the executor has been shut down
+        """
+        rel_path = file_path.relative_to(self.root_name)
+        phys_path = self.physical_path(file_path)
+        file_stat = self._file_stat(phys_path)
+        with self._lock:
+            if (fut := self._prefetched.get(rel_path, None)) is not None:
+                return None if new_only else fut
+            if (
+                self._lookup(rel_path, file_stat) is not None
+                or rel_path in self._parse_locks
+            ):
+                return None
+            fut = executor.submit(parse_file, phys_path, None, self.ast_store)
+            self._prefetched[rel_path] = fut
+            return fut
+
     def request(self, file_path: Path) -> Optional[Program]:
         """
         Parameters
@@ -44,32 +384,140 @@ class VirtualDirectory:
         file_path : Path
             Path to a file in the virtual directory.
             Must be a subpath of root_name
+
+        Returns
+        -------
+        Program | None
+            None if the file does not exist or cannot be parsed
+
+        Notes
+        -----
+        Safe to call from multiple threads; concurrent requests
+        for the same file wait for a single parse
         """
         rel_path = file_path.relative_to(self.root_name)
-        if rel_path in self._req_cache:
-            # file was requested once before, use cached program
-            return self._req_cache[rel_path]
         # check for include file in physical directory
-        phys_path = self.actual_path / rel_path
-        if not phys_path.exists():
-            # include file does not exist
-            self._req_cache[rel_path] = None
-            return None
-        try:
-            with ExitStack() as stack:
-                # consume error messages with throwaway buffer
-                err_msg = stack.enter_context(StringIO())
-                inc_file = stack.enter_context(
-                    open(phys_path, "r")  # pylint: disable=W1514
+        phys_path = self.physical_path(file_path)
+        file_stat = self._file_stat(phys_path)
+        with self._lock:
+            if (entry := self._lookup(rel_path, file_stat)) is not None:
+                # file was requested once before, use cached program
+                return entry.program
+            parse_lock = self._parse_locks.setdefault(rel_path, threading.Lock())
+        with parse_lock:
+            file_stat = self._file_stat(phys_path)
+            with self._lock:
+                # another thread may have parsed the file while waiting
+                if (entry := self._lookup(rel_path, file_stat)) is not None:
+                    return entry.program
+                pending = self._prefetched.pop(rel_path, None)
+            parsed: Optional[ParsedFile] = None
+            if pending is not None:
+                try:
+                    # block until the prefetched file has been parsed
+                    parsed = pending.result()
+                except Exception:  # pylint: disable=W0718
+                    # pool failed (e.g., broken process pool), parse here instead
+                    parsed = None
+            entry = self._make_entry(
+                parsed
+                if parsed is not None
+                else parse_file(phys_path, self.source_store, self.ast_store)
+            )
+            with self._lock:
+                self._store(rel_path, entry)
+                self._parse_locks.pop(rel_path, None)
+        return entry.program
+
+    async def request_async(
+        self, file_path: Path, executor: Optional[Executor] = None
+    ) -> Optional[Program]:
+        """Asynchronous variant of `request()`
+
+        The file is read in a worker thread and parsed in the executor;
+        concurrent requests for the same file await one shared future
+
+        Parameters
+        ----------
+        file_path : Path
+            Path to a file in the virtual directory.
+            Must be a subpath of root_name
+        executor : concurrent.futures.Executor | None, default=None
+            Thread or process pool that runs `parse_source()`.
+            If None, the default executor of the event loop is used
+
+        Returns
+        -------
+        Program | None
+            None if the file does not exist or cannot be parsed
+        """
+        rel_path = file_path.relative_to(self.root_name)
+        phys_path = self.physical_path(file_path)
+        owner = False
+        file_stat = await asyncio.to_thread(self._file_stat, phys_path)
+        with self._lock:
+            if (entry := self._lookup(rel_path, file_stat)) is not None:
+                return entry.program
+            if (
+                fut := self._prefetched.get(rel_path, None)
+            ) is None and rel_path not in self._parse_locks:
+                # first request for the file, other requests wait for this one
+                fut = Future()
+                self._prefetched[rel_path] = fut
+                owner = True
+        if fut is None:
+            # a blocking request is parsing the file in another thread
+            return await asyncio.to_thread(self.request, file_path)
+        if owner:
+            parsed: Optional[ParsedFile] = None
+            try:
+                codeblock, stat = await asyncio.to_thread(
+                    (
+                        read_source
+                        if self.source_store is None
+                        else self.source_store.read
+                    ),
+                    phys_path,
                 )
-                tkzr: Tokenizer = stack.enter_context(
-                    Tokenizer(inc_file.read(), False, err_msg)
+                prog = await asyncio.get_running_loop().run_in_executor(
+                    executor, parse_source, codeblock, self.ast_store, phys_path
                 )
-                # try to parse file
-                self._req_cache[rel_path] = Program.from_tokenizer(tkzr)
-            return self._req_cache[rel_path]
-        except Exception:  # pylint: disable=W0718
-            # error type does not matter
-            # something went wrong, so use None placeholder
-            self._req_cache[rel_path] = None
-            return None
+                parsed = (prog, stat) if prog is not None else (None, None)
+            except (OSError, UnicodeDecodeError):
+                parsed = (None, None)
+            except Exception:  # pylint: disable=W0718
+                # pool failed (e.g., broken process pool), parse in a thread instead
+                parsed = None
+            finally:
+                # None makes every waiting request parse the file itself,
+                # e.g., if this request was cancelled
+                fut.set_result(parsed)
+        # do not cancel the shared future if only this request is cancelled
+        await asyncio.shield(asyncio.wrap_future(fut))
+        # take the parsed program from the queue and store it in the cache
+        return await asyncio.to_thread(self.request, file_path)
+
+    def invalidate(self, file_path: Path):
+        """Remove a file from the request cache
+
+        A prefetched result of the file is dropped as well,
+        the next request parses the file again
+
+        Parameters
+        ----------
+        file_path : Path
+            Path to a file in the virtual directory.
+            Must be a subpath of root_name
+        """
+        rel_path = file_path.relative_to(self.root_name)
+        with self._lock:
+            self._prefetched.pop(rel_path, None)
+            if (entry := self._req_cache.pop(rel_path, None)) is not None:
+                self._cache_bytes -= entry.ast_bytes
+
+    def clear(self):
+        """Remove all files from the request cache"""
+        with self._lock:
+            self._req_cache.clear()
+            self._prefetched.clear()
+            self._cache_bytes = 0
@@ -0,0 +1,78 @@
+from pyaspparsing.ast.tokenizer.state_machine import Tokenizer
+from pyaspparsing.ast.ast_types import *
+from pyaspparsing.ast.ast_types.ast_diff import (
+    structural_hash,
+    diff_programs,
+)
+
+
+def _parse(code: str) -> Program:
+    with Tokenizer(code, False) as tkzr:
+        return Program.from_tokenizer(tkzr)
+
+
+old_codeblock = """<%
+Dim x
+x = 1
+Function Add(a, b)
+    Add = a + b
+End Function
+Sub Greet()
+    Response.Write "Hello"
+End Sub
+Sub Unused()
+End Sub
+Response.Write x
+%>"""
+
+new_codeblock = """<%
+Dim x
+x = 2
+Sub greet()
+    Response.Write "Hello"
+End Sub
+Function Add(a, b)
+    Add = a - b
+End Function
+Function Twice(a)
+    Twice = a * 2
+End Function
+Response.Write x
+Response.Write Twice(x)
+%>"""
+
+
+def test_structural_hash():
+    prog = _parse(old_codeblock)
+    prog_repr = repr(prog)
+    memo = {}
+    first = structural_hash(prog, memo)
+    # digests are kept in the memo, the tree is not modified
+    assert memo[id(prog)] == first and len(memo) > 1
+    assert repr(prog) == prog_repr
+    assert structural_hash(prog) == first
+    memo[id(prog.global_stmt_list[0])] = b"changed"
+    assert structural_hash(prog, memo) == first
+    del memo[id(prog)]
+    assert structural_hash(prog, memo) != first
+    # same code at a different position has the same structure
+    assert structural_hash(_parse(old_codeblock.replace("<%", "<%\n\n"))) == first
+    assert structural_hash(EvalExpr(1)) != structural_hash(EvalExpr(True))
+    assert structural_hash(EvalExpr(1)) != structural_hash(EvalExpr(1.0))
+
+
+def test_diff_programs():
+    old_prog = _parse(old_codeblock)
+    assert not diff_programs(old_prog, _parse(old_codeblock)).has_changes
+
+    prog_diff = diff_programs(old_prog, _parse(new_codeblock))
+    assert prog_diff.has_changes
+    assert prog_diff.added_decls == ["twice"]
+    assert prog_diff.removed_decls == ["unused"]
+    assert prog_diff.changed_decls == ["add"]
+    assert prog_diff.dirty_decls == {"add", "twice"}
+    # x = 1 -> x = 2
+    assert prog_diff.changed_stmts == [(1, 1)]
+    assert prog_diff.removed_stmts == []
+    # Response.Write Twice(x)
+    assert prog_diff.added_stmts == [6]
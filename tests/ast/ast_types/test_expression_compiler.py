@@ -0,0 +1,53 @@
+import pytest
+from pyaspparsing import EvaluatorError
+from pyaspparsing.ast.tokenizer.state_machine import Tokenizer
+from pyaspparsing.ast.ast_types import *
+from pyaspparsing.ast.ast_types.expression_parser import ExpressionParser
+from pyaspparsing.ast.ast_types.expression_compiler import (
+    compile_expr,
+    compiled_expr_cache,
+)
+
+
+def _parse(code: str) -> Expr:
+    with Tokenizer(f"<%={code}%>", False) as tkzr:
+        tkzr.advance_pos()
+        return ExpressionParser.parse_expr(tkzr)
+
+
+@pytest.mark.parametrize(
+    "code,free_names,args,exp_value",
+    [
+        ("a + 1", ["a"], (1,), 2),
+        ("a - b", ["a", "b"], (5, 2), 3),
+        ("a * 2 / b", ["a", "b"], (3, 4), 1.5),
+        ("a \\ 2", ["a"], (7,), 3),
+        ("a Mod 3", ["a"], (7,), 1),
+        ("-a ^ 2", ["a"], (3,), -9),
+        ('"row" & a & "-" & b', ["a", "b"], (1, 2), "row1-2"),
+        ("a > 1 And b < 1", ["a", "b"], (2, 0), True),
+        ("Not a", ["A"], (False,), True),
+    ],
+)
+def test_compile_expr(code, free_names, args, exp_value):
+    comp = compile_expr(_parse(code), free_names)
+    assert comp(*args).expr_value == exp_value
+    assert comp.bind(dict(zip(free_names, args))).expr_value == exp_value
+
+
+def test_compile_expr_cache():
+    compiled_expr_cache.clear()
+    first = compile_expr(_parse("a + 1"), ["a"])
+    assert compile_expr(_parse("a + 1"), ["a"]) is first
+    assert compile_expr(_parse("a + 1"), ["a"], use_cache=False) is not first
+    assert len(compiled_expr_cache) == 1
+
+
+def test_compile_expr_invalid():
+    with pytest.raises(EvaluatorError):
+        # 'b' is not a free name
+        compile_expr(_parse("a + b"), ["a"])
+    with pytest.raises(EvaluatorError):
+        compile_expr(_parse("a Is b"), ["a", "b"])
+    with pytest.raises(ValueError):
+        compile_expr(_parse("a + 1"), ["a"])(1, 2)
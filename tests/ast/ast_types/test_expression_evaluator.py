@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from pyaspparsing.ast.ast_types import *
+from pyaspparsing.ast.ast_types.expression_evaluator import (
+    evaluate_expr,
+    expr_eval_cache,
+    structural_key,
+)
+
+
+@pytest.fixture
+def clean_cache():
+    expr_eval_cache.clear()
+    expr_eval_cache.enabled = True
+    yield expr_eval_cache
+    expr_eval_cache.clear()
+    expr_eval_cache.enabled = False
+
+
+def test_structural_key():
+    assert structural_key(
+        FoldableExpr(AddExpr(EvalExpr(1), EvalExpr(2)))
+    ) == structural_key(AddExpr(EvalExpr(1), EvalExpr(2)))
+    # value types must be kept apart
+    assert structural_key(EvalExpr(1)) != structural_key(EvalExpr(True))
+    assert structural_key(EvalExpr(1)) != structural_key(EvalExpr(1.0))
+    assert structural_key(AddExpr(EvalExpr(1), EvalExpr(2))) != structural_key(
+        MultExpr(EvalExpr(1), EvalExpr(2))
+    )
+
+
+def test_evaluate_expr_memo(clean_cache):
+    fld = FoldableExpr(ConcatExpr(EvalExpr("Hello, "), EvalExpr("world!")))
+    first = evaluate_expr(fld)
+    assert first.expr_value == "Hello, world!"
+    assert clean_cache.hits == 0 and clean_cache.misses == 1
+    # structurally identical tree should be served from the memo
+    second = evaluate_expr(ConcatExpr(EvalExpr("Hello, "), EvalExpr("world!")))
+    assert second is first
+    assert clean_cache.hits == 1
+    assert clean_cache.hit_rate == 0.5
+
+
+def test_evaluate_expr_memo_bounded(clean_cache):
+    clean_cache.maxsize = 2
+    try:
+        for i in range(5):
+            assert evaluate_expr(AddExpr(EvalExpr(i), EvalExpr(1))).expr_value == i + 1
+        assert len(clean_cache) == 2
+    finally:
+        clean_cache.maxsize = 1024
+
+
+def test_evaluate_expr_memo_disabled(clean_cache):
+    clean_cache.enabled = False
+    evaluate_expr(AddExpr(EvalExpr(1), EvalExpr(2)))
+    evaluate_expr(AddExpr(EvalExpr(1), EvalExpr(2)))
+    assert clean_cache.hits == 0 and clean_cache.misses == 0
+    assert len(clean_cache) == 0
+
+
+def test_evaluate_expr_memo_subtrees(clean_cache):
+    def _chain(num_links):
+        chain = EvalExpr("0")
+        for idx in range(1, num_links):
+            chain = ConcatExpr(chain, EvalExpr(str(idx)))
+        return chain
+
+    result = evaluate_expr(FoldableExpr(_chain(200)))
+    assert result.expr_value == "".join(str(idx) for idx in range(200))
+    # every link is memoized
+    assert clean_cache.hits == 0 and len(clean_cache) == 199
+    # longer chain reuses the evaluated subtree
+    evaluate_expr(FoldableExpr(_chain(201)))
+    assert clean_cache.hits == 1 and len(clean_cache) == 200
+    # identical subtrees of the same tree are evaluated once
+    clean_cache.clear()
+    evaluate_expr(AddExpr(_chain(50), _chain(50)))
+    assert clean_cache.hits == 1 and clean_cache.misses == 50
+
+
+def test_evaluate_expr_memo_threads(clean_cache):
+    with ThreadPoolExecutor(4) as executor:
+        results = list(
+            executor.map(
+                lambda idx: evaluate_expr(
+                    AddExpr(EvalExpr(idx % 10), EvalExpr(1))
+                ).expr_value,
+                range(400),
+            )
+        )
+    assert results == [idx % 10 + 1 for idx in range(400)]
+    assert len(clean_cache) == 10 and clean_cache.hits + clean_cache.misses == 400
@@ -0,0 +1,112 @@
+import io
+import json
+import sys
+from pyaspparsing.ast.tokenizer.state_machine import Tokenizer
+from pyaspparsing.ast.ast_types import *
+from pyaspparsing.ast.ast_types.serializer import dump_text, dump_json
+
+codeblock = """<%@ Language="VBScript" %>
+<%
+Dim x
+x = "a" & "b"
+If x = "ab" Then
+    Response.Write x
+End If
+%>
+<p><%=x%></p>"""
+
+
+def _parse(code: str) -> Program:
+    with Tokenizer(code, False) as tkzr:
+        return Program.from_tokenizer(tkzr)
+
+
+def test_dump_text():
+    prog = _parse(codeblock)
+    with io.StringIO() as buf:
+        dump_text(prog, buf)
+        assert buf.getvalue() == f"{repr(prog)}\n"
+    assert repr(EvalExpr(1)) == "EvalExpr(\n  expr_value=1\n)"
+    assert repr(Program()) == "Program(\n  global_stmt_list=[]\n)"
+
+
+# repr() of a program as printed by FormatterMixin before the serializer existed
+call_repr = """Program(
+  global_stmt_list=[
+    OptionExplicit(),
+    AssignStmt(
+      target_expr=LeftExpr(
+        sym_name='x',
+        subnames={},
+        call_args={},
+        end_idx=0,
+        num_index_or_param=0,
+        num_tail=0
+      ),
+      assign_expr=LeftExpr(
+        sym_name='f',
+        subnames={},
+        call_args={
+          0: (LeftExpr(
+            sym_name='y',
+            subnames={},
+            call_args={},
+            end_idx=0,
+            num_index_or_param=0,
+            num_tail=0
+          ),)
+        },
+        end_idx=1,
+        num_index_or_param=1,
+        num_tail=0
+      ),
+      is_new=False
+    )
+  ]
+)"""
+
+
+def test_dump_text_matches_repr():
+    prog = _parse("<%\nOption Explicit\nx = f(y)\n%>")
+    assert repr(prog) == call_repr
+    with io.StringIO() as buf:
+        dump_text(prog, buf)
+        assert buf.getvalue() == f"{call_repr}\n"
+    # node without attributes
+    assert repr(OptionExplicit()) == "OptionExplicit()\n"
+    with io.StringIO() as buf:
+        dump_text(OptionExplicit(), buf)
+        assert buf.getvalue() == "OptionExplicit()\n"
+
+
+def test_dump_json():
+    prog = _parse(codeblock)
+    with io.StringIO() as buf:
+        dump_json(prog, buf)
+        prog_json = json.loads(buf.getvalue())
+    assert prog_json["_type"] == "Program"
+    assert [stmt["_type"] for stmt in prog_json["global_stmt_list"]] == [
+        "ProcessingDirective",
+        "OutputText",
+        "VarDecl",
+        "AssignStmt",
+        "IfStmt",
+        "OutputText",
+    ]
+    setting = prog_json["global_stmt_list"][0]["settings"][0]
+    assert setting["config_kw"]["token_type"] == "TokenType.IDENTIFIER"
+    assert setting["config_kw"]["token_src"]["_type"] == "slice"
+
+
+def test_dump_deep_tree():
+    # deeper than the recursion limit
+    depth = sys.getrecursionlimit() + 100
+    deep_expr = EvalExpr(0)
+    for _ in range(depth):
+        deep_expr = NotExpr(deep_expr)
+    with io.StringIO() as buf:
+        dump_text(deep_expr, buf)
+        assert buf.getvalue().startswith("NotExpr(\n  term=NotExpr(\n")
+    with io.StringIO() as buf:
+        dump_json(deep_expr, buf)
+        assert buf.getvalue().endswith('"expr_value": 0}' + "}" * depth)
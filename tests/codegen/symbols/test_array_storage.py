@@ -0,0 +1,62 @@
+import copy
+import pytest
+from pyaspparsing.codegen.symbols.array_storage import ArrayStorage
+
+
+def test_array_storage_switches_layout():
+    storage = ArrayStorage([3, 1])
+    assert storage.size == 8 and not storage.is_dense
+    assert storage.offset((1, 1)) == 5
+    assert storage.offset((4, 0)) == -1
+    assert storage.offset((1,)) == -1
+    assert storage.offset((0, "a")) == -1
+    assert storage.offset((True, 0)) == -1
+    assert not storage.store((0, False), 1)
+    assert not storage.store((4, 0), "x")
+    with pytest.raises(IndexError):
+        storage[(4, 0)] = "x"
+    for col in range(4):
+        storage[(col, 1)] = col
+    # half of the elements are assigned
+    assert storage.is_dense
+    assert storage == {(0, 1): 0, (1, 1): 1, (2, 1): 2, (3, 1): 3}
+    assert (2, 1) in storage and (2, 0) not in storage and len(storage) == 4
+    with pytest.raises(KeyError):
+        storage[(2, 0)]  # pylint: disable=W0104
+    storage_copy = copy.copy(storage)
+    for col in range(4):
+        del storage[(col, 1)]
+    assert not storage.is_dense and len(storage) == 0
+    assert len(storage_copy) == 4 and storage_copy.is_dense
+
+
+def test_array_storage_store_many():
+    storage = ArrayStorage([9])
+
+    def _items():
+        yield ((0,), "a")
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        storage.store_many(_items())
+    assert len(storage) == 0
+    assert storage.store_many(((idx,), idx) for idx in range(12)) == 10
+    assert storage.is_dense and storage[(9,)] == 9
+
+
+@pytest.mark.parametrize("num_items", [1, 6])
+def test_array_storage_redim(num_items):
+    storage = ArrayStorage([1, 4])
+    storage.store_many(((idx % 2, idx // 2), idx) for idx in range(num_items))
+    items = dict(storage)
+    # last dimension grows, then shrinks
+    storage.redim([1, 9], preserve=True)
+    assert storage.bounds == (1, 9) and storage == items
+    storage.redim([1, 1], preserve=True)
+    assert storage == {idx: val for idx, val in items.items() if idx[1] <= 1}
+    storage[(1, 1)] = "x"
+    with pytest.raises(ValueError):
+        storage.redim([2, 1], preserve=True)
+    assert storage.bounds == (1, 1)
+    storage.redim([2, 1])
+    assert storage.bounds == (2, 1) and len(storage) == 0
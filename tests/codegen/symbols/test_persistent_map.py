@@ -0,0 +1,75 @@
+import pytest
+from pyaspparsing.codegen.symbols.persistent_map import CopyOnWriteMap, PersistentMap
+
+
+class CollidingKey:
+    """Key with many hash collisions"""
+
+    def __init__(self, value: int):
+        self.value = value
+
+    def __hash__(self) -> int:
+        return self.value % 3
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CollidingKey) and other.value == self.value
+
+
+@pytest.mark.parametrize("make_key", [int, str, CollidingKey, lambda k: -(k << 70)])
+def test_persistent_map(make_key):
+    expected = {}
+    pmap = PersistentMap()
+    snapshots = []
+    for idx in range(200):
+        key = make_key(idx % 150)
+        if idx % 7 == 0 and key in expected:
+            pmap = pmap.delete(key)
+            del expected[key]
+        else:
+            pmap = pmap.set(key, idx)
+            expected[key] = idx
+        assert len(pmap) == len(expected)
+        if idx % 50 == 0:
+            snapshots.append((pmap, dict(expected)))
+    assert dict(pmap.items()) == expected
+    assert all(pmap[key] == val for key, val in expected.items())
+    assert make_key(500) not in pmap and pmap.get(make_key(500), -1) == -1
+    with pytest.raises(KeyError):
+        pmap.delete(make_key(500))
+    # earlier versions are unchanged
+    for snap_map, snap_items in snapshots:
+        assert dict(snap_map.items()) == snap_items
+        assert set(pmap.changed_keys(snap_map)) == {
+            key
+            for key in set(snap_items) | set(expected)
+            if snap_items.get(key, None) != expected.get(key, None)
+        }
+    assert list(pmap.changed_keys(pmap)) == []
+
+
+def test_copy_on_write_map():
+    cow_map: CopyOnWriteMap[str, list[int]] = CopyOnWriteMap(list)
+    cow_map["a"] = [1]
+    cow_map["b"] = [2]
+    snap = cow_map.snapshot()
+    forked = cow_map.fork()
+    # shared values are copied before they are handed out for modification
+    assert cow_map.peek("a") is snap["a"]
+    cow_map["a"].append(3)
+    assert cow_map.peek("a") == [1, 3] and snap["a"] == [1]
+    assert forked["a"] == [1]
+    forked["b"].append(4)
+    assert cow_map.peek("b") == [2]
+    del cow_map["b"]
+    assert set(cow_map) == {"a"} and set(snap) == {"a", "b"}
+    assert set(cow_map.snapshot().changed_keys(snap)) == {"a", "b"}
+    cow_map.restore(snap)
+    assert cow_map["a"] == [1] and cow_map["b"] == [2]
+    cow_map.share("c", snap["a"])
+    cow_map["c"].append(5)
+    assert snap["a"] == [1]
+    # only the values copied since the fork differ
+    forked = cow_map.fork()
+    assert forked.materialize("a") is not cow_map.peek("a")
+    assert forked.materialize("a") is forked.peek("a")
+    assert list(forked.changed_keys(cow_map)) == ["a"]
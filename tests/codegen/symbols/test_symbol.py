@@ -1,5 +1,44 @@
+import pytest
+from pyaspparsing.ast.ast_types import EvalExpr, LeftExpr
 from pyaspparsing.codegen.symbols.symbol import *
 
 
 def test_symbol():
     return
+
+
+@pytest.mark.parametrize(
+    "range_from,range_to,range_step,exp_range",
+    [
+        (EvalExpr(0), EvalExpr(3), None, [0, 1, 2, 3]),
+        (EvalExpr(0), EvalExpr(10), EvalExpr(5), [0, 5, 10]),
+        (EvalExpr(3), EvalExpr(1), EvalExpr(-1), [3, 2, 1]),
+        (EvalExpr(3), EvalExpr(1), None, []),
+        (EvalExpr(0), EvalExpr(3), EvalExpr(0), None),
+        (EvalExpr(0), EvalExpr(1.5), None, None),
+        (EvalExpr(0), LeftExpr("a"), None, None),
+    ],
+)
+def test_for_loop_iteration_range(range_from, range_to, range_step, exp_range):
+    target = ForLoopRangeTargetSymbol("i", range_from, range_to, range_step)
+    loop_range = target.iteration_range
+    if exp_range is None:
+        assert loop_range is None
+    else:
+        assert list(loop_range) == exp_range
+
+
+def test_array_insert_many():
+    arr = ArraySymbol("arr", [3, 1])
+    num_inserted = arr.insert_many(
+        [
+            ((0, 0), "a"),
+            ((3, 1), "b"),
+            # out of bounds
+            ((4, 0), "c"),
+            # wrong rank
+            ((1,), "d"),
+        ]
+    )
+    assert num_inserted == 2
+    assert arr.array_data == {(0, 0): "a", (3, 1): "b"}
@@ -0,0 +1,148 @@
+from io import StringIO
+from pyaspparsing.ast.ast_types import EvalExpr, LeftExpr
+from pyaspparsing.codegen.symbols.symbol import ValueSymbol, ValueMethodArgument
+from pyaspparsing.codegen.symbols.symbol_table import SymbolTable
+
+
+def test_symbol_table_index():
+    sym_table = SymbolTable()
+    sym_table.add_symbol(ValueSymbol("a", EvalExpr(0)), 0)
+    sym_table.add_symbol(ValueSymbol("a", EvalExpr(1)), 2)
+    # scope 3 is a sibling of scope 2, defined after it
+    sym_table.add_symbol(ValueSymbol("a", EvalExpr(3)), 3)
+    assert sym_table.defining_scopes("a") == [0, 2, 3]
+    assert [
+        resv.scope for resv in sym_table.resolve_symbol(LeftExpr("a"), (0, 1, 2))
+    ] == [0, 2]
+    assert [resv.scope for resv in sym_table.resolve_symbol(LeftExpr("a"))] == [
+        0,
+        2,
+        3,
+    ]
+    assert sym_table.resolve_symbol(LeftExpr("b"), (0, 1, 2)) == []
+    assert sym_table.nearest_symbol("a", (0, 1, 2)).scope == 2
+    assert sym_table.nearest_symbol("a", (0, 1)).scope == 0
+    assert sym_table.nearest_symbol("b", (0, 1)) is None
+    resolved = sym_table.try_resolve_args((LeftExpr("a"), LeftExpr("b"), 5), (0, 3))
+    assert len(resolved) == 3
+    assert resolved[0].expr_value == 3
+    assert isinstance(resolved[1], LeftExpr) and resolved[1].sym_name == "b"
+    assert resolved[2] == 5
+
+
+def test_symbol_table_remove_scope():
+    sym_table = SymbolTable()
+    sym_table.add_symbol(ValueSymbol("a", EvalExpr(0)), 0)
+    sym_table.add_symbol(ValueSymbol("a", EvalExpr(1)), 1)
+    sym_table.add_symbol(ValueSymbol("b", EvalExpr(1)), 1)
+    forked = sym_table.fork()
+    assert sym_table.remove_scope(1)
+    assert not sym_table.remove_scope(1)
+    assert sym_table.defining_scopes("a") == [0]
+    assert sym_table.defining_scopes("b") == []
+    # forked table keeps its own index
+    assert forked.defining_scopes("a") == [0, 1]
+    assert forked.nearest_symbol("b", (0, 1)).scope == 1
+
+
+def test_symbol_table_overlay_scope():
+    sym_table = SymbolTable()
+    sym_table.add_symbol(ValueMethodArgument("x"), 1)
+    sym_table.add_symbol(ValueSymbol("y", EvalExpr(0)), 1)
+    def_x = sym_table.sym_scopes[1].sym_table["x"]
+    assert not sym_table.overlay_scope(5, 2)
+    assert sym_table.overlay_scope(1, 2)
+    call_scp = sym_table.sym_scopes[2]
+    # reads go through to the definition scope
+    assert call_scp.sym_table["x"] is def_x
+    assert set(call_scp.sym_table) == {"x", "y"}
+    assert sym_table.nearest_symbol("x", (0, 2)).scope == 2
+    # assignment copies the symbol into the call scope
+    call_scp.assign(LeftExpr("x"), EvalExpr(1))
+    call_scp.assign(LeftExpr("y"), EvalExpr(2))
+    assert call_scp.sym_table["x"] is not def_x
+    assert call_scp.sym_table["x"].value.expr_value == 1
+    assert call_scp.sym_table["y"].value.expr_value == 2
+    assert def_x.value is None
+    assert sym_table.sym_scopes[1].sym_table["y"].value.expr_value == 0
+    forked = sym_table.fork()
+    forked.sym_scopes[2].assign(LeftExpr("x"), EvalExpr(3))
+    assert call_scp.sym_table["x"].value.expr_value == 1
+    assert sym_table.remove_scope(2)
+    assert sym_table.defining_scopes("x") == [1]
+
+
+def test_symbol_table_usage():
+    sym_table = SymbolTable()
+    sym_table.add_symbol(ValueMethodArgument("x"), 1)
+    sym_table.add_symbol(ValueSymbol("y", EvalExpr(0)), 0)
+    # every call reads and assigns the argument of the definition scope
+    for call_scp in (2, 3):
+        assert sym_table.overlay_scope(1, call_scp)
+        sym_table.sym_scopes[call_scp].assign(LeftExpr("x"), EvalExpr(call_scp))
+        assert sym_table.nearest_symbol("x", (0, 1, call_scp)).scope == call_scp
+    sym_table.resolve_symbol(LeftExpr("y"), (0, 2))
+    # lookups that are not reads
+    sym_table.nearest_symbol("y", (0,), track=False)
+    sym_table.resolve_symbol(LeftExpr("y"))
+    assert sym_table.remove_scope(2)
+    assert sym_table.reads("x") == 2 and sym_table.reads("y") == 1
+    usage = sym_table.symbol_usage()
+    assert [(use.symbol_name, use.scope) for use in usage.values()] == [
+        ("x", 1),
+        ("y", 0),
+    ]
+    assert (usage[0].reads, usage[0].writes) == (2, 2)
+    assert (usage[1].reads, usage[1].writes) == (1, 0)
+    out_file = StringIO(newline="")
+    sym_table.export_usage(out_file)
+    assert out_file.getvalue().splitlines() == [
+        "symbol_id,symbol_name,scope,reads,writes",
+        "0,x,1,2,2",
+        "1,y,0,1,0",
+    ]
+
+
+def test_symbol_table_merge_branches():
+    sym_table = SymbolTable()
+    sym_table.add_symbol(ValueSymbol("a", EvalExpr(0)), 0)
+    sym_table.add_symbol(ValueSymbol("b", EvalExpr(0)), 0)
+    base = sym_table.snapshot()
+    base_a = sym_table.sym_scopes.peek(0).sym_table["a"]
+    # first branch modifies a and adds a scope
+    sym_table.sym_scopes[0].assign(LeftExpr("a"), EvalExpr(1))
+    sym_table.add_symbol(ValueSymbol("c", EvalExpr(1)), 1)
+    branch_1 = sym_table.snapshot()
+    # second branch starts from the base again
+    sym_table.restore(base)
+    assert sym_table.nearest_symbol("a", (0,)).symbol.value.expr_value == 0
+    assert sym_table.nearest_symbol("c", (0, 1)) is None
+    sym_table.sym_scopes[0].assign(LeftExpr("b"), EvalExpr(2))
+    branch_2 = sym_table.snapshot()
+    sym_table.merge_branches(base, [branch_1, branch_2])
+    assert base_a.value.expr_value == 0
+    assert sym_table.nearest_symbol("a", (0,)).symbol.value.expr_value == 1
+    assert sym_table.nearest_symbol("b", (0,)).symbol.value.expr_value == 2
+    assert sym_table.nearest_symbol("c", (0, 1)).scope == 1
+    assert [use.writes for use in sym_table.symbol_usage().values()] == [1, 1, 0]
+
+
+def test_symbol_table_merge_overlay_branches():
+    sym_table = SymbolTable()
+    sym_table.add_symbol(ValueMethodArgument("x"), 1)
+    sym_table.add_symbol(ValueMethodArgument("y"), 1)
+    assert sym_table.overlay_scope(1, 2)
+    base = sym_table.snapshot()
+    sym_table.sym_scopes[2].assign(LeftExpr("x"), EvalExpr(1))
+    branch_1 = sym_table.snapshot()
+    sym_table.restore(base)
+    sym_table.sym_scopes[2].assign(LeftExpr("y"), EvalExpr(2))
+    branch_2 = sym_table.snapshot()
+    sym_table.merge_branches(base, [branch_1, branch_2])
+    call_scp = sym_table.sym_scopes.peek(2)
+    assert call_scp.sym_table["x"].value.expr_value == 1
+    assert call_scp.sym_table["y"].value.expr_value == 2
+    # the definition scope is never modified through the call scope
+    def_scp = sym_table.sym_scopes.peek(1)
+    assert def_scp.sym_table["x"].value is None
+    assert def_scp.sym_table["y"].value is None
@@ -0,0 +1,64 @@
+from pathlib import Path
+from pyaspparsing.ast.ast_types import Program
+from pyaspparsing.codegen import virtual_dir
+from pyaspparsing.codegen.ast_store import AstStore
+from pyaspparsing.codegen.batch import BatchDriver
+from pyaspparsing.codegen.linker import Linker
+
+
+def test_ast_store(tmp_path: Path):
+    store = AstStore(tmp_path / "store")
+    codeblock = "<% Dim x %>"
+    prog = virtual_dir.parse_source(codeblock)
+    assert store.get(tmp_path / "a.asp", codeblock) is None
+    store.put(tmp_path / "a.asp", codeblock, prog)
+    loaded = store.get(tmp_path / "a.asp", codeblock)
+    assert isinstance(loaded, Program)
+    assert repr(loaded) == repr(prog)
+    # keyed by path and content
+    assert store.get(tmp_path / "b.asp", codeblock) is None
+    assert store.get(tmp_path / "a.asp", "<% Dim y %>") is None
+    # no temporary files are left behind
+    assert len(list(store.root.glob("*/*.tmp"))) == 0
+    store.clear()
+    assert store.get(tmp_path / "a.asp", codeblock) is None
+
+
+def test_ast_store_shared(tmp_path: Path, monkeypatch):
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "inc" / "lib.asp").write_text("<% Dim lib %>")
+    store = AstStore(tmp_path / "store")
+    parent = Linker()
+    parent.register_dir("inc", tmp_path / "inc", ast_store=store)
+    parent_prog = parent.request(Path("/inc/lib.asp"))
+
+    def fail_parse(*_):
+        raise AssertionError("include was parsed again")
+
+    # another linker (e.g., in a worker process) loads the program from the store
+    monkeypatch.setattr(virtual_dir.Program, "from_tokenizer", fail_parse)
+    worker = Linker()
+    worker.register_dir("inc", tmp_path / "inc", ast_store=store)
+    worker_prog = worker.request(Path("/inc/lib.asp"))
+    assert worker_prog is not parent_prog
+    assert repr(worker_prog) == repr(parent_prog)
+
+
+def test_batch_driver_ast_store(tmp_path: Path):
+    (tmp_path / "site").mkdir()
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "inc" / "lib.asp").write_text("<% Dim lib %>")
+    (tmp_path / "site" / "page.asp").write_text(
+        '<!-- #include virtual="/inc/lib.asp" --><p>page</p>'
+    )
+    store = AstStore(tmp_path / "store")
+    lnk = Linker()
+    lnk.register_dir("site", tmp_path / "site")
+    lnk.register_dir("inc", tmp_path / "inc", ast_store=store)
+    driver = BatchDriver(lnk, max_workers=1)
+    results = list(driver.run([Path("/site/page.asp")]))
+    assert driver.summary.succeeded == 1
+    # parent parsed the shared include into the store before starting the workers
+    codeblock = (tmp_path / "inc" / "lib.asp").read_text()
+    assert store.get(tmp_path / "inc" / "lib.asp", codeblock) is not None
+    assert len(results) == 1
@@ -0,0 +1,95 @@
+import os
+from pathlib import Path
+import time
+import pytest
+from pyaspparsing.codegen.batch import *
+from pyaspparsing.codegen.batch import _page_timeout, _run_chunk
+from pyaspparsing.codegen.codegen import generate_code
+from pyaspparsing.codegen.linker import Linker
+
+
+@pytest.fixture
+def site_linker(tmp_path: Path) -> Linker:
+    (tmp_path / "site").mkdir()
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "inc" / "config.asp").write_text("<% Dim counter\ncounter = 1 %>")
+    for idx in range(5):
+        (tmp_path / "site" / f"page{idx}.asp").write_text(
+            '<!-- #include virtual="/inc/config.asp" -->\n'
+            f"<p><%=counter + {idx}%></p>"
+        )
+    (tmp_path / "site" / "broken.asp").write_text("<% If x Then %>")
+    (tmp_path / "site" / "style.css").write_text("p {}")
+    lnk = Linker()
+    lnk.register_dir("site", tmp_path / "site")
+    lnk.register_dir("inc", tmp_path / "inc")
+    return lnk
+
+
+def test_discover_pages(site_linker: Linker):
+    assert discover_pages(site_linker) == [Path("/site/broken.asp")] + [
+        Path(f"/site/page{idx}.asp") for idx in range(5)
+    ] + [Path("/inc/config.asp")]
+
+
+def test_generate_page(site_linker: Linker):
+    result = generate_page(site_linker, Path("/site/page3.asp"))
+    assert result.status == PageStatus.OK
+    cg_state = generate_code(
+        (site_linker.physical_path(Path("/site/page3.asp"))).read_text(),
+        site_linker,
+        file_path=Path("/site/page3.asp"),
+    )
+    assert result.script == cg_state.script_file.getvalue()
+    assert result.template == cg_state.template_file.getvalue()
+    result = generate_page(site_linker, Path("/site/broken.asp"))
+    assert result.status == PageStatus.FAILED
+    assert result.error is not None
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_batch_driver(site_linker: Linker, ordered: bool):
+    driver = BatchDriver(site_linker, max_workers=2, chunk_size=2, max_pending=2)
+    pages = discover_pages(site_linker)
+    results = list(driver.run(pages, ordered=ordered))
+    if ordered:
+        assert [result.file_path for result in results] == pages
+    else:
+        assert {result.file_path for result in results} == set(pages)
+    results_by_path = {result.file_path: result for result in results}
+    assert (
+        results_by_path[Path("/site/page2.asp")].template
+        == generate_page(site_linker, Path("/site/page2.asp")).template
+    )
+    assert driver.summary.total == len(pages)
+    assert driver.summary.failed == 1
+    assert driver.summary.failed_pages == [Path("/site/broken.asp")]
+    assert driver.summary.succeeded == len(pages) - 1
+
+
+def _crash_chunk(chunk: list[Path], timeout):
+    if Path("/site/broken.asp") in chunk:
+        os._exit(1)
+    return _run_chunk(chunk, timeout)
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_batch_driver_worker_crash(
+    site_linker: Linker, monkeypatch: pytest.MonkeyPatch, ordered: bool
+):
+    monkeypatch.setattr("pyaspparsing.codegen.batch._run_chunk", _crash_chunk)
+    driver = BatchDriver(site_linker, max_workers=1, chunk_size=2, max_pending=1)
+    pages = discover_pages(site_linker)
+    results = list(driver.run(pages, ordered=ordered))
+    assert sorted(result.file_path for result in results) == sorted(pages)
+    crashed = [result for result in results if result.status == PageStatus.FAILED]
+    assert Path("/site/broken.asp") in [result.file_path for result in crashed]
+    assert all(result.error.startswith("BrokenProcessPool") for result in crashed)
+    assert driver.summary.total == len(pages)
+    assert driver.summary.failed == len(crashed)
+
+
+def test_page_timeout():
+    with pytest.raises(TimeoutError):
+        with _page_timeout(0.05):
+            time.sleep(5)
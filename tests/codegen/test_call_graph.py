@@ -0,0 +1,88 @@
+from io import StringIO
+from pyaspparsing.ast.ast_types import LeftExpr
+from pyaspparsing.codegen.codegen import generate_code
+from pyaspparsing.codegen.linker import Linker
+
+call_graph_code = """<%
+Dim total, conn
+Function IsEven(n)
+    If n = 0 Then
+        IsEven = True
+    Else
+        IsEven = IsOdd(n - 1)
+    End If
+End Function
+Function IsOdd(n)
+    If n = 0 Then
+        IsOdd = False
+    Else
+        IsOdd = IsEven(n - 1)
+    End If
+End Function
+Function Fact(n)
+    Fact = n * Fact(n - 1)
+End Function
+Function Twice(x)
+    Twice = x & x
+End Function
+Sub WriteLog(msg)
+    Response.Write msg
+    total = total + 1
+End Sub
+Sub Connect()
+    Set conn = Server.CreateObject("ADODB.Connection")
+End Sub
+Dim a, b
+a = IsEven(4)
+b = Twice("x")
+Fact 3
+WriteLog "hi"
+%>"""
+
+
+def test_call_graph():
+    cg_state = generate_code(call_graph_code, Linker(), False, StringIO())
+    call_graph = cg_state.call_graph
+    assert call_graph is not None
+    summaries = call_graph.summaries
+    assert summaries["iseven"].calls == {"isodd"}
+    assert summaries["iseven"].recursive and summaries["isodd"].recursive
+    assert summaries["fact"].recursive
+    assert not summaries["twice"].recursive and summaries["twice"].pure
+    assert summaries["writelog"].writes_response
+    assert summaries["writelog"].globals_read == {"total"}
+    assert summaries["writelog"].globals_written == {"total"}
+    assert not summaries["writelog"].pure
+    assert summaries["connect"].database_calls
+    assert summaries["connect"].globals_written == {"conn"}
+    assert call_graph.globals_written("writelog") == {"total"}
+    assert call_graph.globals_written("iseven") == frozenset()
+    # mutually recursive functions form one component, after their callees
+    components = call_graph.components()
+    assert {"iseven", "isodd"} in components
+    assert call_graph.should_inline("twice")
+    assert call_graph.should_inline("writelog")
+    assert not call_graph.should_inline("iseven")
+    assert not call_graph.should_inline("fact")
+
+    script = cg_state.script_file.getvalue()
+    assert "fact(...); // sub call (not inlined)" not in script
+    assert "fact(...); // function call (not inlined)" in script
+    assert "writelog(...) {" in script
+    # recursive function is emitted as a call, its value is the call expression
+    a_sym = cg_state.sym_table.resolve_symbol(LeftExpr("a"))[-1].symbol
+    assert isinstance(a_sym.value, LeftExpr) and a_sym.value.sym_name == "iseven"
+
+
+def test_call_graph_inline_size():
+    cg_state = generate_code(
+        call_graph_code.replace(
+            "Sub WriteLog(msg)", "Sub WriteLog(msg)\n" + "    total = 1\n" * 40
+        ),
+        Linker(),
+        False,
+        StringIO(),
+    )
+    assert cg_state.call_graph.summaries["writelog"].inline_size == 42
+    assert not cg_state.call_graph.should_inline("writelog")
+    assert "writelog(...); // sub call (not inlined)" in cg_state.script_file.getvalue()
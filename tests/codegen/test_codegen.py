@@ -1,5 +1,388 @@
-from pyaspparsing.codegen.codegen import generate_code
+from io import StringIO
+from pathlib import Path
+import pytest
+from pyaspparsing.ast.ast_types import LeftExpr, IncludeFile, IncludeType
+from pyaspparsing.codegen.codegen import generate_code, create_snapshot
+from pyaspparsing.codegen.linker import Linker
+from pyaspparsing.codegen.generators.codegen_state import CallMemo
+from pyaspparsing.codegen.generators.codegen_reg import codegen_global_stmt
+from pyaspparsing.codegen.generators.handlers.statements import (
+    BranchingExpr,
+    RuntimeValueExpr,
+)
+from pyaspparsing.codegen.scope import TRANSIENT_SCOPE_TYPES
 
 
 def test_codegen():
     return
+
+
+@pytest.fixture
+def prefix_linker(tmp_path: Path) -> Linker:
+    (tmp_path / "config.asp").write_text("""<%
+Dim counter
+counter = 1
+Function Greet(name)
+    Greet = "Hello, " & name
+End Function
+Sub Bump()
+    counter = counter + 1
+End Sub
+%>""")
+    lnk = Linker()
+    lnk.register_dir("inc", tmp_path)
+    return lnk
+
+
+prefix_code = '<!-- #include virtual="/inc/config.asp" -->\n'
+
+
+def test_codegen_include_file_relative(prefix_linker: Linker, tmp_path: Path):
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "util.asp").write_text(
+        '<% Dim util %><!-- #include file="inner.asp" -->'
+    )
+    (tmp_path / "lib" / "inner.asp").write_text("<% Dim inner %>")
+    cg_state = generate_code(
+        "<% Dim page %>",
+        prefix_linker,
+        False,
+        StringIO(),
+        file_path=Path("/inc/page.asp"),
+    )
+    # file= includes are resolved relative to the including file
+    codegen_global_stmt(
+        IncludeFile(IncludeType.INCLUDE_FILE, '"lib/util.asp"'), cg_state
+    )
+    curr_env = cg_state.scope_mgr.current_environment
+    assert cg_state.sym_table.nearest_symbol("util", curr_env) is not None
+    assert cg_state.sym_table.nearest_symbol("inner", curr_env) is not None
+    assert cg_state.file_path == Path("/inc/page.asp")
+
+
+@pytest.mark.parametrize(
+    "codeblock",
+    [
+        prefix_code + '<% Bump() %><p><%=Greet("a") & counter%></p>',
+        prefix_code + "<% counter = 5 %><p><%=counter%></p>",
+        "<p>does not share the prefix</p>",
+    ],
+)
+def test_codegen_snapshot(prefix_linker: Linker, codeblock: str):
+    snapshot = create_snapshot(prefix_code, prefix_linker)
+    assert snapshot.prefix_len == 1
+    cg_state = generate_code(codeblock, prefix_linker)
+    cg_forked = generate_code(codeblock, prefix_linker, snapshot=snapshot)
+    assert cg_forked.script_file.getvalue() == cg_state.script_file.getvalue()
+    assert cg_forked.template_file.getvalue() == cg_state.template_file.getvalue()
+    assert repr(cg_forked.output_exprs) == repr(cg_state.output_exprs)
+
+
+def test_codegen_snapshot_isolated(prefix_linker: Linker):
+    snapshot = create_snapshot(prefix_code, prefix_linker)
+    generate_code(prefix_code + "<% counter = 5 %>", prefix_linker, snapshot=snapshot)
+    # assignment in the first page must not leak into the second page
+    cg_state = generate_code(
+        prefix_code + "<p><%=counter%></p>", prefix_linker, snapshot=snapshot
+    )
+    assert cg_state.template_file.getvalue().endswith("<p>1</p>")
+
+
+def test_codegen_snapshot_include_changed(prefix_linker: Linker, tmp_path: Path):
+    snapshot = create_snapshot(prefix_code, prefix_linker)
+    (tmp_path / "config.asp").write_text("""<%
+Dim counter
+counter = 20
+%>""")
+    # the snapshot was created from the old include
+    cg_state = generate_code(
+        prefix_code + "<p><%=counter%></p>", prefix_linker, snapshot=snapshot
+    )
+    assert cg_state.template_file.getvalue().endswith("<p>20</p>")
+
+
+memo_code = """<%
+Dim total
+total = 3
+Function Fmt(x)
+    Dim y
+    y = "[" & x & "]"
+    Fmt = y & total
+End Function
+Sub Note(msg)
+    Dim z
+    z = msg
+End Sub
+Dim a, b, c
+a = Fmt(1)
+b = Fmt(1)
+c = Fmt(2)
+Note "hi"
+Note "hi"
+total = 4
+a = Fmt(1)
+%><p><%=a & b & c%></p>"""
+
+
+def test_codegen_call_memo(monkeypatch: pytest.MonkeyPatch):
+    cg_state = generate_code(memo_code, Linker(), False, StringIO())
+    # second Fmt(1) and Note "hi" are replayed,
+    # Fmt(1) after the assignment to total is generated again
+    assert (cg_state.call_memo.hits, cg_state.call_memo.misses) == (2, 4)
+
+    monkeypatch.setattr(CallMemo, "get", lambda self, key: None)
+    no_memo = generate_code(memo_code, Linker(), False, StringIO())
+    assert cg_state.script_file.getvalue() == no_memo.script_file.getvalue()
+    assert cg_state.scope_mgr.num_scopes == no_memo.scope_mgr.num_scopes
+    for name in ("a", "b", "c"):
+        assert repr(
+            cg_state.sym_table.resolve_symbol(LeftExpr(name))[-1].symbol.value
+        ) == repr(no_memo.sym_table.resolve_symbol(LeftExpr(name))[-1].symbol.value)
+
+
+def test_codegen_call_not_inlined():
+    cg_state = generate_code(
+        """<%
+Dim total, s, t
+total = 1
+s = 0
+t = 0
+Sub Countdown(n)
+    If n > 0 Then
+        total = total + n
+        Countdown n - 1
+    End If
+End Sub
+Sub AddTo(ByRef acc, n)
+    If n > 0 Then
+        acc = acc + n
+        AddTo acc, n - 1
+    End If
+End Sub
+Countdown 3
+AddTo s, 2
+%><p><%=total%></p><p><%=t%></p>""",
+        Linker(),
+        False,
+        StringIO(),
+    )
+    # recursive subs are not inlined, the globals and ByRef arguments
+    # that they assign to are only known at runtime
+    assert "<p>1</p>" not in cg_state.template_file.getvalue()
+    assert cg_state.template_file.getvalue().endswith("<p>0</p>")
+    curr_env = cg_state.scope_mgr.current_environment
+    for name in ("total", "s"):
+        assert isinstance(
+            cg_state.sym_table.nearest_symbol(name, curr_env).symbol.value,
+            RuntimeValueExpr,
+        )
+
+
+def test_codegen_if_branches_start_from_same_symbols():
+    cg_state = generate_code(
+        """<%
+Dim arr(2), x, y, b
+arr(0) = 1
+If x Then
+    arr(0) = 2
+ElseIf y Then
+    b = arr(0)
+End If
+%>""",
+        Linker(),
+        False,
+        StringIO(),
+    )
+    curr_env = cg_state.scope_mgr.current_environment
+    # the ElseIf branch doesn't see the assignment of the If branch
+    b_val = cg_state.sym_table.resolve_symbol(LeftExpr("b"), curr_env)[-1].symbol.value
+    assert isinstance(b_val, BranchingExpr)
+    assert [branch.expr_value for branch in b_val.branches] == [1]
+    arr_sym = cg_state.sym_table.resolve_symbol(LeftExpr("arr"), curr_env)[-1].symbol
+    assert arr_sym.array_data[(0,)].expr_value == 2
+
+
+def test_codegen_for_bulk_array_assign():
+    cg_state = generate_code(
+        """<%
+Dim arr(10), other(5)
+For i = 1 To 3
+    arr(i) = 1
+    arr(i + 1) = 2
+    other(i) = i * 2
+Next
+%>""",
+        Linker(),
+        False,
+        StringIO(),
+    )
+    curr_env = cg_state.scope_mgr.current_environment
+    arr_sym = cg_state.sym_table.resolve_symbol(LeftExpr("arr"), curr_env)[-1].symbol
+    # stores of an iteration run before the next iteration
+    assert {idx: val.expr_value for idx, val in arr_sym.array_data.items()} == {
+        (1,): 1,
+        (2,): 1,
+        (3,): 1,
+        (4,): 2,
+    }
+    other_sym = cg_state.sym_table.nearest_symbol("other", curr_env).symbol
+    assert [other_sym.array_data[(idx,)].expr_value for idx in range(1, 4)] == [
+        2,
+        4,
+        6,
+    ]
+
+
+def test_codegen_for_bulk_array_barrier():
+    cg_state = generate_code(
+        """<%
+Dim arr(3), other(3)
+Sub Fill(n)
+    arr(n) = "sub"
+End Sub
+Sub Show(n)
+    Response.Write n
+End Sub
+For i = 1 To 5
+    arr(i) = "loop"
+    Fill i - 1
+    other(i) = i
+    Show i
+Next
+other(4) = 0
+%>""",
+        Linker(),
+        False,
+        StringIO(),
+    )
+    curr_env = cg_state.scope_mgr.current_environment
+    # Fill writes arr, the loop is not evaluated in bulk
+    arr_sym = cg_state.sym_table.nearest_symbol("arr", curr_env).symbol
+    assert len(arr_sym.array_data) == 0
+    assert "Assign to arr(...)\n" in cg_state.script_file.getvalue()
+    # Show doesn't write other, out-of-range indices are reported
+    other_sym = cg_state.sym_table.nearest_symbol("other", curr_env).symbol
+    assert sorted(other_sym.array_data) == [(1,), (2,), (3,)]
+    assert (
+        "Assign to other(...) // 3 elements from 5 iterations evaluated"
+        in cg_state.script_file.getvalue()
+    )
+    assert (
+        "Skipped assignment to other(...) (subscript out of range) in 2 iterations"
+        in cg_state.error_file.getvalue()
+    )
+    assert (
+        "Skipped assignment to other(...) (subscript out of range)\n"
+        in cg_state.error_file.getvalue()
+    )
+
+
+def test_codegen_redim():
+    cg_state = generate_code(
+        """<%
+Dim arr(), n, grid(), fixed(10)
+n = 3
+ReDim arr(n)
+arr(0) = "a"
+arr(3) = "b"
+ReDim Preserve arr(1)
+ReDim grid(2, 3)
+ReDim Preserve grid(2, 5)
+grid(2, 5) = 1
+ReDim Preserve grid(3, 5)
+ReDim other(2)
+ReDim Preserve other(4)
+fixed(1) = 1
+ReDim fixed(20)
+%><%=arr(0)%>""",
+        Linker(),
+        False,
+        StringIO(),
+    )
+    curr_env = cg_state.scope_mgr.current_environment
+    arr_sym = cg_state.sym_table.resolve_symbol(LeftExpr("arr"), curr_env)[-1].symbol
+    assert arr_sym.rank_list == [1] and list(arr_sym.array_data) == [(0,)]
+    # only the last dimension can be changed by ReDim Preserve
+    grid_sym = cg_state.sym_table.resolve_symbol(LeftExpr("grid"), curr_env)[-1].symbol
+    assert grid_sym.rank_list == [2, 5] and list(grid_sym.array_data) == [(2, 5)]
+    # implicitly declared by ReDim
+    other_sym = cg_state.sym_table.nearest_symbol("other", curr_env).symbol
+    assert other_sym.rank_list == [4]
+    # arrays declared with bounds can't be resized
+    fixed_sym = cg_state.sym_table.nearest_symbol("fixed", curr_env).symbol
+    assert fixed_sym.rank_list == [10] and list(fixed_sym.array_data) == [(1,)]
+    assert cg_state.template_file.getvalue().endswith("a")
+
+
+gc_code = """<%
+Function Twice(x)
+    Twice = x * 2
+End Function
+Dim a, b
+a = Twice(2)
+If a > 3 Then
+    b = Twice(a)
+Else
+    b = 0
+End If
+%><p><%=b%></p>"""
+
+
+def test_codegen_collect_scopes():
+    cg_state = generate_code(gc_code, Linker(), False, StringIO())
+    retained = generate_code(gc_code, Linker(), False, StringIO(), retain_scopes=True)
+    assert cg_state.script_file.getvalue() == retained.script_file.getvalue()
+    assert cg_state.scope_mgr.num_scopes == retained.scope_mgr.num_scopes
+
+    # every call and If scope is gone, the function definition is kept
+    assert cg_state.collected_scopes > 0 and cg_state.scope_mgr.exited == []
+    assert retained.collected_scopes == 0
+    assert set(retained.sym_table.sym_scopes) - set(cg_state.sym_table.sym_scopes)
+    for scope_id in cg_state.sym_table.sym_scopes:
+        assert cg_state.scope_mgr.scope_type(scope_id) not in TRANSIENT_SCOPE_TYPES
+    assert (
+        cg_state.sym_table.resolve_symbol(LeftExpr("twice"))[-1].symbol.func_scope_id
+        in cg_state.sym_table.sym_scopes
+    )
+    # branch scopes no longer define b, only the script scope does
+    assert len(cg_state.sym_table.resolve_symbol(LeftExpr("b"))) == 1
+    assert repr(
+        cg_state.sym_table.resolve_symbol(LeftExpr("b"))[-1].symbol.value
+    ) == repr(
+        retained.sym_table.resolve_symbol(
+            LeftExpr("b"), retained.scope_mgr.current_environment
+        )[-1].symbol.value
+    )
+
+
+dead_code = """<%
+Dim a, b
+Dim unused
+a = 1
+a = 2
+b = a + 1
+a = 3
+b = 4
+%><p><%=b%></p><%
+a = 5
+%>"""
+
+
+def test_codegen_dead_code():
+    cg_state = generate_code(
+        dead_code, Linker(), False, StringIO(), eliminate_dead_code=True
+    )
+    kept = generate_code(dead_code, Linker(), False, StringIO())
+    # values are the same, only the generated script changes
+    assert cg_state.template_file.getvalue() == kept.template_file.getvalue()
+    assert kept.script_file.getvalue().count("Assign to") == 6
+    assert cg_state.script_file.getvalue().count("Assign to a") == 1
+    assert cg_state.script_file.getvalue().count("Assign to b") == 1
+    assert cg_state.script_file.getvalue().count("Variable declaration") == 1
+    assert sorted(cg_state.dead_code.dead_code.values()) == [
+        "Removed dead store to a",
+        "Removed dead store to a",
+        "Removed dead store to a",
+        "Removed dead store to b",
+        "Removed unused variable declaration (unused)",
+    ]
@@ -0,0 +1,106 @@
+from pathlib import Path
+import pytest
+from pyaspparsing import LinkerError
+from pyaspparsing.ast.ast_types import IncludeType
+from pyaspparsing.codegen.linker import Linker
+from pyaspparsing.codegen.include_graph import (
+    scan_includes,
+    IncludeGraph,
+)
+
+
+def test_scan_includes():
+    assert (
+        scan_includes("""<!-- #include virtual="/inc/header.asp" -->
+<!-- just a comment -->
+<% Response.Write "text" %>
+<!-- #include file="lib/util.asp" -->""")
+        == [
+            (IncludeType.INCLUDE_VIRTUAL, "/inc/header.asp"),
+            (IncludeType.INCLUDE_FILE, "lib/util.asp"),
+        ]
+    )
+
+
+@pytest.fixture
+def site_linker(tmp_path: Path) -> Linker:
+    (tmp_path / "site").mkdir()
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "site" / "index.asp").write_text(
+        '<!-- #include virtual="/inc/header.asp" -->\n<p>index</p>'
+    )
+    (tmp_path / "site" / "about.asp").write_text(
+        '<!-- #include file="common.asp" -->\n<p>about</p>'
+    )
+    (tmp_path / "site" / "common.asp").write_text(
+        '<!-- #include virtual="/inc/header.asp" -->\n'
+        '<!-- #include virtual="/inc/missing.asp" -->'
+    )
+    (tmp_path / "inc" / "header.asp").write_text("<% Dim title %>")
+    lnk = Linker()
+    lnk.register_dir("site", tmp_path / "site")
+    lnk.register_dir("inc", tmp_path / "inc")
+    return lnk
+
+
+def test_include_graph(site_linker: Linker):
+    inc_graph = IncludeGraph(site_linker)
+    inc_graph.build()
+    inc_graph.assert_acyclic()
+    assert inc_graph.graph.nodes[Path("/inc/missing.asp")]["exists"] is False
+    assert inc_graph.dependents(Path("/inc/header.asp")) == {
+        Path("/site/index.asp"),
+        Path("/site/about.asp"),
+        Path("/site/common.asp"),
+    }
+    # pages that other pages include are rebuilt too
+    assert inc_graph.pages_to_rebuild(Path("/inc/header.asp")) == {
+        Path("/inc/header.asp"),
+        Path("/site/index.asp"),
+        Path("/site/about.asp"),
+        Path("/site/common.asp"),
+    }
+    assert inc_graph.pages_to_rebuild(Path("/site/index.asp")) == {
+        Path("/site/index.asp")
+    }
+    assert inc_graph.pages_to_rebuild(Path("/inc/unknown.asp")) == set()
+
+
+def test_include_graph_cycle(site_linker: Linker, tmp_path: Path):
+    (tmp_path / "inc" / "header.asp").write_text(
+        '<!-- #include virtual="/site/common.asp" -->'
+    )
+    inc_graph = IncludeGraph(site_linker)
+    inc_graph.build()
+    assert len(inc_graph.cycles()) == 1
+    with pytest.raises(LinkerError):
+        inc_graph.assert_acyclic()
+    # every page in the cycle includes the changed file
+    assert inc_graph.pages_to_rebuild(Path("/inc/header.asp")) == {
+        Path("/inc/header.asp"),
+        Path("/site/index.asp"),
+        Path("/site/about.asp"),
+        Path("/site/common.asp"),
+    }
+
+
+def test_include_graph_update(site_linker: Linker, tmp_path: Path):
+    inc_graph = IncludeGraph(site_linker)
+    inc_graph.build()
+    (tmp_path / "site" / "about.asp").write_text(
+        '<!-- #include virtual="/inc/footer.asp" -->\n<p>about</p>'
+    )
+    (tmp_path / "inc" / "footer.asp").write_text("<% Dim year %>")
+    # graph is not rescanned until the file is updated
+    assert Path("/site/about.asp") in inc_graph.dependents(Path("/site/common.asp"))
+    inc_graph.update(Path("/site/about.asp"))
+    assert inc_graph.dependents(Path("/site/common.asp")) == set()
+    assert inc_graph.pages_to_rebuild(Path("/inc/footer.asp")) == {
+        Path("/site/about.asp")
+    }
+    assert inc_graph.graph.nodes[Path("/inc/footer.asp")]["exists"] is True
+    assert inc_graph.graph.nodes[Path("/site/about.asp")]["page"] is True
+    # removed file has no includes
+    (tmp_path / "inc" / "footer.asp").unlink()
+    inc_graph.update(Path("/inc/footer.asp"))
+    assert inc_graph.graph.nodes[Path("/inc/footer.asp")]["exists"] is False
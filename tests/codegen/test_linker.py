@@ -1,5 +1,296 @@
+import asyncio
+from concurrent.futures import (
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+)
+from pathlib import Path
+from typing import Optional
+import pytest
+from pyaspparsing import LinkerError
+from pyaspparsing.ast.ast_types import *
+from pyaspparsing.codegen import virtual_dir
 from pyaspparsing.codegen.linker import *
+from pyaspparsing.ast.tokenizer.state_machine import Tokenizer
 
 
 def test_linker():
     lnk = Linker()
+
+
+@pytest.fixture
+def file_include_linker(tmp_path: Path) -> Linker:
+    (tmp_path / "site" / "sub").mkdir(parents=True)
+    (tmp_path / "shared").mkdir()
+    (tmp_path / "site" / "sub" / "page.asp").write_text(
+        '<!-- #include file="..\\lib.asp" -->'
+    )
+    (tmp_path / "site" / "lib.asp").write_text(
+        '<% Dim lib %><!-- #include file="../shared/util.asp" -->'
+    )
+    (tmp_path / "shared" / "util.asp").write_text("<% Dim util %>")
+    lnk = Linker()
+    lnk.register_dir("site", tmp_path / "site")
+    lnk.register_dir("shared", tmp_path / "shared")
+    return lnk
+
+
+@pytest.mark.parametrize(
+    "includer,inc_type,inc_path,exp_path",
+    [
+        (None, IncludeType.INCLUDE_VIRTUAL, "/site/x/../lib.asp", "/site/lib.asp"),
+        (None, IncludeType.INCLUDE_FILE, "lib.asp", None),
+        (
+            "/site/sub/page.asp",
+            IncludeType.INCLUDE_FILE,
+            "..\\lib.asp",
+            "/site/lib.asp",
+        ),
+        # physical path is mapped back to another virtual directory
+        ("/site/lib.asp", IncludeType.INCLUDE_FILE, "../shared/a.asp", "/shared/a.asp"),
+        # outside of every virtual directory
+        ("/site/lib.asp", IncludeType.INCLUDE_FILE, "../../a.asp", None),
+    ],
+)
+def test_resolve_include(
+    file_include_linker: Linker, includer, inc_type, inc_path, exp_path
+):
+    assert file_include_linker.resolve_include(
+        None if includer is None else Path(includer), inc_type, inc_path
+    ) == (None if exp_path is None else Path(exp_path))
+
+
+def test_linker_file_include(file_include_linker: Linker):
+    lib_prog = file_include_linker.request(Path("/site/lib.asp"))
+    # file= include was rewritten relative to the virtual directory
+    assert lib_prog.global_stmt_list[-1] == IncludeFile(
+        IncludeType.INCLUDE_VIRTUAL, '"/shared/util.asp"'
+    )
+    # same physical file is only parsed once
+    assert file_include_linker.request(Path("/site/sub/../lib.asp")) is lib_prog
+    # program cached by the virtual directory is not modified
+    cached_prog = file_include_linker.virtual_dirs["site"].request(
+        Path("/site/lib.asp")
+    )
+    assert cached_prog.global_stmt_list[-1].include_type == IncludeType.INCLUDE_FILE
+
+    with Tokenizer('<!-- #include file="..\\lib.asp" -->', False) as tkzr:
+        linked = list(
+            generate_linked_program(
+                tkzr, file_include_linker, Path("/site/sub/page.asp")
+            )
+        )
+    # nested include is expanded at link time
+    util_prog = file_include_linker.request(Path("/shared/util.asp"))
+    assert linked == lib_prog.global_stmt_list[:-1] + util_prog.global_stmt_list
+
+
+@pytest.mark.parametrize("pool_type", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_linker_prefetch(file_include_linker: Linker, pool_type):
+    page_code = '<!-- #include file="..\\lib.asp" -->'
+    with Tokenizer(page_code, False) as tkzr:
+        expected = list(
+            generate_linked_program(
+                tkzr, file_include_linker, Path("/site/sub/page.asp")
+            )
+        )
+    for vdir in file_include_linker.virtual_dirs.values():
+        vdir.clear()
+
+    with pool_type(max_workers=2) as pool:
+        file_include_linker.executor = pool
+        file_include_linker.prefetch_includes(page_code, Path("/site/sub/page.asp"))
+        site_dir = file_include_linker.virtual_dirs["site"]
+        prefetched = site_dir.prefetch(Path("/site/lib.asp"), pool)
+        assert prefetched is not None
+        # nested include is submitted once the including file has been parsed
+        prefetched.result()
+        with Tokenizer(page_code, False) as tkzr:
+            linked = list(
+                generate_linked_program(
+                    tkzr, file_include_linker, Path("/site/sub/page.asp")
+                )
+            )
+        # requested files have been taken from the prefetch queue
+        assert len(site_dir._prefetched) == 0
+        # cached files are not submitted again
+        assert site_dir.prefetch(Path("/site/lib.asp"), pool) is None
+    file_include_linker.executor = None
+    assert repr(linked) == repr(expected)
+
+
+class InlineExecutor(Executor):
+    """Runs each task as soon as it is submitted, so every future is already done"""
+
+    def __init__(self):
+        self.num_submitted = 0
+        self.error: Optional[RuntimeError] = None
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self.error is not None:
+            raise self.error
+        self.num_submitted += 1
+        fut = Future()
+        fut.set_result(fn(*args, **kwargs))
+        return fut
+
+
+def test_linker_prefetch_cycle(tmp_path: Path):
+    (tmp_path / "a.asp").write_text('<!-- #include virtual="/inc/b.asp" -->')
+    (tmp_path / "b.asp").write_text('<!-- #include virtual="/inc/a.asp" -->')
+    lnk = Linker()
+    lnk.register_dir("inc", tmp_path)
+    lnk.executor = InlineExecutor()
+    lnk.prefetch(Path("/inc/a.asp"))
+    assert lnk.executor.num_submitted == 2
+    # futures are done, prefetching again must not follow the cycle
+    lnk.prefetch(Path("/inc/a.asp"))
+    lnk.prefetch(Path("/inc/b.asp"))
+    assert lnk.executor.num_submitted == 2
+    lnk.virtual_dirs["inc"].clear()
+    # executor has been shut down, files are parsed on request instead
+    lnk.executor.error = RuntimeError("cannot schedule new futures after shutdown")
+    lnk.prefetch(Path("/inc/a.asp"))
+    # other errors are not hidden
+    lnk.executor.error = RuntimeError("unexpected")
+    with pytest.raises(RuntimeError):
+        lnk.prefetch(Path("/inc/a.asp"))
+    lnk.executor = None
+
+
+@pytest.fixture
+def nested_include_linker(tmp_path: Path) -> Linker:
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "inc" / "a.asp").write_text(
+        '<% Dim a %><!-- #include virtual="/inc/common.asp" -->'
+    )
+    (tmp_path / "inc" / "b.asp").write_text(
+        '<!-- #include virtual="/inc/common.asp" --><% Dim b %>'
+    )
+    (tmp_path / "inc" / "common.asp").write_text("<% Dim common %>")
+    lnk = Linker()
+    lnk.register_dir("inc", tmp_path / "inc")
+    return lnk
+
+
+def _link_names(code: str, lnk: Linker) -> list[str]:
+    with Tokenizer(code, False) as tkzr:
+        return [
+            stmt.var_name[0].extended_id.id_code
+            for stmt in generate_linked_program(tkzr, lnk)
+            if isinstance(stmt, VarDecl)
+        ]
+
+
+@pytest.mark.parametrize(
+    "include_once,exp_names",
+    [
+        (False, ["a", "common", "common", "b", "common"]),
+        (True, ["a", "common", "b"]),
+    ],
+)
+def test_linker_include_once(
+    nested_include_linker: Linker, include_once: bool, exp_names: list[str]
+):
+    nested_include_linker.include_once = include_once
+    assert (
+        _link_names(
+            '<!-- #include virtual="/inc/a.asp" -->'
+            '<!-- #include virtual="/inc/b.asp" -->'
+            '<!-- #include virtual="/inc/common.asp" -->',
+            nested_include_linker,
+        )
+        == exp_names
+    )
+
+
+def test_linker_expand_cache(nested_include_linker: Linker, tmp_path: Path):
+    expanded = nested_include_linker.expand_include(Path("/inc/a.asp"))
+    assert expanded.occurrences == [Path("/inc/a.asp"), Path("/inc/common.asp")]
+    assert nested_include_linker.expand_include(Path("/inc/a.asp")) is expanded
+    # changing a nested include invalidates the expansion
+    (tmp_path / "inc" / "common.asp").write_text("<% Dim changed, more %>")
+    assert nested_include_linker.expand_include(Path("/inc/a.asp")) is not expanded
+    assert _link_names(
+        '<!-- #include virtual="/inc/a.asp" -->', nested_include_linker
+    ) == [
+        "a",
+        "changed",
+    ]
+
+
+def test_linker_include_cycle(nested_include_linker: Linker, tmp_path: Path):
+    (tmp_path / "inc" / "common.asp").write_text(
+        '<!-- #include virtual="/inc/a.asp" -->'
+    )
+    with pytest.raises(LinkerError):
+        nested_include_linker.expand_include(Path("/inc/a.asp"))
+
+
+def test_linker_async(nested_include_linker: Linker):
+    page_code = (
+        '<!-- #include virtual="/inc/a.asp" -->'
+        '<!-- #include virtual="/inc/b.asp" --><% Dim page %>'
+    )
+    with Tokenizer(page_code, False) as tkzr:
+        expected = repr(list(generate_linked_program(tkzr, nested_include_linker)))
+    for vdir in nested_include_linker.virtual_dirs.values():
+        vdir.clear()
+
+    async def link_page() -> list[GlobalStmt]:
+        return [
+            stmt
+            async for stmt in generate_linked_program_async(
+                page_code, nested_include_linker
+            )
+        ]
+
+    assert repr(asyncio.run(link_page())) == expected
+
+
+def test_linker_expand_async(
+    nested_include_linker: Linker, monkeypatch: pytest.MonkeyPatch
+):
+    on_loop: list[Path] = []
+    request = Linker.request
+
+    def recording_request(self, file_path: Path):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(file_path)
+        except RuntimeError:
+            pass
+        return request(self, file_path)
+
+    monkeypatch.setattr(Linker, "request", recording_request)
+    expanded = asyncio.run(
+        nested_include_linker.expand_include_async(Path("/inc/a.asp"))
+    )
+    assert expanded.occurrences == [Path("/inc/a.asp"), Path("/inc/common.asp")]
+    # blocking requests never run on the event loop
+    assert on_loop == []
+
+
+def test_linker_async_coalesce(
+    nested_include_linker: Linker, monkeypatch: pytest.MonkeyPatch
+):
+    num_parsed = 0
+    parse_source = virtual_dir.parse_source
+
+    def counting_parse(codeblock: str, *args):
+        nonlocal num_parsed
+        num_parsed += 1
+        return parse_source(codeblock, *args)
+
+    monkeypatch.setattr(virtual_dir, "parse_source", counting_parse)
+
+    async def request_many():
+        return await asyncio.gather(
+            *(nested_include_linker.request_async(Path("/inc/a.asp")) for _ in range(8))
+        )
+
+    progs = asyncio.run(request_many())
+    assert num_parsed == 1
+    assert all(prog is progs[0] for prog in progs)
+    assert nested_include_linker.request(Path("/inc/a.asp")) is progs[0]
@@ -0,0 +1,49 @@
+import networkx as nx
+from pyaspparsing.codegen.scope import ScopeManager, ScopeType
+
+
+def test_scope_environment():
+    scope_mgr = ScopeManager()
+    scope_mgr.enter_scope(ScopeType.SCOPE_SCRIPT_USER)
+    with scope_mgr.temporary_scope(ScopeType.SCOPE_IF):
+        with scope_mgr.temporary_scope(ScopeType.SCOPE_IF_BRANCH):
+            assert scope_mgr.current_environment == (0, 1, 2, 3)
+        with scope_mgr.temporary_scope(ScopeType.SCOPE_IF_BRANCH):
+            # siblings share the environment of their parent
+            assert scope_mgr.current_environment == (0, 1, 2, 4)
+    assert scope_mgr.current_environment == (0, 1)
+    assert scope_mgr.get_scope_environment(4) == (0, 1, 2, 4)
+    assert scope_mgr.scope_type(4) == ScopeType.SCOPE_IF_BRANCH
+    assert scope_mgr.parent_scope(4) == 2
+    assert scope_mgr.parent_scope(0) is None
+    assert scope_mgr.is_ancestor(2, 4)
+    assert scope_mgr.is_ancestor(4, 4)
+    assert not scope_mgr.is_ancestor(3, 4)
+    assert not scope_mgr.is_ancestor(4, 2)
+    assert scope_mgr.has_scope(4) and not scope_mgr.has_scope(5)
+
+
+def test_scope_registry():
+    scope_mgr = ScopeManager()
+    with scope_mgr.temporary_scope(ScopeType.SCOPE_SCRIPT_USER):
+        scope_mgr.enter_scope(ScopeType.SCOPE_LOOP)
+    registry = scope_mgr.scope_registry
+    assert list(registry.edges) == [(0, 1), (1, 2)]
+    assert registry.nodes[2]["scope_type"] == ScopeType.SCOPE_LOOP
+    for scope_id in registry:
+        assert tuple(
+            nx.dijkstra_path(registry, 0, scope_id)
+        ) == scope_mgr.get_scope_environment(scope_id)
+    # registry is rebuilt after new scopes are entered
+    scope_mgr.enter_scope(ScopeType.SCOPE_FOR)
+    assert 3 in scope_mgr.scope_registry
+
+
+def test_scope_fork():
+    scope_mgr = ScopeManager()
+    scope_mgr.enter_scope(ScopeType.SCOPE_SCRIPT_USER)
+    forked = scope_mgr.fork()
+    forked.enter_scope(ScopeType.SCOPE_LOOP)
+    scope_mgr.enter_scope(ScopeType.SCOPE_FOR)
+    assert forked.scope_type(2) == ScopeType.SCOPE_LOOP
+    assert scope_mgr.scope_type(2) == ScopeType.SCOPE_FOR
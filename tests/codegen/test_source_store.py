@@ -0,0 +1,68 @@
+from pathlib import Path
+import pytest
+from pyaspparsing.codegen.linker import Linker
+from pyaspparsing.codegen.source_store import *
+
+
+@pytest.mark.parametrize(
+    "codepage,exp_encoding",
+    [(65001, "utf-8"), (1252, "cp1252"), (28591, "iso8859-1"), (1200, "utf-16-le")],
+)
+def test_codepage_to_encoding(codepage: int, exp_encoding: str):
+    assert codepage_to_encoding(codepage) == exp_encoding
+
+
+def test_source_store_codepage(tmp_path: Path):
+    code = '<%@ Language="VBScript" CodePage=1252 %>\n<p>caf\xe9</p>'
+    (tmp_path / "page.asp").write_bytes(code.encode("cp1252"))
+    (tmp_path / "empty.asp").write_bytes(b"")
+    with SourceStore() as store:
+        store.map_all(tmp_path, (".asp",))
+        src_file = store.open(tmp_path / "page.asp")
+        assert src_file.codepage == 1252
+        text, stat = store.read(tmp_path / "page.asp")
+        assert text == code
+        assert stat == (src_file.mtime_ns, src_file.size)
+        # decoded content is cached
+        assert store.read(tmp_path / "page.asp")[0] is text
+        # single-byte code page, offsets are identical
+        assert store.byte_offset(tmp_path / "page.asp", len(code)) == len(code)
+        assert store.read(tmp_path / "empty.asp")[0] == ""
+
+
+def test_source_store_byte_offset(tmp_path: Path):
+    code = "<% Dim x %>\n" + "<p>über ☃</p>\n" * 20
+    (tmp_path / "page.asp").write_text(code, encoding="utf-8")
+    code_bytes = code.encode("utf-8")
+    with SourceStore(max_decoded=0, checkpoint_interval=16) as store:
+        text, _ = store.read(tmp_path / "page.asp")
+        for char_offset in (0, 5, 15, 16, 17, 100, len(text)):
+            assert store.byte_offset(tmp_path / "page.asp", char_offset) == len(
+                text[:char_offset].encode("utf-8")
+            )
+        token_src = slice(text.index("☃"), text.index("☃") + 1)
+        assert (
+            code_bytes[store.byte_slice(tmp_path / "page.asp", token_src)].decode()
+            == "☃"
+        )
+
+
+def test_source_store_remap(tmp_path: Path):
+    (tmp_path / "page.asp").write_text("<% Dim a %>")
+    with SourceStore() as store:
+        assert store.read(tmp_path / "page.asp")[0] == "<% Dim a %>"
+        (tmp_path / "page.asp").write_text("<% Dim abc %>")
+        assert store.read(tmp_path / "page.asp")[0] == "<% Dim abc %>"
+
+
+def test_virtual_dir_source_store(tmp_path: Path):
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "inc" / "lib.asp").write_bytes(
+        '<%@ CodePage=1252 %><% Dim x : x = "caf\xe9" %>'.encode("cp1252")
+    )
+    with SourceStore() as store:
+        lnk = Linker()
+        lnk.register_dir("inc", tmp_path / "inc", source_store=store)
+        prog = lnk.request(Path("/inc/lib.asp"))
+        assert prog is not None
+        assert (tmp_path / "inc" / "lib.asp") in store._files
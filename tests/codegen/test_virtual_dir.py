@@ -1,5 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import threading
+import time
+from pyaspparsing.ast.ast_types import Program
+from pyaspparsing.codegen import virtual_dir
 from pyaspparsing.codegen.virtual_dir import VirtualDirectory
 
 
-def test_virtual_directory():
-    return
+def test_virtual_directory(tmp_path: Path):
+    (tmp_path / "a.asp").write_text("<% Dim a %>")
+    vdir = VirtualDirectory(Path("/inc"), tmp_path)
+    prog = vdir.request(Path("/inc/a.asp"))
+    assert isinstance(prog, Program)
+    assert vdir.request(Path("/inc/a.asp")) is prog
+    assert vdir.cache_bytes > 0
+    # modified file is parsed again
+    (tmp_path / "a.asp").write_text("<% Dim a, b %>")
+    assert vdir.request(Path("/inc/a.asp")) is not prog
+    vdir.invalidate(Path("/inc/a.asp"))
+    assert vdir.cache_bytes == 0
+
+
+def test_virtual_directory_negative_ttl(tmp_path: Path):
+    vdir = VirtualDirectory(Path("/inc"), tmp_path, negative_ttl=60.0)
+    assert vdir.request(Path("/inc/a.asp")) is None
+    (tmp_path / "a.asp").write_text("<% Dim a %>")
+    # missing file is still cached
+    assert vdir.request(Path("/inc/a.asp")) is None
+    vdir.negative_ttl = 0.0
+    vdir.clear()
+    assert vdir.request(Path("/inc/b.asp")) is None
+    (tmp_path / "b.asp").write_text("<% Dim b %>")
+    assert vdir.request(Path("/inc/b.asp")) is not None
+
+
+def test_virtual_directory_eviction(tmp_path: Path):
+    for name in ["a", "b", "c"]:
+        (tmp_path / f"{name}.asp").write_text(f"<% Dim {name} %>")
+    vdir = VirtualDirectory(Path("/inc"), tmp_path)
+    vdir.request(Path("/inc/a.asp"))
+    # budget only fits two programs
+    vdir.max_ast_bytes = vdir.cache_bytes * 2
+    prog_a = vdir.request(Path("/inc/a.asp"))
+    prog_b = vdir.request(Path("/inc/b.asp"))
+    vdir.request(Path("/inc/a.asp"))
+    vdir.request(Path("/inc/c.asp"))
+    assert vdir.cache_bytes <= vdir.max_ast_bytes
+    # b was least recently used
+    assert vdir.request(Path("/inc/a.asp")) is prog_a
+    assert vdir.request(Path("/inc/b.asp")) is not prog_b
+
+
+def test_virtual_directory_concurrent(tmp_path: Path, monkeypatch):
+    (tmp_path / "a.asp").write_text("<% Dim a %>")
+    num_parsed = 0
+    from_tokenizer = Program.from_tokenizer
+
+    def slow_from_tokenizer(tkzr):
+        nonlocal num_parsed
+        num_parsed += 1
+        time.sleep(0.05)
+        return from_tokenizer(tkzr)
+
+    monkeypatch.setattr(virtual_dir.Program, "from_tokenizer", slow_from_tokenizer)
+    vdir = VirtualDirectory(Path("/inc"), tmp_path)
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(vdir.request(Path("/inc/a.asp")))
+        )
+        for _ in range(8)
+    ]
+    for thr in threads:
+        thr.start()
+    for thr in threads:
+        thr.join()
+    assert num_parsed == 1
+    assert all(res is results[0] for res in results)
+
+
+def test_virtual_directory_invalidate_prefetched(tmp_path: Path):
+    (tmp_path / "a.asp").write_text("<% Dim a %>")
+    vdir = VirtualDirectory(Path("/inc"), tmp_path)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        vdir.prefetch(Path("/inc/a.asp"), pool).result()
+    (tmp_path / "a.asp").write_text("<% Dim a, b %>")
+    vdir.invalidate(Path("/inc/a.asp"))
+    # the prefetched parse of the old content is dropped
+    prog = vdir.request(Path("/inc/a.asp"))
+    assert len(prog.global_stmt_list[0].var_name) == 2